@@ -0,0 +1,4 @@
+-- Index backing keyset pagination of chat history (/sessions/get-messages/{id}?before_id=&limit=)
+-- Lets Oracle read one page of a session's messages in (created_at, id) order without sorting the whole history.
+CREATE INDEX chat_messages_session_idx
+    ON chat_messages (session_id, created_at, id);
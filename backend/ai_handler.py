@@ -1,9 +1,16 @@
 import os
 from dotenv import load_dotenv
-from db_handler import extract_db_metadata
+from db_handler import extract_db_metadata, selective_columns, LARGE_TABLE_ROWS, DEFAULT_ROW_CAP
+from schema_search import get_lexical_index
+from schema_graph import join_hints
 import re
 import logging
 import requests
+import hashlib
+import json
+from metrics import LLM_SECONDS
+from tracing import span
+from single_flight import SingleFlight
 
 # Load environment variables from .env file
 load_dotenv()
@@ -22,12 +29,61 @@ logger = logging.getLogger(__name__)
 LM_STUDIO_API_URL = os.getenv("LM_STUDIO_URL")
 LM_STUDIO_MODEL = os.getenv("LM_STUDIO_MODEL")
 
-def generate_sql_from_prompt(prompt: str) -> str:
+# Identical concurrent prompts (same messages) share one completion
+_completion_flight = SingleFlight("llm_completion")
+
+
+def _post_completion(messages: list[dict]) -> requests.Response:
+    with LLM_SECONDS.time(), span("llm.completion", model=LM_STUDIO_MODEL or "", messages=len(messages)):
+        return requests.post(
+            LM_STUDIO_API_URL,
+            headers={"Content-Type": "application/json"},
+            json={
+                "model": LM_STUDIO_MODEL,
+                "messages": messages,
+                "temperature": 0.2,
+                "max_tokens": 512
+            },
+            timeout=30
+        )
+
+def select_tables(prompt: str, top_k: int = 5) -> list[str]:
+    """
+    Picks the tables a prompt most likely needs using the local lexical index (no network calls).
+    """
+    return [hit["table"] for hit in get_lexical_index().search(prompt, top_k=top_k)]
+
+
+def build_size_hints(metadata: dict, tables: list[str]) -> str:
+    """
+    Row counts for the selected tables, and which columns to filter on for the large ones.
+    """
+    lines = []
+    for table in tables:
+        table_meta = metadata.get(table)
+        if not table_meta or table_meta.get("num_rows") is None:
+            continue
+        line = f"- {table}: ~{table_meta['num_rows']:,} rows"
+        if table_meta["num_rows"] >= LARGE_TABLE_ROWS:
+            columns = selective_columns(table_meta)
+            if columns:
+                line += f" (large: filter on selective columns such as {', '.join(columns)})"
+            line += f"; results are capped at {DEFAULT_ROW_CAP} rows"
+        lines.append(line)
+    if not lines:
+        return ""
+    return "**Table Sizes:**\n" + "\n".join(lines) + "\n\n"
+
+
+def generate_sql_from_prompt(prompt: str, tables: list[str] | None = None, history: list[dict] | None = None) -> str:
     """
     Generates a SQL query from a user-provided natural language prompt, enhanced with database metadata for context.
 
     Args:
         prompt (str): The user's query in plain English.
+        tables (list[str]): Tables already selected for this prompt; picked with select_tables when omitted.
+        history (list[dict]): Earlier conversation turns (see conversation_context.build_query_context),
+            placed between the system prompt and the new prompt so follow-ups resolve.
 
     Returns:
         str: A cleaned and executable SQL query.
@@ -36,12 +92,24 @@ def generate_sql_from_prompt(prompt: str) -> str:
         # Retrieve latest cached database metadata (tables, columns, etc.)
         metadata = extract_db_metadata()
         logger.info("Database metadata extracted for context injection.")
+
+        # Exact join predicates between the tables this prompt is about
+        if tables is None:
+            tables = select_tables(prompt)
+        joins = join_hints(tables) if len(tables) > 1 else ""
+        join_context = (
+            "**Join Paths (use exactly these predicates when joining these tables):**\n"
+            f"{joins}\n\n"
+        ) if joins else ""
+        size_context = build_size_hints(metadata, tables)
         # print(f"Metadata: {metadata}")
         # Construct a rich, structured system prompt
         system_prompt = (
             "You are an expert AI specialized in generating SQL queries strictly for Oracle Database systems.\n\n"
             "**Database Metadata Context:**\n"
             f"{metadata}\n\n"
+            f"{join_context}"
+            f"{size_context}"
             "RULES:\n"
             "- Respond with ONLY a syntactically correct SQL query.\n"
             "- Do not include any explanations, notes, or markdown formatting.\n"
@@ -64,21 +132,13 @@ def generate_sql_from_prompt(prompt: str) -> str:
         # Compose chat messages
         messages = [
             {"role": "system", "content": system_prompt},
+            *(history or []),
             {"role": "user", "content": prompt}
         ]
 
         # Call LM Studio locally
-        response = requests.post(
-            LM_STUDIO_API_URL,
-            headers={"Content-Type": "application/json"},
-            json={
-                "model": LM_STUDIO_MODEL,
-                "messages": messages,
-                "temperature": 0.2,
-                "max_tokens": 512
-            },
-            timeout=30
-        )
+        key = hashlib.sha256(json.dumps(messages, sort_keys=True).encode("utf-8")).hexdigest()
+        response = _completion_flight.do(key, _post_completion, messages)
 
         if response.status_code != 200:
             logger.error(f"LM Studio returned non-200 status: {response.status_code} | {response.text}")
@@ -0,0 +1,150 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Per-module overrides, e.g. "pinecone_utils=WARNING,db_handler=DEBUG"
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_FILE = os.getenv("LOG_FILE", "app.log.jsonl")
+LOG_FILE_MAX_BYTES = int(os.getenv("LOG_FILE_MAX_BYTES", str(20 * 1024 * 1024)))
+LOG_FILE_BACKUPS = int(os.getenv("LOG_FILE_BACKUPS", "5"))
+LOG_TO_CONSOLE = os.getenv("LOG_TO_CONSOLE", "true").lower() == "true"
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Fraction of records logged with extra={"sampled": True} that are kept
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.1"))
+# Large payloads are cut down to this many characters / list items
+LOG_MAX_CHARS = int(os.getenv("LOG_MAX_CHARS", "500"))
+LOG_MAX_ITEMS = int(os.getenv("LOG_MAX_ITEMS", "3"))
+
+_listener = None
+
+
+def summarize(value, max_chars: int = LOG_MAX_CHARS, max_items: int = LOG_MAX_ITEMS):
+    """
+    Cheap, bounded view of a payload for logging: long strings are cut, long
+    lists keep their length and first few items, nested values are summarized too.
+    """
+    if isinstance(value, str):
+        return value if len(value) <= max_chars else f"{value[:max_chars]}... ({len(value)} chars)"
+    if isinstance(value, (list, tuple)):
+        head = [summarize(item, max_chars, max_items) for item in value[:max_items]]
+        if len(value) <= max_items:
+            return head
+        return {"count": len(value), "head": head}
+    if isinstance(value, dict):
+        items = list(value.items())
+        summary = {str(k): summarize(v, max_chars, max_items) for k, v in items[:max_items * 4]}
+        if len(items) > max_items * 4:
+            summary["..."] = f"{len(items)} keys"
+        return summary
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    return summarize(str(value), max_chars, max_items)
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line: timestamp, level, logger, message and any extra={"fields": {...}}.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "sampled", False):
+            return random.random() < LOG_SAMPLE_RATE
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread; drops them (and counts the drop)
+    rather than blocking the request when the queue is full.
+    """
+
+    dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            NonBlockingQueueHandler.dropped += 1
+
+
+def _apply_module_levels(spec: str):
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, level = item.partition("=")
+        logging.getLogger(name.strip()).setLevel(level.strip().upper())
+
+
+def setup_logging():
+    """
+    Routes all logging through a bounded in-memory queue drained by a background
+    listener that writes JSON lines to LOG_FILE (rotating) and the console.
+    Handlers already attached to the root logger (e.g. db_errors.log) keep
+    receiving records at their previous level. Safe to call more than once.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    root = logging.getLogger()
+    previous_level = root.level
+    handlers = []
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        if handler.level == logging.NOTSET:
+            handler.setLevel(previous_level)
+        handlers.append(handler)
+
+    json_file = RotatingFileHandler(LOG_FILE, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUPS, encoding="utf-8")
+    json_file.setFormatter(JsonFormatter())
+    handlers.append(json_file)
+    if LOG_TO_CONSOLE:
+        console = logging.StreamHandler()
+        console.setFormatter(JsonFormatter())
+        handlers.append(console)
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter())
+    root.addHandler(queue_handler)
+    root.setLevel(LOG_LEVEL)
+    _apply_module_levels(LOG_LEVELS)
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """
+    Flushes queued records and stops the listener thread.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
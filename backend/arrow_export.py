@@ -0,0 +1,228 @@
+import decimal
+import logging
+import os
+import time
+import oracledb
+from dotenv import load_dotenv
+from db_handler import connect_with_retry, output_type_handler, LOB_FETCH_TYPES, DATE_TYPES
+from metrics import DB_CONNECT_SECONDS, DB_EXECUTE_SECONDS, DB_FETCH_SECONDS, DB_FETCH_ROWS
+from tracing import span
+
+# pyarrow is optional: without it the export endpoints answer 501
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "10000"))
+EXPORT_DIR = os.getenv("EXPORT_DIR", "exports")
+EXPORT_PARQUET_COMPRESSION = os.getenv("EXPORT_PARQUET_COMPRESSION", "zstd")
+# Parquet files older than this are deleted when the next export starts
+EXPORT_TTL_SECONDS = int(os.getenv("EXPORT_TTL_SECONDS", str(24 * 3600)))
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+_STRING_TYPES = (
+    oracledb.DB_TYPE_VARCHAR, oracledb.DB_TYPE_NVARCHAR, oracledb.DB_TYPE_CHAR, oracledb.DB_TYPE_NCHAR,
+    oracledb.DB_TYPE_LONG, oracledb.DB_TYPE_CLOB, oracledb.DB_TYPE_NCLOB,
+)
+_BINARY_TYPES = (oracledb.DB_TYPE_RAW, oracledb.DB_TYPE_LONG_RAW, oracledb.DB_TYPE_BLOB)
+_FLOAT_TYPES = (oracledb.DB_TYPE_BINARY_FLOAT, oracledb.DB_TYPE_BINARY_DOUBLE)
+# Widest integer precision that fits int64; wider NUMBER(p,0) columns are exported as decimal128
+_INT64_MAX_PRECISION = 18
+
+
+def arrow_available() -> bool:
+    return pa is not None
+
+
+def _export_type_handler(cursor, metadata):
+    """
+    output_type_handler, except LOBs are always fetched inline, dates stay
+    datetimes (Arrow stores them as timestamps) and integers too wide for int64
+    arrive as Decimal.
+    """
+    if metadata.type_code is oracledb.DB_TYPE_NUMBER and metadata.scale == 0 \
+            and (metadata.precision or 0) > _INT64_MAX_PRECISION:
+        return cursor.var(decimal.Decimal, arraysize=cursor.arraysize)
+    if metadata.type_code in LOB_FETCH_TYPES:
+        return cursor.var(LOB_FETCH_TYPES[metadata.type_code], arraysize=cursor.arraysize)
+    if metadata.type_code in DATE_TYPES:
+        return None
+    return output_type_handler(cursor, metadata)
+
+
+def arrow_type(column):
+    """
+    Arrow type for a cursor.description entry, or None for types exported as text.
+    """
+    type_code, precision, scale = column[1], column[4], column[5]
+    if type_code is oracledb.DB_TYPE_NUMBER:
+        # Matches _export_type_handler: scale 0 arrives as int (Decimal past int64), anything else as float
+        if scale == 0 and precision:
+            return pa.int64() if precision <= _INT64_MAX_PRECISION else pa.decimal128(precision, 0)
+        return pa.float64()
+    if type_code is oracledb.DB_TYPE_BINARY_INTEGER:
+        return pa.int64()
+    if type_code in _FLOAT_TYPES:
+        return pa.float64()
+    if type_code in DATE_TYPES:
+        return pa.timestamp("us")
+    if type_code in _STRING_TYPES:
+        return pa.string()
+    if type_code in _BINARY_TYPES:
+        return pa.binary()
+    return None
+
+
+class ResultExport:
+    """
+    An executed SELECT whose rows are read as Arrow record batches, one
+    cursor.fetchmany chunk per batch. Executes eagerly so errors surface
+    before a response starts; call close() when done.
+    """
+
+    def __init__(self, query: str, params: dict = None, batch_rows: int = EXPORT_BATCH_ROWS):
+        self.batch_rows = batch_rows
+        self.rows = 0
+        self.conn = None
+        self.cursor = None
+        try:
+            with DB_CONNECT_SECONDS.time(), span("db.connect"):
+                self.conn = connect_with_retry()
+            self.cursor = self.conn.cursor()
+            self.cursor.outputtypehandler = _export_type_handler
+            self.cursor.arraysize = batch_rows
+            self.cursor.prefetchrows = batch_rows + 1
+            with DB_EXECUTE_SECONDS.time(), span("db.execute"):
+                self.cursor.execute(query.strip().rstrip(';'), params or {})
+            if not self.cursor.description:
+                raise ValueError("Only SELECT statements can be exported")
+        except Exception:
+            self.close()
+            raise
+
+        types = [arrow_type(col) for col in self.cursor.description]
+        # Columns with no direct Arrow mapping are exported as their text form
+        self._text_columns = [i for i, t in enumerate(types) if t is None]
+        self.schema = pa.schema([(col[0], t or pa.string()) for col, t in zip(self.cursor.description, types)])
+
+    def batches(self):
+        while True:
+            with DB_FETCH_SECONDS.time(), span("db.fetch") as fetch_span:
+                rows = self.cursor.fetchmany(self.batch_rows)
+                if fetch_span is not None:
+                    fetch_span.set(rows=len(rows), arraysize=self.cursor.arraysize)
+            if not rows:
+                return
+            self.rows += len(rows)
+            DB_FETCH_ROWS.inc(len(rows))
+            columns = [list(values) for values in zip(*rows)]
+            for i in self._text_columns:
+                columns[i] = [None if value is None else str(value) for value in columns[i]]
+            yield pa.RecordBatch.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, self.schema)],
+                schema=self.schema
+            )
+
+    def close(self):
+        if self.cursor:
+            try: self.cursor.close()
+            except Exception: pass
+            self.cursor = None
+        if self.conn:
+            try: self.conn.close()
+            except Exception: pass
+            self.conn = None
+
+
+class _ChunkSink:
+    """
+    Write-only file object that collects what the IPC writer emits, so each
+    batch can be yielded to the client as soon as it is written.
+    """
+
+    closed = False
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_ipc(export: ResultExport):
+    """
+    Yields an Arrow IPC stream (schema, then one message per record batch) and
+    closes the export at the end.
+    """
+    sink = _ChunkSink()
+    try:
+        with pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), export.schema) as writer:
+            yield sink.drain()
+            for batch in export.batches():
+                writer.write_batch(batch)
+                yield sink.drain()
+        yield sink.drain()
+        logger.info("Arrow export streamed", extra={"fields": {"rows": export.rows}})
+    finally:
+        export.close()
+
+
+def _prune_exports():
+    cutoff = time.time() - EXPORT_TTL_SECONDS
+    for name in os.listdir(EXPORT_DIR):
+        path = os.path.join(EXPORT_DIR, name)
+        try:
+            if name.endswith(".parquet") and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def write_parquet(query: str, params: dict, job) -> dict:
+    """
+    Job target: writes the query result to EXPORT_DIR/<job id>.parquet one
+    record batch at a time. Stops early (and removes the partial file) if the
+    job is cancelled.
+    """
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    _prune_exports()
+    path = os.path.join(EXPORT_DIR, f"{job.id}.parquet")
+    partial = path + ".part"
+
+    job.update(stage="querying")
+    export = ResultExport(query, params)
+    try:
+        job.update(stage="writing")
+        with pq.ParquetWriter(partial, export.schema, compression=EXPORT_PARQUET_COMPRESSION) as writer:
+            for batch in export.batches():
+                writer.write_batch(batch)
+                if job.cancelled:
+                    break
+    except Exception:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    finally:
+        export.close()
+
+    if job.cancelled:
+        os.remove(partial)
+        return None
+    os.replace(partial, path)
+    return {"file": path, "rows": export.rows, "bytes": os.path.getsize(path), "columns": export.schema.names}
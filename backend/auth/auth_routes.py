@@ -1,12 +1,15 @@
 # routes/auth_routes.py
 from fastapi import APIRouter, HTTPException, Request, Response
 from pydantic import BaseModel
-from auth.auth_service import login_service, get_current_user_from_cookie, get_user_by_id
+from auth.auth_service import login_service, get_current_user_from_cookie, get_user_by_id, extract_token, forget_token, check_login_allowed
+import math
 from fastapi.responses import JSONResponse
 import os
+import logging
 
 # Create an APIRouter for authentication-related endpoints
 auth_router = APIRouter()
+logger = logging.getLogger(__name__)
 
 # Define a request body schema using Pydantic
 class LoginRequest(BaseModel):
@@ -14,31 +17,43 @@ class LoginRequest(BaseModel):
     password: str
 
 @auth_router.post("/login")
-def login(request: LoginRequest):
+async def login(request: LoginRequest, http_request: Request):
     """
     Login endpoint:
-    - Validates user credentials using the authentication service
+    - Throttles attempts per username and per client IP
+    - Validates user credentials using the authentication service (bcrypt runs on a separate process pool)
     - Returns JWT token if credentials are correct
     """
-    token = login_service(request.username, request.password)
+    client_ip = http_request.client.host if http_request.client else "unknown"
+    retry_after = check_login_allowed(request.username, client_ip)
+    if retry_after:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many login attempts. Try again later.",
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
+
+    token = await login_service(request.username, request.password)
     if not token:
         raise HTTPException(status_code=401, detail="Invalid username or password")
    
     response = JSONResponse(content={"message": "Login successful", "token":token})
     response.set_cookie(
         key="auth_token",
-        value=token,
+        value=token["access_token"],  # Only the access token; the full token dict stays in the body
         httponly=True,        # JS can't read it
         samesite="None" if os.getenv("ENV") == "production" else "Lax", # Adjust based on environment
         secure=os.getenv("ENV") == "production",  # True if HTTPS in production
         max_age=60 * 60,  # Set cookie to expire in 7 days
         expires=60 * 60   # Explicitly set expiration to 7 days
     )
-    print(f"Response: {response.body}")  # Log the response body
-    print(f"Cookies: {response.headers.get('set-cookie')}")  # Log the set-cookie header
+    logger.info("Login successful", extra={"fields": {"username": request.username}})
     return response
 @auth_router.post("/logout")
-async def logout(response: Response):
+async def logout(request: Request, response: Response):
+    token = extract_token(request)
+    if token:
+        forget_token(token)
     # Clear cookie by setting it with empty value and immediate expiry
     response = JSONResponse({"message": "Logout successful"})
     response.delete_cookie(
@@ -1,23 +1,108 @@
 import json
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
 from db_handler import get_connection
 from datetime import datetime, timedelta
 from jose import jwt
-from passlib.context import CryptContext
 from dotenv import load_dotenv
 import os
 from fastapi import Request,HTTPException,status
+from starlette.concurrency import run_in_threadpool
+from auth import password_hashing
+from metrics import CACHE_REQUESTS, LOGIN_ATTEMPTS, LOGIN_SECONDS
 # Load environment variables from .env file
 load_dotenv()
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+logger = logging.getLogger(__name__)
 
-# Hash a plain password
+# Login throttling: token buckets per username and per client IP
+LOGIN_USER_BURST = int(os.getenv("LOGIN_USER_BURST", "5"))
+LOGIN_USER_PER_MINUTE = float(os.getenv("LOGIN_USER_PER_MINUTE", "5"))
+LOGIN_IP_BURST = int(os.getenv("LOGIN_IP_BURST", "20"))
+LOGIN_IP_PER_MINUTE = float(os.getenv("LOGIN_IP_PER_MINUTE", "30"))
+LOGIN_BUCKETS_MAX_ENTRIES = int(os.getenv("LOGIN_BUCKETS_MAX_ENTRIES", "100000"))
+
+# Verified access tokens: sha256(token) -> (user, exp), least recently used first
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))
+_token_cache = OrderedDict()
+_token_cache_lock = threading.Lock()
+
+# User rows for /auth/me: user_id -> (details, expires_at)
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+_user_cache = OrderedDict()
+_user_cache_lock = threading.Lock()
+
+# Hash a plain password (on the bcrypt process pool)
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return password_hashing.hash_password(password)
 
-# Verify plain password against hashed password
+# Verify plain password against hashed password (on the bcrypt process pool)
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_hashing.verify_password(plain_password, hashed_password)
+
+
+class TokenBucket:
+    """
+    Allows `burst` attempts at once, refilled at `per_minute` attempts per minute.
+    """
+
+    def __init__(self, burst: int, per_minute: float):
+        self.capacity = burst
+        self.rate = per_minute / 60.0
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """
+        Consumes one token. Returns 0 on success, otherwise seconds until a token is available.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate else float("inf")
+
+
+_login_buckets = OrderedDict()
+_login_buckets_lock = threading.Lock()
+
+
+def check_login_allowed(username: str, client_ip: str) -> float:
+    """
+    Applies the per-username and per-IP login throttles.
+    Returns 0 when the attempt may proceed, otherwise the seconds to wait.
+    """
+    keys = (
+        (f"user:{username.lower()}", LOGIN_USER_BURST, LOGIN_USER_PER_MINUTE),
+        (f"ip:{client_ip}", LOGIN_IP_BURST, LOGIN_IP_PER_MINUTE),
+    )
+    with _login_buckets_lock:
+        wait = 0.0
+        for key, burst, per_minute in keys:
+            bucket = _login_buckets.get(key)
+            if bucket is None:
+                bucket = _login_buckets[key] = TokenBucket(burst, per_minute)
+            _login_buckets.move_to_end(key)
+            wait = max(wait, bucket.take())
+        while len(_login_buckets) > LOGIN_BUCKETS_MAX_ENTRIES:
+            _login_buckets.popitem(last=False)
+    if wait:
+        LOGIN_ATTEMPTS.inc(outcome="throttled")
+    return wait
+
+
+def _record_login(outcome: str, lookup_seconds: float, verify_seconds: float, total_seconds: float):
+    LOGIN_ATTEMPTS.inc(outcome=outcome)
+    LOGIN_SECONDS.observe(lookup_seconds, phase="lookup")
+    if verify_seconds:
+        LOGIN_SECONDS.observe(verify_seconds, phase="verify")
+    LOGIN_SECONDS.observe(total_seconds, phase="total")
 
 # Create JWT token
 def create_token(data: dict, expires_delta: timedelta):
@@ -39,20 +124,42 @@ def create_tokens(user_id: int):
     return access_token, refresh_token
 
 
-def authenticate_user(username: str, password: str):
+def _fetch_login_row(username: str):
     conn = get_connection()
-    user = conn.cursor().execute("SELECT id,username,password_hash FROM users WHERE username = :1", (username,)).fetchone()
-    conn.close()
+    try:
+        return conn.cursor().execute("SELECT id,username,password_hash FROM users WHERE username = :1", (username,)).fetchone()
+    finally:
+        conn.close()
+
 
-    if user and verify_password(password, user[2]):
-        return {"id": user[0], "username": user[1]}
-    return None
+async def authenticate_user(username: str, password: str):
+    """
+    Looks the user up on the threadpool and verifies the bcrypt hash on the
+    dedicated process pool, recording lookup/verify timings.
+    """
+    started = time.perf_counter()
+    lookup_seconds = verify_seconds = 0.0
+    outcome = "error"
+    try:
+        user = await run_in_threadpool(_fetch_login_row, username)
+        lookup_seconds = time.perf_counter() - started
+
+        verified = False
+        if user:
+            verify_started = time.perf_counter()
+            verified = await password_hashing.verify_password_async(password, user[2])
+            verify_seconds = time.perf_counter() - verify_started
+
+        outcome = "success" if verified else "failure"
+        return {"id": user[0], "username": user[1]} if verified else None
+    finally:
+        _record_login(outcome, lookup_seconds, verify_seconds, time.perf_counter() - started)
 
-def login_service(username: str, password: str):
-    user = authenticate_user(username, password)
+async def login_service(username: str, password: str):
+    user = await authenticate_user(username, password)
     if not user:
         return None
-    print(f"User {user} authenticated successfully.")
+    logger.info(f"User {user['id']} authenticated successfully.")
     access_token, refresh_token = create_tokens(user["id"])
     return {
         "access_token": access_token,
@@ -60,49 +167,117 @@ def login_service(username: str, password: str):
         "token_type": "bearer"
     }
 
-def get_current_user_from_cookie(request: Request):
+def _hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def extract_token(request: Request) -> str | None:
+    """
+    Reads the access token from the auth_token cookie or the Authorization header.
+    """
     token = request.cookies.get("auth_token")
-    
-    if token:
+
+    # Cookies set before the cookie held only the access token contain the token dict's repr
+    if token and token.startswith("{"):
         temp = token.replace("'", "\"")
-        token = json.loads(temp).get("access_token")
+        try:
+            token = json.loads(temp).get("access_token")
+        except (ValueError, AttributeError):
+            # Malformed cookie: treat as missing so the caller answers 401
+            token = None
     if not token:
         auth_header = request.headers.get("Authorization")
         if auth_header and auth_header.startswith("Bearer "):
             token = auth_header.split(" ", 1)[1]
-    
-    if not token:
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
+    return token
+
+
+def verify_token(token: str) -> dict:
+    """
+    Returns {"id": user_id} for a valid access token.
+    Verified tokens are cached by hash until their exp, so repeat requests skip jwt.decode.
+    """
+    key = _hash_token(token)
+    now = time.time()
+    with _token_cache_lock:
+        cached = _token_cache.get(key)
+        if cached and cached[1] > now:
+            _token_cache.move_to_end(key)
+            CACHE_REQUESTS.inc(cache="token", result="hit")
+            return dict(cached[0])
+        if cached:
+            del _token_cache[key]
+    CACHE_REQUESTS.inc(cache="token", result="miss")
+
     try:
         payload = jwt.decode(token,os.getenv("JWT_SECRET"), algorithms=[os.getenv("JWT_ALGORITHM")])
-        
-        user_id = payload.get("sub")
-        if user_id is None:
-            raise HTTPException(status_code=401, detail="Invalid Token")
-        
-        return {"id": user_id}
     except jwt.JWTError:    
-        print("JWT Error occurred during token decoding.")
+        logger.warning("JWT Error occurred during token decoding.")
+        raise HTTPException(status_code=401, detail="Invalid Token")
+
+    user_id = payload.get("sub")
+    if user_id is None:
         raise HTTPException(status_code=401, detail="Invalid Token")
+
+    user = {"id": user_id}
+    expires_at = payload.get("exp")
+    if expires_at:
+        with _token_cache_lock:
+            _token_cache[key] = (user, float(expires_at))
+            while len(_token_cache) > TOKEN_CACHE_MAX_ENTRIES:
+                _token_cache.popitem(last=False)
+    return dict(user)
+
+
+def forget_token(token: str):
+    """
+    Drops a token from the verified-token cache (e.g. on logout).
+    """
+    with _token_cache_lock:
+        _token_cache.pop(_hash_token(token), None)
+
+
+def get_current_user_from_cookie(request: Request):
+    token = extract_token(request)
+    
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    return verify_token(token)
     
     
 def get_user_by_id(request: Request):
-    """Fetch user details from the database by ID"""
+    """Fetch user details from the database by ID (cached for USER_CACHE_TTL_SECONDS)"""
+    user_id = get_current_user_from_cookie(request)["id"]
+    now = time.monotonic()
+    with _user_cache_lock:
+        cached = _user_cache.get(user_id)
+        if cached and cached[1] > now:
+            _user_cache.move_to_end(user_id)
+            CACHE_REQUESTS.inc(cache="user", result="hit")
+            return dict(cached[0])
+    CACHE_REQUESTS.inc(cache="user", result="miss")
+
+    conn = None
     try:
         conn = get_connection()
         cursor = conn.cursor()
-        user_id = get_current_user_from_cookie(request)
         user = cursor.execute(
-            "SELECT id, username, email FROM users WHERE id = :1", (user_id,)
+            "SELECT id, username, email FROM users WHERE id = :1", (int(user_id),)
         ).fetchone()
     except Exception as e:
-        print(f"Error fetching user by ID: {e}")
+        logger.warning(f"Error fetching user by ID: {e}")
         raise HTTPException(status_code=401, detail="Invalid Token")
     finally:
-        conn.close()
+        if conn:
+            conn.close()
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    return {"id": user[0], "username": user[1], "email": user[2]}
+    details = {"id": user[0], "username": user[1], "email": user[2]}
+    with _user_cache_lock:
+        _user_cache[user_id] = (details, now + USER_CACHE_TTL_SECONDS)
+        while len(_user_cache) > USER_CACHE_MAX_ENTRIES:
+            _user_cache.popitem(last=False)
+    return dict(details)
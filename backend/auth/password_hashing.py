@@ -0,0 +1,60 @@
+# Kept free of database/FastAPI imports: worker processes import this module on their own.
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from passlib.context import CryptContext
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# bcrypt runs in its own processes so login bursts cannot starve the request threadpool
+AUTH_HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", "2"))
+AUTH_HASH_TIMEOUT_SECONDS = float(os.getenv("AUTH_HASH_TIMEOUT_SECONDS", "10"))
+
+_pool = None
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """
+    The bcrypt pool; the app starts it at startup, scripts get it on first use.
+
+    Workers are never forked from this (threaded) process, where a child could
+    inherit a lock held by another thread and deadlock: they come from a
+    forkserver, or are spawned where that is unavailable (Windows).
+    """
+    global _pool
+    if _pool is None:
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _pool = ProcessPoolExecutor(max_workers=AUTH_HASH_WORKERS, mp_context=multiprocessing.get_context(method))
+    return _pool
+
+
+def hash_password(password: str) -> str:
+    return get_pool().submit(_hash, password).result(timeout=AUTH_HASH_TIMEOUT_SECONDS)
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return get_pool().submit(_verify, plain_password, hashed_password).result(timeout=AUTH_HASH_TIMEOUT_SECONDS)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """
+    Awaits bcrypt verification on the process pool without holding a threadpool thread.
+    """
+    future = asyncio.wrap_future(get_pool().submit(_verify, plain_password, hashed_password))
+    return await asyncio.wait_for(future, timeout=AUTH_HASH_TIMEOUT_SECONDS)
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,252 @@
+"""
+Microbenchmarks for the pure-Python hot paths, with JSON baselines.
+
+Each case is timed over several rounds (each round long enough to be
+measurable) and the fastest per-call time is kept. Results are compared with
+the saved baseline and the run exits 1 if any case got slower by more than
+--threshold percent:
+
+    cd backend
+    python -m benchmarks.run --save-baseline      # record benchmarks/baseline.json
+    python -m benchmarks.run                      # compare against it
+    python -m benchmarks.run --filter parameterize --quick
+
+Backend modules are imported on the load-test stand-ins (loadtest.fake_services),
+so no Oracle client, Pinecone or Gemini credentials are needed.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+sys.path.insert(0, BACKEND_DIR)
+from loadtest import fake_services  # noqa: E402
+
+fake_services.install()
+
+from ai_handler import clean_ai_output  # noqa: E402
+from db_handler import parameterize_query, is_safe_query, rows_to_dicts, rows_to_columnar  # noqa: E402
+from fast_json import dumps  # noqa: E402
+from oracle_metadata import build_meta_chunks_from_metadata  # noqa: E402
+from schema_search import describe_table, format_search_results  # noqa: E402
+
+TABLE_COUNTS = (10, 100, 1000, 10000)
+SQL_LINES = (1, 10, 100, 500)
+ROW_COUNTS = (10, 1000, 10000)
+RESULT_COUNTS = (5, 50, 500)
+QUICK_LIMIT = 1000
+
+
+# --- Synthetic inputs ---
+
+def synthetic_metadata(tables: int, columns: int = 12) -> dict:
+    rng = random.Random(tables)
+    metadata = {}
+    for t in range(tables):
+        name = f"TABLE_{t:05d}"
+        cols = [
+            {
+                "name": f"COL_{c:02d}",
+                "type": rng.choice(["NUMBER", "VARCHAR2", "DATE", "CLOB", "TIMESTAMP"]),
+                "nullable": rng.choice(["Y", "N"]),
+                "comment": f"Column {c} of {name}" if c % 3 else "",
+                "num_distinct": rng.randint(1, 10000),
+                "num_nulls": rng.randint(0, 100),
+            }
+            for c in range(columns)
+        ]
+        fks = [
+            {"column": f"COL_{c:02d}", "references": {"table": f"TABLE_{rng.randrange(tables):05d}", "column": "COL_00"}}
+            for c in (1, 2) if tables > 1
+        ]
+        metadata[name] = {
+            "columns": cols,
+            "primary_keys": ["COL_00"],
+            "foreign_keys": fks,
+            "table_comment": f"Synthetic table {t}",
+            "num_rows": rng.randint(0, 1_000_000),
+            "last_analyzed": None,
+        }
+    return metadata
+
+
+SQL_LINE_TEMPLATES = [
+    "    AND e.salary > {n}.50",
+    "    AND e.status = 'ACTIVE_{n}'",
+    "    AND d.dept_code IN ('D{n}', 'E{n}', 'F{n}')",
+    "    AND e.hire_date >= TO_DATE('2020-01-{d:02d}', 'YYYY-MM-DD')",
+    "    AND e.last_name ILIKE '%son{n}%'",
+    "    AND e.dept_id IN ({n}, {m}, {k})",
+]
+
+
+def synthetic_sql(lines: int) -> str:
+    if lines == 1:
+        return "SELECT e.emp_id, e.first_name FROM EMPLOYEES e WHERE e.salary > 50000 AND e.status = 'ACTIVE'"
+    body = [
+        "SELECT e.emp_id, e.first_name, e.last_name, d.dept_name",
+        "FROM EMPLOYEES e LEFT JOIN DEPARTMENTS d ON d.dept_id = e.dept_id",
+        "WHERE 1 = 1",
+    ]
+    i = 0
+    while len(body) < lines:
+        template = SQL_LINE_TEMPLATES[i % len(SQL_LINE_TEMPLATES)]
+        body.append(template.format(n=i, m=i + 1, k=i + 2, d=i % 28 + 1))
+        i += 1
+    return "\n".join(body[:lines])
+
+
+def synthetic_ai_output(lines: int) -> str:
+    return f"```sql\n{synthetic_sql(lines)}\n```\n**Note:** this query was generated!"
+
+
+def synthetic_rows(count: int) -> tuple[list[str], list[tuple]]:
+    columns = ["ID", "NAME", "EMAIL", "SALARY", "DEPT_ID", "HIRED", "STATUS", "NOTES"]
+    hired = datetime.datetime(2020, 1, 1)
+    rows = [
+        (i, f"Employee {i}", f"employee{i}@example.com", 50000 + i * 1.5, i % 40, hired, "ACTIVE", None)
+        for i in range(count)
+    ]
+    return columns, rows
+
+
+def synthetic_search_items(count: int) -> list[dict]:
+    metadata = synthetic_metadata(count)
+    return [describe_table(table, meta, 1.0 / (i + 1)) for i, (table, meta) in enumerate(metadata.items())]
+
+
+# --- Cases: name -> zero-argument callable (inputs are built before timing) ---
+
+def build_cases(quick: bool) -> dict:
+    cases = {}
+    limit = QUICK_LIMIT if quick else None
+
+    for lines in SQL_LINES:
+        sql = synthetic_sql(lines)
+        parameterized, _ = parameterize_query(sql)
+        ai_output = synthetic_ai_output(lines)
+        cases[f"parameterize_query[{lines}_lines]"] = lambda sql=sql: parameterize_query(sql)
+        cases[f"is_safe_query[{lines}_lines]"] = lambda sql=parameterized: is_safe_query(sql)
+        cases[f"clean_ai_output[{lines}_lines]"] = lambda text=ai_output: clean_ai_output(text)
+
+    for count in ROW_COUNTS:
+        if limit and count > limit:
+            continue
+        columns, rows = synthetic_rows(count)
+        cases[f"rows_to_dicts[{count}_rows]"] = lambda columns=columns, rows=rows: rows_to_dicts(columns, rows)
+        cases[f"rows_to_columnar[{count}_rows]"] = lambda columns=columns, rows=rows: rows_to_columnar(columns, rows)
+        as_dicts, as_columnar = rows_to_dicts(columns, rows), rows_to_columnar(columns, rows)
+        cases[f"dumps_dicts[{count}_rows]"] = lambda body=as_dicts: dumps(body)
+        cases[f"dumps_columnar[{count}_rows]"] = lambda body=as_columnar: dumps(body)
+
+    for tables in TABLE_COUNTS:
+        if limit and tables > limit:
+            continue
+        metadata = synthetic_metadata(tables)
+        embeddings = [[0.0]] * tables
+        cases[f"build_meta_chunks[{tables}_tables]"] = (
+            lambda metadata=metadata, embeddings=embeddings: build_meta_chunks_from_metadata(metadata, embeddings)
+        )
+
+    for count in RESULT_COUNTS:
+        items = synthetic_search_items(count)
+        cases[f"format_search_results[{count}_items]"] = lambda items=items: format_search_results(items)
+
+    return cases
+
+
+# --- Timing ---
+
+def measure(fn, rounds: int, min_round_seconds: float) -> dict:
+    """
+    Calibrates a loop count so one round takes at least min_round_seconds,
+    then returns the fastest and median per-call time over `rounds` rounds.
+    """
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_round_seconds:
+            break
+        number *= 2 if elapsed == 0 else max(2, min(10, int(min_round_seconds / elapsed) + 1))
+
+    per_call = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        per_call.append((time.perf_counter() - started) / number)
+    per_call.sort()
+    return {"min_us": round(per_call[0] * 1e6, 3), "median_us": round(per_call[len(per_call) // 2] * 1e6, 3), "loops": number}
+
+
+def compare(results: dict, baseline: dict, threshold_pct: float) -> list[str]:
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base or not base["min_us"]:
+            continue
+        change = (result["min_us"] / base["min_us"] - 1) * 100
+        if change > threshold_pct:
+            regressions.append(f"{name}: {base['min_us']} -> {result['min_us']} us (+{change:.1f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks for CPU hot paths")
+    parser.add_argument("--filter", default=None, help="only run cases whose name contains this text")
+    parser.add_argument("--quick", action="store_true", help=f"skip sizes above {QUICK_LIMIT}")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--min-round-seconds", type=float, default=0.1)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--threshold", type=float, default=15, help="allowed slowdown in percent")
+    args = parser.parse_args()
+
+    cases = build_cases(args.quick)
+    if args.filter:
+        cases = {name: fn for name, fn in cases.items() if args.filter in name}
+
+    results = {}
+    print(f"{'case':<42}{'min us':>14}{'median us':>14}{'loops':>9}")
+    for name, fn in cases.items():
+        results[name] = measure(fn, args.rounds, args.min_round_seconds)
+        r = results[name]
+        print(f"{name:<42}{r['min_us']:>14.3f}{r['median_us']:>14.3f}{r['loops']:>9}", flush=True)
+
+    if args.save_baseline:
+        existing = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as f:
+                existing = json.load(f).get("results", {})
+        existing.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(), "results": existing}, f, indent=2, sort_keys=True)
+        print(f"\nBaseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print("\nNo baseline to compare against; run with --save-baseline first.")
+        return
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline["results"], args.threshold)
+    if regressions:
+        print(f"\nRegressions beyond {args.threshold}%:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print(f"\nNo regressions beyond {args.threshold}% against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+from sessions.session_service import get_messages, get_message
+
+load_dotenv()
+
+# Hard cap on the history sent with a /query prompt (estimated tokens)
+QUERY_CONTEXT_TOKEN_BUDGET = int(os.getenv("QUERY_CONTEXT_TOKEN_BUDGET", "1500"))
+# Most recent messages kept verbatim; older ones are folded into the rolling summary
+QUERY_CONTEXT_RECENT_MESSAGES = int(os.getenv("QUERY_CONTEXT_RECENT_MESSAGES", "6"))
+# Share of the budget the rolling summary may use
+QUERY_CONTEXT_SUMMARY_SHARE = float(os.getenv("QUERY_CONTEXT_SUMMARY_SHARE", "0.3"))
+# Messages read from chat_messages per /query
+QUERY_CONTEXT_HISTORY_LIMIT = int(os.getenv("QUERY_CONTEXT_HISTORY_LIMIT", "40"))
+SUMMARY_CACHE_MAX_SESSIONS = int(os.getenv("SUMMARY_CACHE_MAX_SESSIONS", "1000"))
+
+SQL_BLOCK_RE = re.compile(r"```(?:sql)?\s*(.*?)```", re.IGNORECASE | re.DOTALL)
+SQL_STATEMENT_RE = re.compile(r"\b(?:SELECT|WITH)\b[^;]*", re.IGNORECASE | re.DOTALL)
+
+# session_id -> {"upto_id": last message id folded in, "lines": [summary lines]}
+_summaries = OrderedDict()
+_summaries_lock = threading.Lock()
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token is close enough for budgeting English + SQL
+    return len(text) // 4 + 1
+
+
+def extract_sql(text: str) -> str | None:
+    """
+    Pulls the SQL statement out of an assistant reply, if it contains one.
+    """
+    block = SQL_BLOCK_RE.search(text or "")
+    if block and SQL_STATEMENT_RE.search(block.group(1)):
+        return block.group(1).strip()
+    statement = SQL_STATEMENT_RE.search(text or "")
+    return statement.group(0).strip() if statement else None
+
+
+def _shorten(text: str, limit: int) -> str:
+    text = " ".join((text or "").split())
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+def _compact_turn(message: dict) -> dict:
+    """
+    Recent message as sent to the model: assistant replies are reduced to the SQL they produced.
+    """
+    if message["role"] == "assistant":
+        sql = extract_sql(message["content"])
+        content = f"Previously generated SQL:\n{sql}" if sql else _shorten(message["content"], 400)
+        return {"role": "assistant", "content": content}
+    return {"role": "user", "content": message["content"]}
+
+
+def _summary_line(message: dict) -> str:
+    if message["role"] == "assistant":
+        sql = extract_sql(message["content"])
+        return f"- SQL: {_shorten(sql, 200)}" if sql else f"- Assistant: {_shorten(message['content'], 120)}"
+    return f"- User asked: {_shorten(message['content'], 160)}"
+
+
+def _rolling_summary(session_id: int, older: list[dict], token_limit: int) -> str:
+    """
+    Extends the cached summary with messages that have slid out of the recent window.
+    Only messages newer than the last folded-in id are processed, so each message is
+    summarized once. The oldest lines are dropped when the summary outgrows token_limit.
+    """
+    with _summaries_lock:
+        cached = _summaries.pop(session_id, {"upto_id": 0, "lines": []})
+        lines = list(cached["lines"])
+        upto_id = cached["upto_id"]
+
+        for message in older:
+            if message["id"] > upto_id:
+                lines.append(_summary_line(message))
+                upto_id = message["id"]
+
+        while lines and estimate_tokens("\n".join(lines)) > token_limit:
+            lines.pop(0)
+
+        _summaries[session_id] = {"upto_id": upto_id, "lines": lines}
+        while len(_summaries) > SUMMARY_CACHE_MAX_SESSIONS:
+            _summaries.popitem(last=False)
+
+    return "\n".join(lines)
+
+
+def _with_full_content(messages: list[dict]) -> list[dict]:
+    """
+    Replaces truncated previews with the full message text.
+    """
+    full = []
+    for message in messages:
+        if message.get("truncated"):
+            stored = get_message(message["id"])
+            if stored is None:
+                continue  # deleted since the page was read
+            if "error" in stored:
+                raise RuntimeError(stored["message"])
+            message = {**message, "content": stored["content"], "truncated": False}
+        full.append(message)
+    return full
+
+
+def build_query_context(session_id: int, token_budget: int = QUERY_CONTEXT_TOKEN_BUDGET) -> dict:
+    """
+    Builds the bounded conversation context for a /query prompt.
+
+    Returns:
+        dict: {"messages": chat messages to place before the prompt,
+               "summary": rolling summary text, "tokens": estimated tokens used,
+               "recent_user_text": text of the recent user turns (for table selection)}
+    """
+    page = get_messages(session_id, limit=QUERY_CONTEXT_HISTORY_LIMIT)
+    if "error" in page:
+        raise RuntimeError(page["message"])
+    history = page["messages"]
+    # The page holds previews; turns that may be sent verbatim need their full text
+    split = max(len(history) - QUERY_CONTEXT_RECENT_MESSAGES, 0)
+    history = history[:split] + _with_full_content(history[split:])
+
+    summary_budget = int(token_budget * QUERY_CONTEXT_SUMMARY_SHARE)
+    turn_budget = token_budget - summary_budget
+
+    # Walk back from the newest message while the verbatim window and budget allow
+    recent = []
+    used = 0
+    for message in reversed(history):
+        if len(recent) >= QUERY_CONTEXT_RECENT_MESSAGES:
+            break
+        turn = _compact_turn(message)
+        cost = estimate_tokens(turn["content"])
+        if used + cost > turn_budget:
+            break
+        recent.append((message, turn))
+        used += cost
+    recent.reverse()
+
+    older = history[:len(history) - len(recent)]
+    summary = _rolling_summary(session_id, older, summary_budget) if older else ""
+
+    messages = []
+    if summary:
+        messages.append({"role": "system", "content": f"Summary of earlier conversation:\n{summary}"})
+        used += estimate_tokens(summary)
+    messages.extend(turn for _, turn in recent)
+
+    return {
+        "messages": messages,
+        "summary": summary,
+        "tokens": used,
+        "recent_user_text": " ".join(message["content"] for message, _ in recent if message["role"] == "user"),
+    }
@@ -5,20 +5,60 @@ import traceback
 import logging
 import re
 import time
-
-# Cache variable to store metadata after first retrieval
+from metrics import DB_CONNECT_SECONDS, DB_EXECUTE_SECONDS, DB_FETCH_SECONDS, DB_FETCH_ROWS, DB_ERRORS, CACHE_REQUESTS
+from tracing import span
+from single_flight import SingleFlight
+from shared_state import open_snapshot, dsn_fingerprint
+from app_logging import summarize
+
+# Row caps / fetch sizing driven by table statistics
+LARGE_TABLE_ROWS = int(os.getenv("LARGE_TABLE_ROWS", "100000"))
+DEFAULT_ROW_CAP = int(os.getenv("DEFAULT_ROW_CAP", "1000"))
+SMALL_ARRAYSIZE = int(os.getenv("SMALL_ARRAYSIZE", "100"))
+LARGE_ARRAYSIZE = int(os.getenv("LARGE_ARRAYSIZE", "1000"))
+
+# Fetch-time conversions applied by output_type_handler
+# false fetches LOB locators and reads each one afterwards (one extra round trip per LOB)
+FETCH_LOBS_AS_VALUES = os.getenv("FETCH_LOBS_AS_VALUES", "true").lower() == "true"
+FETCH_DATE_FORMAT = os.getenv("FETCH_DATE_FORMAT", "")  # strftime format, e.g. %Y-%m-%dT%H:%M:%S; empty keeps datetimes
+
+# Cache variable to store metadata after first retrieval. Refreshes replace the dict,
+# so derived structures compare identity to know when to rebuild.
 _cached_metadata = None
 
+# Metadata snapshot shared by all uvicorn workers on the host (see shared_state)
+SHARED_METADATA_ENABLED = os.getenv("SHARED_METADATA_ENABLED", "true").lower() == "true"
+# A worker starting cold adopts a shared snapshot only if it is younger than this
+METADATA_SNAPSHOT_MAX_AGE_SECONDS = int(os.getenv("METADATA_SNAPSHOT_MAX_AGE_SECONDS", "3600"))
+_shared_metadata = open_snapshot("metadata") if SHARED_METADATA_ENABLED else None
+# Shared snapshot version the local cache holds
+_snapshot_version = 0
+
+# Identical concurrent SELECTs / metadata extractions share one database round trip
+_query_flight = SingleFlight("db_query")
+_metadata_flight = SingleFlight("db_metadata")
+
 logging.basicConfig(filename="db_errors.log", level=logging.ERROR)
+logger = logging.getLogger(__name__)
 # Initialize the Oracle Client in 'thick mode' by specifying the Instant Client path.
 # This is REQUIRED for connecting to older versions of Oracle like 11g.
 load_dotenv()
 oracledb.init_oracle_client(lib_dir=os.getenv("INSTANT_CLIENT"))
 
 
+# LOB type -> LONG type the driver can fetch inline, in the same round trip as the row
+LOB_FETCH_TYPES = {
+    oracledb.DB_TYPE_CLOB: oracledb.DB_TYPE_LONG,
+    oracledb.DB_TYPE_NCLOB: oracledb.DB_TYPE_LONG_NVARCHAR,
+    oracledb.DB_TYPE_BLOB: oracledb.DB_TYPE_LONG_RAW,
+}
+DATE_TYPES = (oracledb.DB_TYPE_DATE, oracledb.DB_TYPE_TIMESTAMP, oracledb.DB_TYPE_TIMESTAMP_TZ, oracledb.DB_TYPE_TIMESTAMP_LTZ)
+
 DB_USER = os.getenv('DB_USER')
 DB_PASSWORD = os.getenv('DB_PASSWORD')
 DB_DSN = os.getenv('DB_DSN')
+# Stored in the shared metadata snapshot so it is never adopted for another database
+_dsn_key = dsn_fingerprint(DB_DSN)
 
 
 def get_connection():
@@ -49,49 +89,129 @@ def connect_with_retry(max_retries=3, delay=2):
     for attempt in range(max_retries):
         try:
             conn = get_connection()
-            print(f"✅ Database connection successful (attempt {attempt + 1})")
+            logger.debug(f"Database connection successful (attempt {attempt + 1})")
             return conn
         except Exception as e:
-            print(f"❌ Connection attempt {attempt + 1} failed: {e}")
+            logger.warning(f"Connection attempt {attempt + 1} failed: {e}")
             if attempt < max_retries - 1:
-                print(f"⏳ Retrying in {delay} seconds...")
+                logger.info(f"Retrying in {delay} seconds...")
                 time.sleep(delay)
             else:
-                print("❌ All connection attempts failed")
+                logger.error("All connection attempts failed")
                 raise
 
-def execute_query(query: str, params: dict = None):
+def _format_date(value):
+    return value.strftime(FETCH_DATE_FORMAT)
+
+
+def output_type_handler(cursor, metadata):
+    """
+    Converts values while the driver fetches them, so rows arrive as plain tuples:
+    CLOB/BLOB as str/bytes, NUMBER as int (scale 0) or float, and dates as
+    FETCH_DATE_FORMAT strings when that is set. Other types use the driver default.
+    """
+    type_code = metadata.type_code
+    if type_code in LOB_FETCH_TYPES:
+        if FETCH_LOBS_AS_VALUES:
+            return cursor.var(LOB_FETCH_TYPES[type_code], arraysize=cursor.arraysize)
+    elif type_code is oracledb.DB_TYPE_NUMBER:
+        if metadata.scale == 0 and metadata.precision:
+            return cursor.var(int, arraysize=cursor.arraysize)
+        if metadata.scale and metadata.scale > 0:
+            return cursor.var(float, arraysize=cursor.arraysize)
+    elif type_code in DATE_TYPES and FETCH_DATE_FORMAT:
+        return cursor.var(type_code, arraysize=cursor.arraysize, outconverter=_format_date)
+
+
+def read_lobs(description, rows: list[tuple]) -> list[tuple]:
+    """
+    Replaces LOB locators with their str/bytes content. Locators are only valid
+    while their connection is open, so call this before closing it.
+    """
+    lob_columns = [i for i, col in enumerate(description) if col[1] in LOB_FETCH_TYPES]
+    if not lob_columns:
+        return rows
+    read = []
+    for row in rows:
+        row = list(row)
+        for i in lob_columns:
+            if row[i] is not None:
+                row[i] = row[i].read()
+        read.append(tuple(row))
+    return read
+
+
+def rows_to_dicts(columns: list[str], rows: list[tuple]) -> list[dict]:
+    """
+    Converts fetched rows to {column: value} dicts.
+    """
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def rows_to_columnar(columns: list[str], rows: list[tuple]) -> dict:
+    """
+    {"columns": [...], "rows": [[...], ...]}: column names once, rows as the fetched tuples.
+    """
+    return {"columns": columns, "rows": rows}
+
+
+def execute_query(query: str, params: dict = None, max_rows: int = None, arraysize: int = None, columnar: bool = False):
     """
     Executes a SQL query with optional parameters and returns results or error details.
+
+    Concurrent identical SELECTs (same whitespace-normalized SQL, params and fetch
+    options) run once and share the result; other statements always run.
+
+    Args:
+        max_rows (int): Stop fetching after this many rows (None fetches everything).
+        arraysize (int): Rows fetched per round trip; see plan_fetch.
+        columnar (bool): Return a SELECT as rows_to_columnar's {"columns", "rows"}
+            instead of a list of dicts.
     """
+    if not query.lstrip().upper().startswith(("SELECT", "WITH")):
+        return _execute_query(query, params, max_rows, arraysize, columnar)
+    key = (
+        " ".join(query.split()).rstrip(";"),
+        repr(sorted(params.items())) if isinstance(params, dict) else repr(params),
+        max_rows, arraysize, columnar
+    )
+    return _query_flight.do(key, _execute_query, query, params, max_rows, arraysize, columnar)
+
+
+def _execute_query(query: str, params, max_rows: int, arraysize: int, columnar: bool):
     conn = None
     cursor = None
     try:
-        conn = connect_with_retry()  # Use retry mechanism
+        with DB_CONNECT_SECONDS.time(), span("db.connect"):
+            conn = connect_with_retry()  # Use retry mechanism
         cursor = conn.cursor()
+        cursor.outputtypehandler = output_type_handler
+        if arraysize:
+            cursor.arraysize = arraysize
+            cursor.prefetchrows = arraysize + 1
 
         query = query.strip().rstrip(';')
-        logging.info("Executing query:\n%s\nParams: %s", query, params)
+        # Bind values are user data: log only the (shortened) statement and how many there are
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Executing query", extra={"fields": {"sql": summarize(query), "params": len(params or ())}})
 
-        if params:
-            cursor.execute(query, params)
-        else:
-            cursor.execute(query)
+        with DB_EXECUTE_SECONDS.time(), span("db.execute"):
+            if params:
+                cursor.execute(query, params)
+            else:
+                cursor.execute(query)
 
         if cursor.description:  # SELECT
-            columns = [col[0] for col in cursor.description]
-            rows = cursor.fetchall()
-            result = []
-            
-            for row in rows:
-                processed_row = {}
-                for col, value in zip(columns, row):
-                    if isinstance(value, oracledb.LOB):
-                        processed_row[col] = value.read()
-                    else:
-                        processed_row[col] = value 
-                result.append(processed_row)    
-
+            with DB_FETCH_SECONDS.time(), span("db.fetch") as fetch_span:
+                columns = [col[0] for col in cursor.description]
+                rows = cursor.fetchmany(max_rows) if max_rows else cursor.fetchall()
+                if not FETCH_LOBS_AS_VALUES:
+                    rows = read_lobs(cursor.description, rows)
+                result = rows_to_columnar(columns, rows) if columnar else rows_to_dicts(columns, rows)
+
+                if fetch_span is not None:
+                    fetch_span.set(rows=len(rows), arraysize=cursor.arraysize)
+            DB_FETCH_ROWS.inc(len(rows))
             return result
         else:  # DML / DDL
             conn.commit()
@@ -99,6 +219,7 @@ def execute_query(query: str, params: dict = None):
 
     except oracledb.DatabaseError as db_err:
         error_obj, = db_err.args
+        DB_ERRORS.inc(kind="database")
         logging.error("Database error:\n%s", traceback.format_exc())
         return {
             "error": "Database Error",
@@ -107,6 +228,7 @@ def execute_query(query: str, params: dict = None):
             "query": query
         }
     except Exception as e:
+        DB_ERRORS.inc(kind="unexpected")
         logging.error("Unexpected error:\n%s", traceback.format_exc())
         return {
             "error": "Unexpected Error",
@@ -126,14 +248,80 @@ def execute_query(query: str, params: dict = None):
 def extract_db_metadata(owner: str = 'chatbot_user', force_refresh=False):
     """
     Extracts comprehensive database metadata for a given owner/schema, with optional caching.
-    """
-    global _cached_metadata
 
+    With the shared snapshot enabled, a refresh in any worker is picked up by
+    the others on their next call, without querying Oracle again.
+    """
+    if (_shared_metadata is not None and _cached_metadata is not None and not force_refresh
+            and _shared_metadata.version() > _snapshot_version):
+        _metadata_flight.do(("snapshot", owner.upper()), _adopt_snapshot, owner)
     if _cached_metadata is not None and not force_refresh:
-        print("Returning cached metadata")
+        CACHE_REQUESTS.inc(cache="metadata", result="hit")
+        logger.debug("Returning cached metadata")
         return _cached_metadata
+    CACHE_REQUESTS.inc(cache="metadata", result="miss")
+    # Concurrent cold-cache callers share one extraction, and so do overlapping refreshes;
+    # a refresh never joins a cold load, which may return an older shared snapshot
+    return _metadata_flight.do((owner.upper(), force_refresh), _load_shared_metadata, owner, force_refresh)
+
+
+def _adopt_snapshot(owner: str = None, max_age: float = None) -> dict | None:
+    """
+    Replaces the local cache with the latest shared snapshot. Returns None if
+    there is none, or it is for another database or owner, or older than max_age seconds.
+    """
+    global _cached_metadata, _snapshot_version
+
+    loaded = _shared_metadata.load()
+    if loaded is None:
+        return None
+    version, snapshot = loaded
+    if snapshot.get("dsn") != _dsn_key or (owner is not None and snapshot["owner"] != owner.upper()):
+        # Remember it was seen, so callers don't reread another schema's snapshot every time
+        _snapshot_version = version
+        return None
+    if max_age is not None and time.time() - snapshot["created_at"] > max_age:
+        return None
+
+    _cached_metadata = snapshot["metadata"]
+    _snapshot_version = version
+    CACHE_REQUESTS.inc(cache="metadata_snapshot", result="hit")
+    logger.info(f"Adopted shared metadata snapshot v{version} ({len(_cached_metadata)} tables)")
+    return _cached_metadata
+
+
+def _load_shared_metadata(owner: str, force_refresh: bool) -> dict:
+    """
+    Loads metadata with the shared snapshot: under its cross-process lock, a cold
+    worker adopts a recent snapshot if there is one; otherwise this worker queries
+    Oracle and publishes the result for the others.
+    """
+    global _snapshot_version
+
+    if _shared_metadata is None:
+        return _load_metadata(owner)
+
+    with _shared_metadata.exclusive():
+        if not force_refresh:
+            metadata = _adopt_snapshot(owner, max_age=METADATA_SNAPSHOT_MAX_AGE_SECONDS)
+            if metadata is not None:
+                return metadata
 
-    print(f"Extracting metadata from database for owner: {owner}")
+        metadata = _load_metadata(owner)
+        # Partial results from a failed extraction are returned but not shared
+        if metadata and metadata is _cached_metadata:
+            try:
+                _snapshot_version = _shared_metadata.publish(
+                    {"dsn": _dsn_key, "owner": owner.upper(), "created_at": time.time(), "metadata": metadata})
+            except OSError as e:
+                logger.warning(f"Could not publish metadata snapshot: {e}")
+        return metadata
+
+
+def _load_metadata(owner: str) -> dict:
+    global _cached_metadata
+
+    logger.info(f"Extracting metadata from database for owner: {owner}")
     
     conn = None
     cursor = None
@@ -171,13 +359,17 @@ def extract_db_metadata(owner: str = 'chatbot_user', force_refresh=False):
                     "columns": [],
                     "primary_keys": [],
                     "foreign_keys": [],
-                    "table_comment": ""
+                    "table_comment": "",
+                    "num_rows": None,
+                    "last_analyzed": None
                 }
             metadata[table_name]["columns"].append({
                 "name": column_name,
                 "type": data_type,
                 "nullable": nullable,
-                "comment": col_comment or ""
+                "comment": col_comment or "",
+                "num_distinct": None,
+                "num_nulls": None
             })
 
         # 2. Extract primary keys
@@ -252,17 +444,55 @@ def extract_db_metadata(owner: str = 'chatbot_user', force_refresh=False):
             if table_name in metadata:
                 metadata[table_name]["table_comment"] = comment or ""
 
+        # 5. Extract optimizer statistics (NULL until the table has been analyzed)
+        table_stats_query = """
+            SELECT
+                table_name,
+                num_rows,
+                last_analyzed
+            FROM
+                all_tables
+            WHERE
+                owner = :owner
+        """
+        cursor.execute(table_stats_query, {"owner": owner})
+        for table_name, num_rows, last_analyzed in cursor.fetchall():
+            table_name = table_name.upper()
+            if table_name in metadata:
+                metadata[table_name]["num_rows"] = int(num_rows) if num_rows is not None else None
+                metadata[table_name]["last_analyzed"] = last_analyzed.isoformat() if last_analyzed else None
+
+        column_stats_query = """
+            SELECT
+                table_name,
+                column_name,
+                num_distinct,
+                num_nulls
+            FROM
+                all_tab_col_statistics
+            WHERE
+                owner = :owner
+        """
+        cursor.execute(column_stats_query, {"owner": owner})
+        column_stats = {
+            (table_name.upper(), column_name): (num_distinct, num_nulls)
+            for table_name, column_name, num_distinct, num_nulls in cursor.fetchall()
+        }
+        for table_name, table_meta in metadata.items():
+            for col in table_meta["columns"]:
+                num_distinct, num_nulls = column_stats.get((table_name, col["name"]), (None, None))
+                col["num_distinct"] = int(num_distinct) if num_distinct is not None else None
+                col["num_nulls"] = int(num_nulls) if num_nulls is not None else None
+
         _cached_metadata = metadata
-        print(f"✅ Successfully extracted metadata for {len(metadata)} tables")
+        logger.info(f"Successfully extracted metadata for {len(metadata)} tables")
         return metadata
 
     except Exception as e:
-        print(f"❌ Error during metadata extraction: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"Error during metadata extraction: {e}")
         # Return whatever metadata we managed to extract so far
         if metadata:
-            print(f"⚠️ Returning partial metadata for {len(metadata)} tables")
+            logger.warning(f"Returning partial metadata for {len(metadata)} tables")
             return metadata
         else:
             return {}
@@ -278,6 +508,46 @@ def extract_db_metadata(owner: str = 'chatbot_user', force_refresh=False):
             except:
                 pass
 
+
+def referenced_tables(sql: str, metadata: dict) -> list[str]:
+    """
+    Tables from the metadata whose names appear as identifiers in the SQL.
+    """
+    identifiers = {token.upper() for token in re.findall(r"[A-Za-z_][\w$#]*", sql)}
+    return [table for table in metadata if table in identifiers]
+
+
+def plan_fetch(sql: str, metadata: dict = None) -> dict:
+    """
+    Chooses a row cap and fetch arraysize from the statistics of the tables a query touches.
+    Queries on tables with at least LARGE_TABLE_ROWS rows are capped at DEFAULT_ROW_CAP rows
+    and fetched in larger batches; everything else is fetched in full.
+    """
+    if metadata is None:
+        metadata = extract_db_metadata()
+    tables = referenced_tables(sql, metadata)
+    largest = max((metadata[table].get("num_rows") or 0 for table in tables), default=0)
+
+    if largest >= LARGE_TABLE_ROWS:
+        return {"tables": tables, "estimated_rows": largest, "max_rows": DEFAULT_ROW_CAP, "arraysize": LARGE_ARRAYSIZE}
+    return {"tables": tables, "estimated_rows": largest, "max_rows": None, "arraysize": SMALL_ARRAYSIZE}
+
+
+def selective_columns(table_meta: dict, limit: int = 3) -> list[str]:
+    """
+    Columns with the most distinct values relative to the row count - the best filter candidates.
+    """
+    num_rows = table_meta.get("num_rows") or 0
+    if not num_rows:
+        return []
+    ranked = sorted(
+        (col for col in table_meta["columns"] if col.get("num_distinct")),
+        key=lambda col: col["num_distinct"],
+        reverse=True
+    )
+    return [col["name"] for col in ranked if col["num_distinct"] / num_rows >= 0.01][:limit]
+
+
 def parameterize_query(query: str):
     param_index = 1
     params = {}
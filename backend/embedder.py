@@ -1,5 +1,10 @@
 import os
+import logging
+import time
 import google.generativeai as genai
+from app_logging import summarize
+from metrics import EMBED_SECONDS, EMBED_CALLS
+from single_flight import SingleFlight
 from dotenv import load_dotenv
 
 load_dotenv
@@ -7,6 +12,20 @@ load_dotenv
 # For Gemini API key use
 genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
 
+logger = logging.getLogger(__name__)
+
+# Concurrent requests embedding the same text (e.g. the same search query) share one API call
+_embed_flight = SingleFlight("embedding")
+
+
+def _embed_content(text: str, task_type: str):
+    return genai.embed_content(
+        model="models/embedding-001",
+        content=text,
+        task_type=task_type
+    )
+
+
 def embed_texts(texts: list[str], task_type="RETRIEVAL_DOCUMENT") -> list[list[float]]:
     """
     Embeds each text individually using Gemini API (no batching).
@@ -15,18 +34,20 @@ def embed_texts(texts: list[str], task_type="RETRIEVAL_DOCUMENT") -> list[list[f
     vectors = []
 
     for i, text in enumerate(texts):
+        started = time.perf_counter()
         try:
-            result = genai.embed_content(
-                model="models/embedding-001",
-                content=text,
-                task_type=task_type
-            )
+            result = _embed_flight.do((task_type, text), _embed_content, text, task_type)
             if isinstance(result, dict) and "embedding" in result:
                 vectors.append(result["embedding"])
+                EMBED_CALLS.inc(task_type=task_type, outcome="ok")
             else:
-                print(f"[⚠️] Unexpected response at index {i}: {result}")
+                EMBED_CALLS.inc(task_type=task_type, outcome="unexpected")
+                logger.warning(f"Unexpected response at index {i}", extra={"fields": {"response": summarize(result)}})
         except Exception as e:
-            print(f"[❌] Error embedding text at index {i}: {e}")
+            EMBED_CALLS.inc(task_type=task_type, outcome="error")
+            logger.error(f"Error embedding text at index {i}: {e}")
             vectors.append([])
+        finally:
+            EMBED_SECONDS.observe(time.perf_counter() - started, task_type=task_type)
 
     return vectors
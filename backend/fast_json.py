@@ -0,0 +1,51 @@
+import base64
+import datetime
+import decimal
+import json
+from fastapi.responses import JSONResponse
+
+# orjson is optional: several times faster than json and native on datetimes
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def default(value):
+    """
+    Encodes the Oracle result types neither encoder handles natively.
+    """
+    if isinstance(value, decimal.Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return base64.b64encode(bytes(value)).decode("ascii")
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds()
+    if hasattr(value, "read"):  # LOB that was not read at fetch time
+        data = value.read()
+        return data if isinstance(data, str) else default(data)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse that encodes plain data directly (no jsonable_encoder pass),
+    with orjson when it is installed.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
@@ -0,0 +1,106 @@
+import gzip
+import hashlib
+import os
+from fastapi import Request, Response
+from dotenv import load_dotenv
+
+# brotli is optional: without it only gzip is offered
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+load_dotenv()
+
+# Bodies smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+
+
+def content_etag(body: bytes) -> str:
+    """
+    Strong validator for a response body; identical content gives the same tag in every worker.
+    """
+    return hashlib.sha256(body).hexdigest()[:32]
+
+
+def negotiate_encoding(request: Request, size: int) -> str | None:
+    """
+    "br" or "gzip" when the client accepts it and the body is worth compressing.
+    """
+    if size < COMPRESS_MIN_BYTES:
+        return None
+    accepted = set()
+    for token in request.headers.get("accept-encoding", "").split(","):
+        coding, _, params = token.partition(";")
+        params = params.replace(" ", "")
+        if params.startswith("q="):
+            try:
+                if float(params[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip().lower())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """
+    True if If-None-Match names this body's tag, in any content encoding.
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    for tag in header.split(","):
+        tag = tag.strip().removeprefix("W/").strip('"')
+        if tag.split("-", 1)[0] == etag:
+            return True
+    return False
+
+
+def compress_response(request: Request, response: Response) -> Response:
+    """
+    Compresses an already rendered response in place if the client accepts it.
+    """
+    encoding = negotiate_encoding(request, len(response.body))
+    response.headers["Vary"] = "Accept-Encoding"
+    if encoding:
+        response.body = compress(response.body, encoding)
+        response.headers["Content-Encoding"] = encoding
+        response.headers["Content-Length"] = str(len(response.body))
+    return response
+
+
+def conditional_response(request: Request, body: bytes, etag: str, variants: dict = None,
+                         media_type: str = "application/json") -> Response:
+    """
+    304 when If-None-Match matches etag, otherwise body in the negotiated encoding.
+
+    variants memoizes compressed bodies by encoding, so callers that keep it
+    alongside a cached body compress each encoding once.
+    """
+    encoding = negotiate_encoding(request, len(body))
+    headers = {"ETag": f'"{etag}-{encoding}"' if encoding else f'"{etag}"', "Vary": "Accept-Encoding"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        if variants is None:
+            variants = {}
+        if encoding not in variants:
+            variants[encoding] = compress(body, encoding)
+        body = variants[encoding]
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=media_type, headers=headers)
@@ -0,0 +1,249 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dotenv import load_dotenv
+from shared_state import SHARED_STATE_DIR
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Finished jobs kept around for GET /jobs/{id}
+JOB_HISTORY_LIMIT = int(os.getenv("JOB_HISTORY_LIMIT", "50"))
+# Jobs publish their state here so any worker on the host can report, cancel and
+# serve them; records left by earlier runs are removed after JOB_RECORD_TTL_SECONDS
+JOBS_DIR = os.path.join(SHARED_STATE_DIR, "jobs")
+JOB_RECORD_TTL_SECONDS = int(os.getenv("JOB_RECORD_TTL_SECONDS", str(24 * 3600)))
+
+JOB_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+ACTIVE_STATES = ("queued", "running")
+
+
+class Job:
+    """
+    A background task with progress fields that the task updates as it runs.
+    Every change is published to JOBS_DIR for the other workers.
+    """
+
+    def __init__(self, kind: str, key: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.key = key
+        self.status = "queued"
+        self.stage = "queued"
+        self.tables_total = 0
+        self.tables_processed = 0
+        self.errors = []
+        self.result = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def update(self, **fields):
+        with self._lock:
+            for name, value in fields.items():
+                setattr(self, name, value)
+        self._publish()
+
+    def add_error(self, message: str):
+        with self._lock:
+            self.errors.append(message)
+        self._publish()
+
+    @property
+    def cancelled(self) -> bool:
+        # Another worker cancels by leaving a marker file next to the record
+        if not self.cancel_event.is_set() and os.path.exists(_record_path(self.id, ".cancel")):
+            self.cancel_event.set()
+        return self.cancel_event.is_set()
+
+    def _publish(self):
+        record = dict(self.to_dict(), key=self.key, pid=os.getpid())
+        path = _record_path(self.id)
+        partial = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(JOBS_DIR, exist_ok=True)
+            with open(partial, "w", encoding="utf-8") as f:
+                json.dump(record, f, default=str)
+            os.replace(partial, path)
+        except OSError as e:
+            logger.warning(f"Could not publish job {self.id}: {e}")
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            end = self.finished_at or time.time()
+            elapsed = end - self.started_at if self.started_at else 0.0
+            throughput = self.tables_processed / elapsed if elapsed > 0 else 0.0
+            remaining = max(self.tables_total - self.tables_processed, 0)
+            eta = remaining / throughput if throughput > 0 and self.status == "running" else None
+            return {
+                "job_id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "stage": self.stage,
+                "tables_total": self.tables_total,
+                "tables_processed": self.tables_processed,
+                "elapsed_seconds": round(elapsed, 2),
+                "tables_per_second": round(throughput, 2),
+                "eta_seconds": round(eta, 1) if eta is not None else None,
+                "errors": list(self.errors),
+                "result": self.result,
+            }
+
+
+class JobRecord:
+    """
+    Read-only view of a job running (or run) by another worker, from its published record.
+    """
+
+    def __init__(self, record: dict):
+        self._record = record
+        self.id = record["job_id"]
+        self.kind = record["kind"]
+        self.key = record["key"]
+        self.status = record["status"]
+        self.result = record["result"]
+        if self.status in ACTIVE_STATES and not _process_alive(record["pid"]):
+            # The worker running it exited before the job finished
+            self.status = "failed"
+            self._record = dict(record, status="failed", stage="failed",
+                                errors=record["errors"] + ["Worker process exited"])
+
+    def to_dict(self) -> dict:
+        record = dict(self._record)
+        record.pop("key", None)
+        record.pop("pid", None)
+        return record
+
+
+def _record_path(job_id: str, suffix: str = ".json") -> str:
+    return os.path.join(JOBS_DIR, job_id + suffix)
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass  # exists but not ours to signal, or not checkable on this platform
+    return True
+
+
+def _load_record(job_id: str) -> JobRecord | None:
+    try:
+        with open(_record_path(job_id), encoding="utf-8") as f:
+            return JobRecord(json.load(f))
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _remove_record(job_id: str):
+    for suffix in (".json", ".cancel"):
+        try:
+            os.remove(_record_path(job_id, suffix))
+        except OSError:
+            pass
+
+
+_jobs = OrderedDict()
+_jobs_lock = threading.Lock()
+
+
+def _prune_history():
+    finished = [job_id for job_id, job in _jobs.items() if job.status not in ACTIVE_STATES]
+    for job_id in finished[:max(len(finished) - JOB_HISTORY_LIMIT, 0)]:
+        del _jobs[job_id]
+        _remove_record(job_id)
+
+    # Records left behind by workers that have since stopped
+    cutoff = time.time() - JOB_RECORD_TTL_SECONDS
+    try:
+        names = os.listdir(JOBS_DIR)
+    except OSError:
+        return
+    for name in names:
+        path = os.path.join(JOBS_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def _run(job: Job, target):
+    job.update(status="running", stage="starting", started_at=time.time())
+    try:
+        result = target(job)
+        job.update(
+            status="cancelled" if job.cancelled else "succeeded",
+            stage="cancelled" if job.cancelled else "done",
+            result=result,
+        )
+    except Exception as e:
+        logger.exception(f"Job {job.id} ({job.kind}) failed: {e}")
+        job.add_error(str(e))
+        job.update(status="failed", stage="failed")
+    finally:
+        job.update(finished_at=time.time())
+
+
+def submit_job(kind: str, key: str, target) -> tuple[Job, bool]:
+    """
+    Starts target(job) on a background thread.
+
+    A job whose key matches one that is still queued or running is not started
+    again; the running job is returned instead.
+
+    Returns:
+        (job, deduplicated)
+    """
+    with _jobs_lock:
+        for job in _jobs.values():
+            if job.key == key and job.status in ACTIVE_STATES and not job.cancelled:
+                return job, True
+
+        job = Job(kind, key)
+        _jobs[job.id] = job
+        _prune_history()
+    job._publish()
+
+    threading.Thread(target=_run, args=(job, target), name=f"job-{kind}-{job.id[:8]}", daemon=True).start()
+    return job, False
+
+
+def get_job(job_id: str) -> Job | JobRecord | None:
+    """
+    The job with this id, whichever worker on the host started it.
+    """
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+    if job is None and JOB_ID_RE.match(job_id):
+        job = _load_record(job_id)
+    return job
+
+
+def cancel_job(job_id: str) -> Job | JobRecord | None:
+    """
+    Asks a job to stop. The task checks job.cancelled between units of work.
+    """
+    job = get_job(job_id)
+    if isinstance(job, Job):
+        if job.status in ACTIVE_STATES:
+            job.cancel_event.set()
+            job.update(stage="cancelling")
+    elif job and job.status in ACTIVE_STATES:
+        # Running in another worker: leave the marker its task polls for
+        try:
+            open(_record_path(job_id, ".cancel"), "w").close()
+        except OSError as e:
+            logger.warning(f"Could not cancel job {job_id}: {e}")
+        job = JobRecord(dict(job._record, stage="cancelling"))
+    return job
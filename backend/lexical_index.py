@@ -0,0 +1,117 @@
+import math
+import re
+from collections import Counter
+
+# Words that show up in almost every question and carry no schema signal
+STOPWORDS = {
+    "a", "an", "and", "are", "all", "any", "as", "at", "by", "for", "from", "get", "give",
+    "how", "i", "in", "is", "list", "many", "me", "of", "on", "or", "show", "the", "their",
+    "to", "what", "which", "who", "with", "each", "per", "find", "display", "whose",
+}
+
+# Field weights: a hit on the table name counts more than a hit on a column comment
+TABLE_NAME_WEIGHT = 3
+COLUMN_NAME_WEIGHT = 1
+COMMENT_WEIGHT = 1
+
+
+def _normalize(token: str) -> str:
+    # Cheap plural folding so "employees" matches EMPLOYEES and "salaries" matches SALARY
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str, drop_stopwords: bool = False) -> list[str]:
+    """
+    Lowercases and splits text on anything that is not a letter or digit,
+    so identifiers like EMP_ID become ["emp", "id"].
+    """
+    tokens = []
+    for raw in re.split(r"[^a-z0-9]+", (text or "").lower()):
+        if not raw or (drop_stopwords and raw in STOPWORDS):
+            continue
+        tokens.append(_normalize(raw))
+    return tokens
+
+
+class SchemaLexicalIndex:
+    """
+    BM25 inverted index over table names, column names and comments.
+    One document per table.
+    """
+
+    def __init__(self, metadata: dict, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}      # token -> {table: term frequency}
+        self.doc_lengths = {}   # table -> weighted token count
+        self.name_tokens = {}   # table -> set of tokens in the table name
+
+        for table, table_meta in metadata.items():
+            terms = Counter()
+            name_tokens = tokenize(table)
+            self.name_tokens[table] = set(name_tokens)
+            for token in name_tokens:
+                terms[token] += TABLE_NAME_WEIGHT
+            for token in tokenize(table_meta.get("table_comment", "")):
+                terms[token] += COMMENT_WEIGHT
+            for col in table_meta.get("columns", []):
+                for token in tokenize(col["name"]):
+                    terms[token] += COLUMN_NAME_WEIGHT
+                for token in tokenize(col.get("comment", "")):
+                    terms[token] += COMMENT_WEIGHT
+
+            self.doc_lengths[table] = sum(terms.values())
+            for token, tf in terms.items():
+                self.postings.setdefault(token, {})[table] = tf
+
+        self.doc_count = len(self.doc_lengths)
+        self.avg_doc_length = (
+            sum(self.doc_lengths.values()) / self.doc_count if self.doc_count else 0
+        )
+
+    def _idf(self, token: str) -> float:
+        df = len(self.postings.get(token, ()))
+        return math.log(1 + (self.doc_count - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, top_k: int = 5) -> list[dict]:
+        """
+        Returns up to top_k hits as [{"table", "score", "name_match"}], best first.
+        name_match is True when every token of the table name appears in the query.
+        """
+        query_tokens = set(tokenize(query, drop_stopwords=True))
+        scores = {}
+
+        for token in query_tokens:
+            postings = self.postings.get(token)
+            if not postings:
+                continue
+            idf = self._idf(token)
+            for table, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[table] / self.avg_doc_length)
+                scores[table] = scores.get(table, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [
+            {
+                "table": table,
+                "score": score,
+                "name_match": bool(self.name_tokens[table]) and self.name_tokens[table] <= query_tokens,
+            }
+            for table, score in ranked
+        ]
+
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = 60) -> list[tuple[str, float]]:
+    """
+    Fuses several ranked lists of table names into one, scoring each table
+    by the sum of 1 / (k + rank) over the lists it appears in.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, table in enumerate(ranking, start=1):
+            fused[table] = fused.get(table, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
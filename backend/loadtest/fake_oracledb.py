@@ -0,0 +1,371 @@
+"""
+SQLite-backed stand-in for the parts of python-oracledb the backend uses.
+
+The schema and sample rows come from `Chat Bot.sql` (plus the users and chat
+tables), translated to SQLite on load. The data dictionary views read by
+extract_db_metadata (all_tab_columns, all_constraints, ...) are materialized
+from SQLite's own catalog, so the app sees the same metadata it would on Oracle.
+Oracle-only syntax the app emits (SYSTIMESTAMP, DBMS_LOB, ROWNUM over an
+ordered view, RETURNING ... INTO) is rewritten per statement.
+"""
+import datetime
+import os
+import re
+import sqlite3
+import threading
+import time
+
+AUTH_MODE_DEFAULT = 0
+DB_TYPE_DATE = "DATE"
+DB_TYPE_TIMESTAMP = "TIMESTAMP"
+DB_TYPE_TIMESTAMP_TZ = "TIMESTAMP_TZ"
+DB_TYPE_TIMESTAMP_LTZ = "TIMESTAMP_LTZ"
+DB_TYPE_LONG = "LONG"
+DB_TYPE_LONG_NVARCHAR = "LONG_NVARCHAR"
+DB_TYPE_LONG_RAW = "LONG_RAW"
+DB_TYPE_NUMBER = "NUMBER"
+DB_TYPE_VARCHAR = "VARCHAR"
+DB_TYPE_NVARCHAR = "NVARCHAR"
+DB_TYPE_CHAR = "CHAR"
+DB_TYPE_NCHAR = "NCHAR"
+DB_TYPE_RAW = "RAW"
+DB_TYPE_BINARY_FLOAT = "BINARY_FLOAT"
+DB_TYPE_BINARY_DOUBLE = "BINARY_DOUBLE"
+DB_TYPE_BINARY_INTEGER = "BINARY_INTEGER"
+DB_TYPE_CLOB = "CLOB"
+DB_TYPE_NCLOB = "NCLOB"
+DB_TYPE_BLOB = "BLOB"
+
+OWNER = os.getenv("DB_USER", "CHATBOT_USER").upper()
+# Simulated network round trip per execute, in milliseconds
+FAKE_DB_LATENCY_MS = float(os.getenv("FAKE_DB_LATENCY_MS", "2"))
+
+_db_path = None
+_seed_lock = threading.Lock()
+
+
+class Error(Exception):
+    pass
+
+
+class _ErrorObject:
+    def __init__(self, message: str, code: int = 0, offset: int = 0):
+        self.message = message
+        self.code = code
+        self.offset = offset
+
+    def __str__(self):
+        return self.message
+
+
+class DatabaseError(Error):
+    def __init__(self, message, code: int = 0):
+        # Like oracledb, also accepts an error object (e.g. from getbatcherrors())
+        super().__init__(message if isinstance(message, _ErrorObject) else _ErrorObject(message, code))
+
+
+class LOB:
+    """Never returned (CLOBs come back as str) but isinstance checks need the type."""
+
+    def read(self):
+        return ""
+
+
+def init_oracle_client(lib_dir=None, **kwargs):
+    pass
+
+
+def connect(user=None, password=None, dsn=None, mode=None, **kwargs):
+    if _db_path is None:
+        raise DatabaseError("fake_oracledb.seed() has not been called", 12541)
+    return Connection(sqlite3.connect(_db_path, timeout=30, check_same_thread=False))
+
+
+class Connection:
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+
+    def cursor(self):
+        return Cursor(self._conn)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+
+
+class Var:
+    def __init__(self, arraysize: int = 1):
+        self._values = [[] for _ in range(arraysize)]
+
+    def getvalue(self, pos: int = 0):
+        return self._values[pos]
+
+
+RETURNING_RE = re.compile(r"\s+RETURNING\s+(.+?)\s+INTO\s+(.+?)\s*$", re.IGNORECASE | re.DOTALL)
+ROWNUM_RE = re.compile(r"\bWHERE\s+ROWNUM\s*<=\s*(:\w+|\d+)\s*$", re.IGNORECASE)
+POSITIONAL_RE = re.compile(r":(\d+)\b")
+
+
+def translate(sql: str) -> str:
+    """
+    Rewrites the Oracle dialect the backend produces into SQLite.
+    """
+    sql = sql.strip().rstrip(";")
+    sql = re.sub(r"\bSYS(?:TIMESTAMP|DATE)\b", "CURRENT_TIMESTAMP", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"DBMS_LOB\.SUBSTR\s*\(\s*([\w.]+)\s*,\s*(:?\w+)\s*,\s*1\s*\)", r"substr(\1, 1, \2)", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"DBMS_LOB\.GETLENGTH\s*\(", "length(", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"\bTO_DATE\s*\(\s*(:\w+|'[^']*')\s*,\s*'[^']*'\s*\)", r"\1", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"\bNVL\s*\(", "coalesce(", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"\bFROM\s+dual\b", "", sql, flags=re.IGNORECASE)
+    # ROWNUM filter over an ordered inline view (the 11g "top n" idiom) is a LIMIT
+    sql = ROWNUM_RE.sub(r"LIMIT \1", sql)
+    # :1, :2 positional binds -> ?1, ?2
+    return POSITIONAL_RE.sub(r"?\1", sql)
+
+
+class Cursor:
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+        self._cursor = conn.cursor()
+        self._input_vars = None
+        self._rows = None
+        self.description = None
+        self.arraysize = 100
+        self.prefetchrows = 2
+        self.outputtypehandler = None  # SQLite already returns plain values
+        self.rowcount = 0
+        self._batch_errors = []
+
+    def var(self, typ=None, arraysize: int = 1, **kwargs):
+        return Var(arraysize)
+
+    def setinputsizes(self, *sizes):
+        self._input_vars = sizes
+
+    def _run(self, sql: str, params):
+        if FAKE_DB_LATENCY_MS:
+            time.sleep(FAKE_DB_LATENCY_MS / 1000)
+        try:
+            return self._cursor.execute(sql, params)
+        except sqlite3.Error as e:
+            raise DatabaseError(f"{type(e).__name__}: {e}", 900) from e
+
+    def _execute_returning(self, sql: str, params, out_vars: list, row_index: int = 0):
+        match = RETURNING_RE.search(sql)
+        sql = sql[:match.start()] + f" RETURNING {match.group(1)}"
+        returned = self._run(sql, params).fetchone()
+        if returned is None:
+            return  # no row matched: the variables stay empty, as in Oracle
+        for var, value in zip(out_vars, returned):
+            if isinstance(value, str) and re.match(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}", value):
+                value = datetime.datetime.fromisoformat(value)
+            var._values[row_index] = [value]
+
+    def execute(self, sql: str, params=None):
+        sql = translate(sql)
+        params = params if params is not None else ()
+        self.description = None
+        self._rows = None
+
+        if RETURNING_RE.search(sql):
+            values = list(params)
+            out_vars = [value for value in values if isinstance(value, Var)]
+            in_values = tuple(value for value in values if not isinstance(value, Var))
+            self._execute_returning(sql, in_values, out_vars)
+            self.rowcount = 1
+            return self
+
+        cursor = self._run(sql, params)
+        if cursor.description:
+            self.description = [(col[0].upper(), None, None, None, None, None, True) for col in cursor.description]
+            self._rows = cursor.fetchall()
+        self.rowcount = cursor.rowcount
+        return self
+
+    def executemany(self, sql: str, rows: list, batcherrors: bool = False):
+        sql = translate(sql)
+        out_vars = [value for value in (self._input_vars or ()) if isinstance(value, Var)]
+        self._batch_errors = []
+        for i, row in enumerate(rows):
+            try:
+                if out_vars:
+                    self._execute_returning(sql, tuple(row), out_vars, row_index=i)
+                else:
+                    self._run(sql, tuple(row))
+            except DatabaseError as e:
+                if not batcherrors:
+                    raise
+                error, = e.args
+                self._batch_errors.append(_ErrorObject(error.message, error.code, offset=i))
+        self.rowcount = len(rows) - len(self._batch_errors)
+
+    def getbatcherrors(self):
+        return self._batch_errors
+
+    def fetchone(self):
+        if not self._rows:
+            return None
+        return self._rows.pop(0)
+
+    def fetchmany(self, size: int = None):
+        size = size or self.arraysize
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def fetchall(self):
+        rows, self._rows = self._rows or [], []
+        return rows
+
+    def close(self):
+        self._cursor.close()
+
+
+# --- Seeding ---
+
+APP_TABLES = """
+CREATE TABLE USERS (
+    id INTEGER PRIMARY KEY,
+    username VARCHAR2(50) UNIQUE NOT NULL,
+    password_hash VARCHAR2(255) NOT NULL,
+    full_name VARCHAR2(100),
+    email VARCHAR2(100) UNIQUE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE CHAT_SESSIONS (
+    id INTEGER PRIMARY KEY,
+    user_id NUMBER NOT NULL,
+    title VARCHAR2(200),
+    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT fk_session_user FOREIGN KEY (user_id) REFERENCES USERS(id)
+);
+CREATE TABLE CHAT_MESSAGES (
+    id INTEGER PRIMARY KEY,
+    session_id NUMBER NOT NULL,
+    role VARCHAR2(20),
+    content CLOB,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT fk_message_session FOREIGN KEY (session_id) REFERENCES CHAT_SESSIONS(id) ON DELETE CASCADE
+);
+CREATE INDEX chat_messages_session_idx ON chat_messages (session_id, created_at, id);
+"""
+
+DICTIONARY_TABLES = """
+CREATE TABLE all_tab_columns (owner COLLATE NOCASE, table_name, column_name, data_type, nullable, column_id);
+CREATE TABLE all_col_comments (owner COLLATE NOCASE, table_name, column_name, comments);
+CREATE TABLE all_tab_comments (owner COLLATE NOCASE, table_name, comments);
+CREATE TABLE all_constraints (owner COLLATE NOCASE, constraint_name, constraint_type, table_name, r_owner COLLATE NOCASE, r_constraint_name);
+CREATE TABLE all_cons_columns (owner COLLATE NOCASE, constraint_name, table_name, column_name, position);
+CREATE TABLE all_tables (owner COLLATE NOCASE, table_name, num_rows, last_analyzed);
+CREATE TABLE all_tab_col_statistics (owner COLLATE NOCASE, table_name, column_name, num_distinct, num_nulls);
+"""
+
+
+def _split_statements(script: str) -> list[str]:
+    """
+    Top-level statements of a SQL*Plus script; PL/SQL blocks ending in "/" are skipped.
+    """
+    statements = []
+    current = []
+    in_block = False
+    for line in script.splitlines():
+        stripped = line.strip()
+        if not current and re.match(r"^(BEGIN|DECLARE|CREATE\s+OR\s+REPLACE\s+TRIGGER)\b", stripped, re.IGNORECASE):
+            in_block = True
+        if in_block:
+            if stripped == "/":
+                in_block = False
+            continue
+        if not current and (not stripped or stripped.startswith("--")):
+            continue
+        current.append(line)
+        if stripped.endswith(";"):
+            statements.append("\n".join(current).rstrip().rstrip(";"))
+            current = []
+    return statements
+
+
+def _translate_seed(statement: str) -> str | None:
+    head = statement.lstrip().upper()
+    if not head.startswith(("CREATE TABLE", "INSERT", "UPDATE")):
+        return None
+    statement = re.sub(r"\b\w+_seq\.NEXTVAL\b", "NULL", statement, flags=re.IGNORECASE)
+    statement = re.sub(r"\bDATE\s+'([^']*)'", r"'\1'", statement)
+    statement = re.sub(r"\bTIMESTAMP\s+'([^']*)'", r"'\1'", statement)
+    statement = re.sub(r"\b(\w+)\s+NUMBER\s+PRIMARY\s+KEY\b", r"\1 INTEGER PRIMARY KEY", statement, flags=re.IGNORECASE)
+    return translate(statement)
+
+
+def _dictionary_type(declared: str) -> str:
+    declared = (declared or "").upper()
+    base = declared.split("(")[0].strip()
+    return {"INTEGER": "NUMBER"}.get(base, base or "VARCHAR2")
+
+
+def _populate_dictionary(conn: sqlite3.Connection):
+    conn.executescript(DICTIONARY_TABLES)
+    tables = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'all_%' AND name NOT LIKE 'sqlite_%'"
+    )]
+    for table in tables:
+        upper = table.upper()
+        row_count = conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+        # last_analyzed stays NULL (never analyzed): SQLite would return a string where Oracle returns a DATE
+        conn.execute("INSERT INTO all_tables VALUES (?, ?, ?, ?)", (OWNER, upper, row_count, None))
+        conn.execute("INSERT INTO all_tab_comments VALUES (?, ?, ?)", (OWNER, upper, f"{upper.replace('_', ' ').title()} table"))
+
+        pk_columns = []
+        for cid, name, declared, notnull, default, pk in conn.execute(f'PRAGMA table_info("{table}")'):
+            column = name.upper()
+            conn.execute("INSERT INTO all_tab_columns VALUES (?, ?, ?, ?, ?, ?)",
+                         (OWNER, upper, column, _dictionary_type(declared), "N" if notnull or pk else "Y", cid + 1))
+            conn.execute("INSERT INTO all_col_comments VALUES (?, ?, ?, NULL)", (OWNER, upper, column))
+            distinct, nulls = conn.execute(
+                f'SELECT COUNT(DISTINCT "{name}"), SUM("{name}" IS NULL) FROM "{table}"'
+            ).fetchone()
+            conn.execute("INSERT INTO all_tab_col_statistics VALUES (?, ?, ?, ?, ?)", (OWNER, upper, column, distinct, nulls or 0))
+            if pk:
+                pk_columns.append((pk, column))
+
+        if pk_columns:
+            conn.execute("INSERT INTO all_constraints VALUES (?, ?, 'P', ?, NULL, NULL)", (OWNER, f"PK_{upper}", upper))
+            for position, column in sorted(pk_columns):
+                conn.execute("INSERT INTO all_cons_columns VALUES (?, ?, ?, ?, ?)", (OWNER, f"PK_{upper}", upper, column, position))
+
+    for table in tables:
+        upper = table.upper()
+        for fk_id, seq, ref_table, from_col, to_col, *_ in conn.execute(f'PRAGMA foreign_key_list("{table}")').fetchall():
+            name = f"FK_{upper}_{fk_id}"
+            conn.execute("INSERT INTO all_constraints VALUES (?, ?, 'R', ?, ?, ?)", (OWNER, name, upper, OWNER, f"PK_{ref_table.upper()}"))
+            conn.execute("INSERT INTO all_cons_columns VALUES (?, ?, ?, ?, ?)", (OWNER, name, upper, from_col.upper(), seq + 1))
+
+
+def seed(path: str, schema_script: str, users: list[tuple] = ()):
+    """
+    Creates the SQLite database at `path` from an Oracle schema script and
+    points connect() at it.
+
+    Args:
+        users: (username, password_hash) rows to add to USERS.
+    """
+    global _db_path
+    with _seed_lock:
+        if os.path.exists(path):
+            os.remove(path)
+        conn = sqlite3.connect(path)
+        conn.execute("PRAGMA journal_mode = WAL")
+        for statement in _split_statements(schema_script):
+            translated = _translate_seed(statement)
+            if translated:
+                conn.execute(translated)
+        conn.executescript(APP_TABLES)
+        conn.executemany("INSERT INTO USERS (username, password_hash) VALUES (?, ?)", list(users))
+        conn.commit()
+        _populate_dictionary(conn)
+        conn.commit()
+        conn.close()
+        _db_path = path
@@ -0,0 +1,230 @@
+"""
+Stand-ins for the external services the backend calls during a load test:
+Gemini embeddings, the Pinecone index, and the LM Studio completion endpoint.
+Each one sleeps for a configurable latency so the app sees realistic waits
+without the network.
+"""
+import hashlib
+import json
+import math
+import os
+import re
+import sys
+import threading
+import time
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FAKE_EMBED_LATENCY_MS = float(os.getenv("FAKE_EMBED_LATENCY_MS", "40"))
+FAKE_VECTOR_LATENCY_MS = float(os.getenv("FAKE_VECTOR_LATENCY_MS", "30"))
+EMBED_DIMENSION = 768
+
+
+def fake_embedding(text: str, dimension: int = EMBED_DIMENSION) -> list[float]:
+    """
+    Deterministic unit vector built from hashed word features, so texts that
+    share words land near each other.
+    """
+    vector = [0.0] * dimension
+    for word in re.findall(r"\w+", text.lower()):
+        digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+        slot = int.from_bytes(digest[:4], "little") % dimension
+        vector[slot] += 1.0 if digest[4] & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+# --- google.generativeai ---
+
+def _embed_content(model=None, content="", task_type=None, **kwargs):
+    time.sleep(FAKE_EMBED_LATENCY_MS / 1000)
+    return {"embedding": fake_embedding(content)}
+
+
+def _genai_module() -> types.ModuleType:
+    module = types.ModuleType("google.generativeai")
+    module.configure = lambda **kwargs: None
+    module.embed_content = _embed_content
+    return module
+
+
+# --- pinecone ---
+
+class _Match(dict):
+    pass
+
+
+class _FetchResponse:
+    def __init__(self, vectors: dict):
+        self.vectors = vectors
+
+
+class _Vector:
+    def __init__(self, values, metadata):
+        self.values = values
+        self.metadata = metadata
+
+
+class FakeIndex:
+    def __init__(self):
+        self._namespaces = {}
+        self._lock = threading.Lock()
+
+    def upsert(self, vectors, namespace=""):
+        time.sleep(FAKE_VECTOR_LATENCY_MS / 1000)
+        with self._lock:
+            store = self._namespaces.setdefault(namespace, {})
+            for _id, values, metadata in vectors:
+                store[_id] = _Vector(values, metadata)
+        return {"upserted_count": len(vectors)}
+
+    def query(self, vector, top_k=5, namespace="", include_metadata=False, include_values=False, **kwargs):
+        time.sleep(FAKE_VECTOR_LATENCY_MS / 1000)
+        with self._lock:
+            items = list(self._namespaces.get(namespace, {}).items())
+        scored = [
+            _Match(id=_id, score=sum(a * b for a, b in zip(vector, stored.values)))
+            for _id, stored in items
+        ]
+        scored.sort(key=lambda match: match["score"], reverse=True)
+        return {"matches": scored[:top_k]}
+
+    def list(self, prefix="", namespace=""):
+        with self._lock:
+            ids = [_id for _id in self._namespaces.get(namespace, {}) if _id.startswith(prefix)]
+        for start in range(0, len(ids), 100):
+            yield ids[start:start + 100]
+
+    def fetch(self, ids, namespace=""):
+        with self._lock:
+            store = self._namespaces.get(namespace, {})
+            return _FetchResponse({_id: store[_id] for _id in ids if _id in store})
+
+    def delete(self, ids, namespace=""):
+        with self._lock:
+            store = self._namespaces.get(namespace, {})
+            for _id in ids:
+                store.pop(_id, None)
+
+    def describe_index_stats(self):
+        with self._lock:
+            return {"namespaces": {name: {"vector_count": len(store)} for name, store in self._namespaces.items()}}
+
+
+class _IndexList(list):
+    def names(self):
+        return list(self)
+
+
+_index = FakeIndex()
+
+
+class FakePinecone:
+    def __init__(self, api_key=None, **kwargs):
+        self._indexes = _IndexList()
+
+    def list_indexes(self):
+        return self._indexes
+
+    def create_index(self, name, **kwargs):
+        self._indexes.append(name)
+
+    def Index(self, name):
+        return _index
+
+
+def _pinecone_module() -> types.ModuleType:
+    module = types.ModuleType("pinecone")
+    module.Pinecone = FakePinecone
+    module.ServerlessSpec = lambda **kwargs: kwargs
+    return module
+
+
+def install():
+    """
+    Replaces oracledb, pinecone and google.generativeai in sys.modules.
+    Must run before any backend module is imported.
+    """
+    from loadtest import fake_oracledb
+
+    sys.modules["oracledb"] = fake_oracledb
+    sys.modules["pinecone"] = _pinecone_module()
+    genai = _genai_module()
+    try:
+        import google
+    except ImportError:
+        google = types.ModuleType("google")
+        google.__path__ = []
+        sys.modules["google"] = google
+    google.generativeai = genai
+    sys.modules["google.generativeai"] = genai
+
+
+def seed_vectors(metadata: dict, namespace: str):
+    """
+    Gives every table a vector, as a completed /embed-metadata sync would.
+    """
+    from oracle_metadata import build_table_text
+
+    _index.upsert(
+        [(f"table-{table}", fake_embedding(build_table_text(table, meta)), {}) for table, meta in metadata.items()],
+        namespace=namespace
+    )
+
+
+# --- LM Studio (OpenAI-compatible chat completions) ---
+
+# Prompt keyword -> SQL the "model" answers with. Every statement is valid on
+# both Oracle and the SQLite stand-in, and avoids "*" (clean_ai_output strips it).
+CANNED_SQL = [
+    ("salary", "SELECT e.first_name, e.last_name, e.salary FROM EMPLOYEES e WHERE e.salary > 60000 ORDER BY e.salary DESC"),
+    ("department", "SELECT d.dept_name, COUNT(e.emp_id) FROM DEPARTMENTS d LEFT JOIN EMPLOYEES e ON e.dept_id = d.dept_id GROUP BY d.dept_name"),
+    ("gatepass", "SELECT g.gatepass_number, g.status, e.first_name FROM GATEPASS g JOIN EMPLOYEES e ON e.emp_id = g.emp_id WHERE g.status = 'COMPLETED'"),
+    ("visitor", "SELECT v.visitor_name, v.company, v.host_emp_id FROM VISITORS v"),
+    ("project", "SELECT p.project_name, p.budget, d.dept_name FROM PROJECTS p LEFT JOIN DEPARTMENTS d ON d.dept_id = p.dept_id"),
+    ("asset", "SELECT a.asset_tag, a.asset_name, a.category FROM ASSETS a WHERE a.status IN ('ACTIVE', 'IN_USE')"),
+]
+DEFAULT_SQL = "SELECT e.emp_code, e.first_name, e.last_name, e.job_title FROM EMPLOYEES e"
+
+
+def canned_sql(prompt: str) -> str:
+    prompt = prompt.lower()
+    for keyword, sql in CANNED_SQL:
+        if keyword in prompt:
+            return sql
+    return DEFAULT_SQL
+
+
+class _CompletionHandler(BaseHTTPRequestHandler):
+    latency_ms = 200.0
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        prompt = (body.get("messages") or [{}])[-1].get("content", "")
+        time.sleep(self.latency_ms / 1000)
+        payload = json.dumps({
+            "id": "chatcmpl-loadtest",
+            "object": "chat.completion",
+            "model": body.get("model"),
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": canned_sql(prompt)}}],
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_completion_server(port: int = 0, latency_ms: float = 200.0) -> ThreadingHTTPServer:
+    """
+    Serves POST <any path> as an OpenAI-compatible chat completion on a daemon thread.
+    The bound port is server.server_address[1].
+    """
+    handler = type("CompletionHandler", (_CompletionHandler,), {"latency_ms": latency_ms})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,332 @@
+"""
+End-to-end load test of the API.
+
+Starts a stub LM Studio server and the app (loadtest.serve, on SQLite and fake
+Pinecone / Gemini), logs in, and replays a weighted mix of /query,
+/db-direct, /similar-metadata and session calls from concurrent async clients.
+Prints throughput and latency percentiles per scenario and compares them with
+a saved baseline:
+
+    cd backend
+    python -m loadtest.run --duration 60 --concurrency 16 --save-baseline
+    python -m loadtest.run --duration 60 --concurrency 16      # exit 1 on regression
+
+Latencies of the stand-ins are set with --llm-latency-ms and the
+FAKE_DB_LATENCY_MS / FAKE_EMBED_LATENCY_MS / FAKE_VECTOR_LATENCY_MS variables.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+sys.path.insert(0, BACKEND_DIR)
+from loadtest.fake_services import start_completion_server  # noqa: E402
+from loadtest.serve import LOADTEST_USER  # noqa: E402
+
+PROMPTS = [
+    "Which employees earn the highest salary?",
+    "How many employees are in each department?",
+    "Show completed gatepass requests with the employee name",
+    "List all visitors",
+    "What is the budget of every project and its department?",
+    "Which assets are active or in use?",
+    "List employee codes and job titles",
+]
+FOLLOW_UPS = [
+    "Only show the top few",
+    "Now break that down by department",
+    "Include their job titles too",
+]
+DIRECT_SQL = [
+    "SELECT emp_code, first_name, last_name FROM EMPLOYEES WHERE salary > 50000",
+    "SELECT dept_name, budget FROM DEPARTMENTS WHERE budget >= 150000",
+    "SELECT location_name, city FROM LOCATIONS WHERE country = 'USA'",
+    "SELECT e.first_name, d.dept_name FROM EMPLOYEES e JOIN DEPARTMENTS d ON d.dept_id = e.dept_id",
+]
+SEARCHES = [
+    "employees",                              # names a table: lexical fast path
+    "gatepass",
+    "who badged into the building late",      # vague: embedding + vector query
+    "money spent fixing equipment",
+    "security staff certifications",
+]
+
+# name -> weight in the mix
+DEFAULT_MIX = {
+    "query": 25,
+    "query_followup": 10,
+    "db_direct": 15,
+    "similar_metadata": 20,
+    "get_sessions": 10,
+    "set_message": 12,
+    "get_messages": 8,
+}
+
+
+async def scenario_query(client, state):
+    return await client.post("/query", json={"prompt": random.choice(PROMPTS)})
+
+
+async def scenario_query_followup(client, state):
+    return await client.post("/query", json={"prompt": random.choice(FOLLOW_UPS), "session_id": random.choice(state["sessions"])})
+
+
+async def scenario_db_direct(client, state):
+    return await client.get("/db-direct", params={"query": random.choice(DIRECT_SQL)})
+
+
+async def scenario_similar_metadata(client, state):
+    return await client.post("/similar-metadata", json={"query": random.choice(SEARCHES)})
+
+
+async def scenario_chat_context(client, state):
+    # Not in DEFAULT_MIX (keeps saved baselines comparable); run with --mix chat_context=1
+    return await client.post("/chat/context", json={"question": random.choice(PROMPTS), "generate_sql": True, "page_size": 20})
+
+
+async def scenario_get_sessions(client, state):
+    return await client.get("/sessions/get-sessions")
+
+
+async def scenario_set_message(client, state):
+    role = random.choice(["user", "assistant"])
+    content = random.choice(PROMPTS) if role == "user" else f"```sql\n{random.choice(DIRECT_SQL)}\n```"
+    return await client.post("/sessions/set-messages", json={"session_id": random.choice(state["sessions"]), "role": role, "content": content})
+
+
+async def scenario_get_messages(client, state):
+    return await client.get(f"/sessions/get-messages/{random.choice(state['sessions'])}", params={"limit": 20})
+
+
+SCENARIOS = {name[len("scenario_"):]: fn for name, fn in globals().items() if name.startswith("scenario_")}
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(samples: list[tuple], duration: float) -> dict:
+    """
+    Per-scenario and overall count, error count, throughput and latency percentiles (ms).
+    """
+    by_scenario = {}
+    for name, latency, ok in samples:
+        by_scenario.setdefault(name, []).append((latency, ok))
+    by_scenario["ALL"] = [(latency, ok) for _, latency, ok in samples]
+
+    report = {}
+    for name, values in sorted(by_scenario.items()):
+        latencies = sorted(latency * 1000 for latency, _ in values)
+        report[name] = {
+            "count": len(values),
+            "errors": sum(1 for _, ok in values if not ok),
+            "rps": round(len(values) / duration, 2),
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p90_ms": round(percentile(latencies, 90), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "max_ms": round(latencies[-1], 2) if latencies else 0.0,
+        }
+    return report
+
+
+def print_report(report: dict):
+    header = f"{'scenario':<18}{'count':>8}{'errors':>8}{'rps':>9}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, row in report.items():
+        print(f"{name:<18}{row['count']:>8}{row['errors']:>8}{row['rps']:>9}{row['p50_ms']:>10}{row['p90_ms']:>10}{row['p99_ms']:>10}{row['max_ms']:>10}")
+
+
+def compare(report: dict, baseline: dict, threshold_pct: float) -> list[str]:
+    """
+    Regressions of more than threshold_pct: higher p50/p99 per scenario, lower
+    overall throughput, or a higher error rate.
+    """
+    regressions = []
+    limit = 1 + threshold_pct / 100
+    for name, row in report.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for key in ("p50_ms", "p99_ms"):
+            if base[key] > 0 and row[key] > base[key] * limit:
+                regressions.append(f"{name} {key}: {base[key]} -> {row[key]}")
+        base_error_rate = base["errors"] / max(base["count"], 1)
+        error_rate = row["errors"] / max(row["count"], 1)
+        if error_rate > base_error_rate + 0.01:
+            regressions.append(f"{name} error rate: {base_error_rate:.1%} -> {error_rate:.1%}")
+    if "ALL" in baseline and report["ALL"]["rps"] < baseline["ALL"]["rps"] / limit:
+        regressions.append(f"throughput: {baseline['ALL']['rps']} -> {report['ALL']['rps']} req/s")
+    return regressions
+
+
+async def prepare(client: httpx.AsyncClient, sessions: int) -> dict:
+    """
+    Logs in (the cookie stays on the client) and creates chat sessions with some history.
+    """
+    response = await client.post("/auth/login", json={"username": LOADTEST_USER[0], "password": LOADTEST_USER[1]})
+    response.raise_for_status()
+
+    session_ids = []
+    for i in range(sessions):
+        response = await client.post("/sessions/create-session", json={"title": f"load test {i}"})
+        response.raise_for_status()
+        # The id comes back as Oracle's DML RETURNING value: a one-element list
+        created = response.json()["session_id"]
+        session_ids.append(created[0] if isinstance(created, list) else created)
+    for session_id in session_ids:
+        for prompt in random.sample(PROMPTS, 3):
+            await client.post("/sessions/set-messages", json={"session_id": session_id, "role": "user", "content": prompt})
+            await client.post("/sessions/set-messages", json={"session_id": session_id, "role": "assistant", "content": f"```sql\n{random.choice(DIRECT_SQL)}\n```"})
+    return {"sessions": session_ids}
+
+
+async def drive(base_url: str, mix: dict, concurrency: int, duration: float, warmup: float, sessions: int) -> tuple[list, float]:
+    names = [name for name in mix if mix[name] > 0]
+    weights = [mix[name] for name in names]
+    samples = []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        state = await prepare(client, sessions)
+        started = time.perf_counter()
+        measure_from = started + warmup
+        stop_at = measure_from + duration
+
+        async def worker():
+            while True:
+                now = time.perf_counter()
+                if now >= stop_at:
+                    return
+                name = random.choices(names, weights)[0]
+                request_started = time.perf_counter()
+                try:
+                    response = await SCENARIOS[name](client, state)
+                    ok = response.status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                finished = time.perf_counter()
+                if request_started >= measure_from:
+                    samples.append((name, finished - request_started, ok))
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, duration
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(base_url: str, server: subprocess.Popen, timeout: float = 120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"App server exited with status {server.returncode}")
+        try:
+            if httpx.get(f"{base_url}/metrics", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError("App server did not become ready")
+
+
+def parse_mix(spec: str | None) -> dict:
+    if not spec:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for item in spec.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip() not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario '{name.strip()}'. Choose from: {', '.join(SCENARIOS)}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the API against local stand-ins")
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds of load before measuring")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--sessions", type=int, default=5, help="chat sessions created for session scenarios")
+    parser.add_argument("--mix", default=None, help="scenario weights, e.g. query=5,db_direct=1 (default: realistic mix)")
+    parser.add_argument("--llm-latency-ms", type=float, default=200)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--threshold", type=float, default=20, help="allowed regression in percent")
+    parser.add_argument("--output", default=None, help="also write the report as JSON here")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    mix = parse_mix(args.mix)
+
+    llm = start_completion_server(latency_ms=args.llm_latency_ms)
+    llm_url = f"http://127.0.0.1:{llm.server_address[1]}/v1/chat/completions"
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "loadtest.serve", "--port", str(port), "--llm-url", llm_url],
+        cwd=BACKEND_DIR
+    )
+    try:
+        wait_until_ready(base_url, server)
+        print(f"Running {args.duration:.0f}s at concurrency {args.concurrency} against {base_url}", flush=True)
+        samples, duration = asyncio.run(drive(base_url, mix, args.concurrency, args.duration, args.warmup, args.sessions))
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        llm.shutdown()
+
+    report = summarize(samples, duration)
+    print_report(report)
+    result = {
+        "config": {"duration": args.duration, "concurrency": args.concurrency, "mix": mix, "llm_latency_ms": args.llm_latency_ms},
+        "report": report,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare against; run with --save-baseline first.")
+        return
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("config", {}).get("concurrency") != args.concurrency:
+        print("Warning: baseline was recorded at a different concurrency.")
+    regressions = compare(report, baseline["report"], args.threshold)
+    if regressions:
+        print(f"\nRegressions beyond {args.threshold}%:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print(f"\nNo regressions beyond {args.threshold}% against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Runs main.app under uvicorn against the SQLite Oracle stand-in and the fake
+Pinecone / Gemini backends. Started by loadtest.run; can also be run alone:
+
+    cd backend && python -m loadtest.serve --port 8100 --llm-url http://127.0.0.1:9100/v1/chat/completions
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCHEMA_SCRIPT = os.path.join(os.path.dirname(BACKEND_DIR), "Chat Bot.sql")
+LOADTEST_USER = ("loadtest", "loadtest-password")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the API on fake Oracle / Pinecone / Gemini backends")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--llm-url", required=True, help="chat completions URL of the stub LM Studio server")
+    parser.add_argument("--workdir", default=None, help="directory for the SQLite file and logs (default: a temp dir)")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="chatbot-loadtest-")
+    # Backend modules read their configuration at import time
+    os.environ.update({
+        "DB_USER": "CHATBOT_USER",
+        "LM_STUDIO_URL": args.llm_url,
+        "LM_STUDIO_MODEL": "loadtest",
+        "PINECONE_INDEX_NAME": "loadtest",
+        "JWT_SECRET": os.getenv("JWT_SECRET", "loadtest-secret"),
+        "JWT_ALGORITHM": "HS256",
+        "LOG_TO_CONSOLE": "false",
+        "LOG_LEVEL": os.getenv("LOG_LEVEL", "WARNING"),
+        "LOG_FILE": os.path.join(workdir, "app.log.jsonl"),
+        "TRACE_FILE": os.path.join(workdir, "traces.jsonl"),
+        "SHARED_STATE_DIR": os.path.join(workdir, "shared"),
+    })
+    sys.path.insert(0, BACKEND_DIR)
+    # Relative log files (ai_handler.log, db_errors.log) land in the work dir, not the repo
+    os.chdir(workdir)
+
+    from loadtest import fake_services, fake_oracledb
+    fake_services.install()
+
+    from auth.password_hashing import hash_password
+    with open(SCHEMA_SCRIPT, encoding="utf-8") as f:
+        fake_oracledb.seed(
+            os.path.join(workdir, "chatbot.sqlite"),
+            f.read(),
+            users=[(LOADTEST_USER[0], hash_password(LOADTEST_USER[1]))]
+        )
+
+    import uvicorn
+    import main as app_module
+    from db_handler import extract_db_metadata
+    from pinecone_utils import namespace
+
+    fake_services.seed_vectors(extract_db_metadata(owner="CHATBOT_USER"), namespace)
+    print(f"Serving on http://{args.host}:{args.port} (work dir {workdir})", flush=True)
+    uvicorn.run(app_module.app, host=args.host, port=args.port, log_level="warning", access_log=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,39 @@
-from nt import error
+import oracledb
 from auth.auth_routes import auth_router
 from sessions.session_router import session_router
+from sessions.message_buffer import message_buffer
+from sessions.session_service import user_owns_session
 from requests import status_codes
-from fastapi import FastAPI, HTTPException, Query, Depends, Response
+from fastapi import FastAPI, HTTPException, Query, Depends, Response, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from ai_handler import generate_sql_from_prompt
-from db_handler import execute_query,parameterize_query,is_safe_query,extract_db_metadata
+from pydantic import BaseModel, Field
+from typing import Literal
+from ai_handler import generate_sql_from_prompt, select_tables
+from conversation_context import build_query_context
+from db_handler import execute_query,parameterize_query,is_safe_query,extract_db_metadata,plan_fetch,DEFAULT_ROW_CAP
 import os
-from fastapi.responses import JSONResponse
-from embedder import embed_texts
-from pinecone_utils import  query_similar_metadata
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse, FileResponse
+from fast_json import FastJSONResponse, dumps
+from http_cache import compress_response, conditional_response, content_etag
+from schema_search import search_schema, format_search_results, compact_schema
 from oracle_metadata import full_metadata_embedding_pipeline
+from jobs import submit_job, get_job, cancel_job
+from arrow_export import arrow_available, ResultExport, stream_ipc, write_parquet, ARROW_STREAM_MEDIA_TYPE
+from schema_graph import join_path, join_plan
 from dotenv import load_dotenv
 from auth.auth_service import get_current_user_from_cookie
+from app_logging import setup_logging, summarize
+import logging
+from auth.password_hashing import get_pool, shutdown_pool
+from metrics import render_metrics, REQUEST_SECONDS, STAGE_SECONDS, RESPONSE_BYTES
+from tracing import setup_tracing, shutdown_tracing, span, trace_id_from_headers, TRACE_HEADER
+import time
+import threading
+from collections import OrderedDict
 load_dotenv()   
+setup_logging()
+setup_tracing()
+logger = logging.getLogger(__name__)
 
 # Initialize the FastAPI application
 app = FastAPI(
@@ -40,22 +59,177 @@ app.add_middleware(
     allow_methods=["*"], 
     allow_headers=["*"],  
 )
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Route template rather than the raw path, so ids don't explode label cardinality
+        route = request.scope.get("route")
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=status
+        )
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """
+    Opens the root span of a request, continuing the caller's trace when it sends
+    TRACE_HEADER (or traceparent), and echoes the trace id on the response.
+    """
+    trace_id, parent_span_id = trace_id_from_headers(request.headers)
+    with span(f"{request.method} {request.url.path}", trace_id=trace_id, parent_span_id=parent_span_id) as root:
+        response = await call_next(request)
+        if root is not None:
+            route = request.scope.get("route")
+            root.set(**{"http.method": request.method, "http.route": getattr(route, "path", "unmatched"), "http.status_code": response.status_code})
+    response.headers[TRACE_HEADER] = trace_id
+    return response
+
+
+def timed_json_response(payload, endpoint: str, request: Request = None) -> JSONResponse:
+    """
+    Serializes a response body up front so its encode time and size are recorded.
+    Given the request, large bodies are compressed as the client accepts (gzip/br).
+    """
+    with STAGE_SECONDS.time(endpoint=endpoint, stage="serialize"), span("serialize"):
+        if isinstance(payload, BaseModel):
+            payload = payload.model_dump()
+        response = FastJSONResponse(content=payload)
+        if request is not None:
+            response = compress_response(request, response)
+    RESPONSE_BYTES.observe(len(response.body), endpoint=endpoint)
+    return response
+
+
+# Encoded metadata bodies by (projection, message), each tagged with the metadata dict
+# it was rendered from, so repeat calls skip serialization and compression
+METADATA_BODY_CACHE_SIZE = int(os.getenv("METADATA_BODY_CACHE_SIZE", "32"))
+METADATA_FIELDS = ("columns", "primary_keys", "foreign_keys", "table_comment", "num_rows", "last_analyzed")
+_metadata_bodies = OrderedDict()
+_metadata_bodies_lock = threading.Lock()
+
+
+def split_param(value: str | None) -> tuple | None:
+    """
+    "a, b,a" -> ("a", "b"); None when the parameter was not given.
+    """
+    if value is None:
+        return None
+    return tuple(sorted({item.strip() for item in value.split(",") if item.strip()}))
+
+
+def project_metadata(metadata: dict, tables: tuple | None, fields: tuple | None) -> dict:
+    """
+    Only the named tables (case-insensitive) and, per table, only the named fields.
+    """
+    if tables is not None:
+        wanted = {table.upper() for table in tables}
+        metadata = {name: meta for name, meta in metadata.items() if name.upper() in wanted}
+    if fields is not None:
+        metadata = {name: {field: meta[field] for field in fields if field in meta} for name, meta in metadata.items()}
+    return metadata
+
+
+def metadata_response(request: Request, metadata: dict, tables: str | None, fields: str | None,
+                      endpoint: str, message: str = None) -> Response:
+    """
+    Metadata (optionally projected) with an ETag: 304 when the client already has
+    this content, otherwise the cached body in the negotiated encoding.
+    """
+    tables, fields = split_param(tables), split_param(fields)
+    if fields:
+        unknown = set(fields) - set(METADATA_FIELDS)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields {sorted(unknown)}; choose from {list(METADATA_FIELDS)}")
+
+    key = (tables, fields, message)
+    with _metadata_bodies_lock:
+        entry = _metadata_bodies.get(key)
+        # A body only matches the exact metadata it was rendered from (a refresh replaces the dict)
+        if entry is not None and entry[0] is metadata:
+            _metadata_bodies.move_to_end(key)
+        else:
+            entry = None
+    if entry is None:
+        with STAGE_SECONDS.time(endpoint=endpoint, stage="serialize"), span("serialize"):
+            projected = project_metadata(metadata, tables, fields)
+            if message:
+                body = dumps({"message": message, "metadata": projected})
+            else:
+                body = dumps({"tables": len(projected), "metadata": projected})
+        entry = (metadata, body, content_etag(body), {})
+        with _metadata_bodies_lock:
+            # Bodies of replaced metadata are never served again; don't keep the old dicts alive
+            for stale in [k for k, e in _metadata_bodies.items() if e[0] is not metadata]:
+                del _metadata_bodies[stale]
+            _metadata_bodies[key] = entry
+            while len(_metadata_bodies) > METADATA_BODY_CACHE_SIZE:
+                _metadata_bodies.popitem(last=False)
+
+    _, body, etag, variants = entry
+    response = conditional_response(request, body, etag, variants)
+    RESPONSE_BYTES.observe(len(response.body), endpoint=endpoint)
+    return response
+
+
+def result_row_count(db_result) -> int | None:
+    """
+    Rows in an execute_query result (list of dicts or columnar), None for errors/DML.
+    """
+    if isinstance(db_result, list):
+        return len(db_result)
+    if isinstance(db_result, dict) and "columns" in db_result:
+        return len(db_result["rows"])
+    return None
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """
+    Prometheus scrape endpoint: per-stage latency histograms, row/byte counts and cache hit counters.
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 # Define a Pydantic model for the expected input structure from the frontend
 class QueryRequest(BaseModel):
     prompt: str  # This is the user prompt 
+    session_id: int | None = None  # Chat session whose history gives context to follow-up prompts
+    format: Literal["rows", "columnar"] = "rows"  # "columnar" returns {"columns": [...], "rows": [[...]]}
 
 # Define a Pydantic model for the response 
 class QueryResponse(BaseModel):
     generated_sql: str
     results: list | dict  
+    row_limit: int | None = None
+    row_limit_reached: bool = False
     
 class SimilarRequest(BaseModel):
     query: str
 
+# Most tables /chat/context will retrieve for one question
+CHAT_CONTEXT_MAX_TOP_K = int(os.getenv("CHAT_CONTEXT_MAX_TOP_K", "20"))
+
+class ChatContextRequest(BaseModel):
+    question: str
+    session_id: int | None = None  # Adds that chat's history to SQL generation
+    top_k: int = Field(5, gt=0, le=CHAT_CONTEXT_MAX_TOP_K)
+    generate_sql: bool = False  # Also generate SQL and run it for the first page of results
+    page_size: int = Field(50, gt=0, le=DEFAULT_ROW_CAP)
+
 
     
 @app.post("/query", response_model=QueryResponse)
-def query_database(request: QueryRequest):
+def query_database(request: QueryRequest, http_request: Request):
     """
     API endpoint to handle incoming prompts, generate SQL, execute it, and return the result.
 
@@ -66,9 +240,22 @@ def query_database(request: QueryRequest):
         QueryResponse: The generated SQL and its execution result.
     """
     try:
-        # 1. Generate SQL from the AI model
-        generated_sql = generate_sql_from_prompt(request.prompt)
-        print(f"generated_sql: {generated_sql}\n\n")
+        # 1. Generate SQL from the AI model, with bounded session history for follow-ups
+        history = None
+        tables = None
+        if request.session_id is not None:
+            # History is only read from the caller's own sessions
+            user_id = int(get_current_user_from_cookie(http_request)["id"])
+            if not user_owns_session(user_id, request.session_id):
+                raise HTTPException(status_code=404, detail="Session not found")
+            with STAGE_SECONDS.time(endpoint="/query", stage="context"), span("query.context", session_id=request.session_id):
+                context = build_query_context(request.session_id)
+                history = context["messages"]
+                tables = select_tables(f"{context['recent_user_text']} {request.prompt}")
+            logger.info("Session context built", extra={"fields": {"session_id": request.session_id, "messages": len(history), "tokens": context["tokens"]}})
+        with STAGE_SECONDS.time(endpoint="/query", stage="generate"), span("query.generate"):
+            generated_sql = generate_sql_from_prompt(request.prompt, tables=tables, history=history)
+        logger.info("Generated SQL", extra={"fields": {"sql": summarize(generated_sql)}})
         # Optional: If AI fails to generate proper SQL
         if not generated_sql.strip().lower().startswith(("select", "insert", "update" "create")):
            raise HTTPException(status_code=400, detail="AI did not generate a valid SQL query.")
@@ -77,48 +264,106 @@ def query_database(request: QueryRequest):
             status_code=500,
             content={"success": False, "data": None, "error": f"Database Error: {str(e)}"}
         )
-        parameterized_sql, params = parameterize_query(generated_sql)
-        print(f"Parameteized Query: {parameterized_sql}\n\nParameters: {params}\n\n")
+        with STAGE_SECONDS.time(endpoint="/query", stage="parse"), span("query.parse"):
+            parameterized_sql, params = parameterize_query(generated_sql)
+            # Cap rows and size fetches from table statistics
+            fetch = plan_fetch(parameterized_sql)
+        logger.debug("Parameterized query", extra={"fields": {"sql": summarize(parameterized_sql), "params": summarize(params)}})
 
-        db_result = execute_query(query=parameterized_sql,params=params)
-        print(f"db_result: {db_result}\n\n")
+        with STAGE_SECONDS.time(endpoint="/query", stage="execute"), span("query.execute", row_limit=fetch["max_rows"] or 0):
+            db_result = execute_query(query=parameterized_sql,params=params,max_rows=fetch["max_rows"],arraysize=fetch["arraysize"],
+                                      columnar=request.format == "columnar")
+        row_count = result_row_count(db_result)
+        logger.info("Query result", extra={"sampled": True, "fields": {
+            "rows": row_count,
+            "result": summarize(db_result)
+        }})
         
         if isinstance(db_result,dict) and "error" in db_result:
             return f"{db_result['error']}: {db_result['message']}"
         else:
         # 3. Return both the generated SQL and database result
-            return QueryResponse(generated_sql=generated_sql, results=db_result)
+            return timed_json_response(QueryResponse(
+                generated_sql=generated_sql,
+                results=db_result,
+                row_limit=fetch["max_rows"],
+                row_limit_reached=bool(fetch["max_rows"]) and (row_count or 0) >= fetch["max_rows"]
+            ), "/query", http_request)
 
     except oracledb.DatabaseError as e:
         return JSONResponse(
             status_code=500,
             content={"success": False, "data": None, "error": f"Database Error: {str(e)}"}
         )
-    
+
+    except HTTPException:
+        raise
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/refresh-metadata")
-def refresh_metadata():
+def refresh_metadata(
+    request: Request,
+    tables: str | None = Query(None, description="comma-separated table names to return"),
+    fields: str | None = Query(None, description=f"comma-separated fields per table: {', '.join(METADATA_FIELDS)}")
+):
     """
     API endpoint to refresh cached DB metadata.
+    Send If-None-Match with the previous ETag to get a 304 when the schema is unchanged.
     """
     metadata = extract_db_metadata(force_refresh=True)
-    return {"message": "Metadata refreshed", "metadata": metadata}
+    return metadata_response(request, metadata, tables, fields, "/refresh-metadata", message="Metadata refreshed")
+
+
+@app.get("/metadata")
+def get_metadata(
+    request: Request,
+    tables: str | None = Query(None, description="comma-separated table names to return"),
+    fields: str | None = Query(None, description=f"comma-separated fields per table: {', '.join(METADATA_FIELDS)}")
+):
+    """
+    Cached DB metadata without a refresh. Supports ETag/If-None-Match (304 when
+    unchanged), a tables/fields projection and gzip/br compression.
+    """
+    metadata = extract_db_metadata()
+    return metadata_response(request, metadata, tables, fields, "/metadata")
+
+
+
+@app.get("/join-path")
+def get_join_path(table_a: str, table_b: str):
+    """
+    API endpoint returning the shortest foreign-key join path between two tables.
+    """
+    path = join_path(table_a, table_b)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"No join path between {table_a} and {table_b}")
+    return {"from": table_a.upper(), "to": table_b.upper(), "hops": path}
 
 
 
 @app.get("/db-direct")
-def db_direct(query:str):
+def db_direct(request: Request, query:str, format: Literal["rows", "columnar"] = "rows"):
     """
     API endpoint to execute a raw SQL query directly on the database.
     """
     try:
-        query,params = parameterize_query(query)
-        if(is_safe_query(query)):
-            db_result = execute_query(query=query, params=params)
-            return {"success": True, 'results': query,  "results": db_result}
+        with STAGE_SECONDS.time(endpoint="/db-direct", stage="parse"), span("db_direct.parse"):
+            query,params = parameterize_query(query)
+            safe = is_safe_query(query)
+        if safe:
+            fetch = plan_fetch(query)
+            with STAGE_SECONDS.time(endpoint="/db-direct", stage="execute"), span("db_direct.execute"):
+                db_result = execute_query(query=query, params=params, max_rows=fetch["max_rows"], arraysize=fetch["arraysize"],
+                                          columnar=format == "columnar")
+            return timed_json_response({
+                "success": True,
+                "results": db_result,
+                "row_limit": fetch["max_rows"],
+                "row_limit_reached": bool(fetch["max_rows"]) and (result_row_count(db_result) or 0) >= fetch["max_rows"]
+            }, "/db-direct", request)
         else:
             return JSONResponse(
                 status_code=500,
@@ -130,8 +375,52 @@ def db_direct(query:str):
             content={"success": False, "results": None, "error": str(e)})
 
 
+@app.get("/db-direct/export")
+def db_direct_export(query: str, format: Literal["arrow", "parquet"] = "arrow"):
+    """
+    Exports a query result as typed columnar data instead of JSON.
+
+    format=arrow streams an Arrow IPC stream, one record batch per fetch.
+    format=parquet queues a background job that writes a Parquet file; poll
+    GET /jobs/{job_id}, then download it from GET /exports/{job_id}.
+    """
+    if not arrow_available():
+        return JSONResponse(
+            status_code=501,
+            content={"success": False, "results": None, "error": "Exports require pyarrow, which is not installed"})
+    try:
+        query, params = parameterize_query(query)
+        if not is_safe_query(query):
+            return JSONResponse(
+                status_code=500,
+                content={"success": False, "data": None, "error": "Query is not safe"})
+
+        if format == "parquet":
+            key = f"export-parquet:{query}:{sorted(params.items())}"
+            job, deduplicated = submit_job("export-parquet", key, lambda job: write_parquet(query, params, job))
+            return JSONResponse(status_code=202, content={
+                "success": True,
+                "job_id": job.id,
+                "deduplicated": deduplicated,
+                "status_url": f"/jobs/{job.id}",
+                "download_url": f"/exports/{job.id}"
+            })
+
+        with span("export.execute"):
+            export = ResultExport(query, params)
+        return StreamingResponse(
+            stream_ipc(export),
+            media_type=ARROW_STREAM_MEDIA_TYPE,
+            headers={"Content-Disposition": 'attachment; filename="export.arrows"'})
+
+    except Exception as e:
+        return JSONResponse(
+            status_code=500,
+            content={"success": False, "results": None, "error": str(e)})
+
+
 @app.post("/similar-metadata")
-def semantic_metadata_search(req: SimilarRequest):
+def semantic_metadata_search(req: SimilarRequest, request: Request):
     if not req.query:
         return JSONResponse(
             status_code=400,
@@ -140,110 +429,189 @@ def semantic_metadata_search(req: SimilarRequest):
         
     
     try:
-        user_embedding = embed_texts([req.query], task_type="RETRIEVAL_QUERY")[0]
-        similar_metadata = query_similar_metadata(user_embedding)
+        with STAGE_SECONDS.time(endpoint="/similar-metadata", stage="search"), span("similar_metadata.search"):
+            similar_metadata, strategy = search_schema(req.query)
         
         # Format the response
-        formatted_results = []
-        for item in similar_metadata:
-            # Table-level result
-            if "column_count" in item:
-                formatted_results.append({
-                    "type": "table",
-                    "table": item.get("table", ""),
-                    "score": item.get("score", 0),
-                    "description": item.get("table_comment", ""),
-                    "column_count": item.get("column_count", 0),
-                    "primary_keys": item.get("primary_keys", []),
-                    "foreign_keys": item.get("foreign_keys", []),
-                    "columns": item.get("columns", [])
-                })
-            # Column-level result
-            elif "column" in item:
-                formatted_results.append({
-                    "type": "column",
-                    "table": item.get("table", ""),
-                    "column": item.get("column", ""),
-                    "score": item.get("score", 0),
-                    "data_type": item.get("type", ""),
-                    "is_primary_key": item.get("is_primary_key", False),
-                    "is_foreign_key": item.get("is_foreign_key", False),
-                    "foreign_key_ref": item.get("foreign_key_ref", "")
-                })
-            # Raw metadata (fallback)
-            else:
-                formatted_results.append(item)
+        formatted_results = format_search_results(similar_metadata)
         
-        return {"context": formatted_results}
+        return timed_json_response({"context": formatted_results, "strategy": strategy}, "/similar-metadata", request)
     
     except Exception as e:
-        print(f"Error in semantic search: {e}")
+        logger.exception("Error in semantic search")
         return JSONResponse(
             status_code=500,
             content={"success": False, "message": "failed", "error": str(e)}
         )
  
+@app.post("/chat/context")
+def chat_context(req: ChatContextRequest, request: Request):
+    """
+    Everything a chat turn needs in one call: the tables relevant to the question,
+    their compact schema text and the FK joins between them, and optionally the
+    generated SQL with the first page of its results.
+
+    The question is embedded at most once, and SQL generation uses the tables
+    retrieved here instead of selecting its own. Failures to generate, vet or
+    run the SQL answer 500 like /query.
+    """
+    if not req.question.strip():
+        return JSONResponse(
+            status_code=400,
+            content={"success": False, "message": "failed", "error": "Missing question"}
+        )
+
+    try:
+        with STAGE_SECONDS.time(endpoint="/chat/context", stage="search"), span("chat_context.search"):
+            items, strategy = search_schema(req.question, top_k=req.top_k)
+            tables = [item["table"] for item in items]
+            joins = join_plan(tables) if len(tables) > 1 else []
+
+        payload = {
+            "success": True,
+            "strategy": strategy,
+            "tables": [
+                {"table": item["table"], "score": item["score"], "description": item["table_comment"]}
+                for item in items
+            ],
+            "schema": compact_schema(items),
+            "join_paths": joins,
+        }
+        if not req.generate_sql:
+            return timed_json_response(payload, "/chat/context", request)
+
+        def failed(error: str, sql: str = None):
+            return JSONResponse(
+                status_code=500,
+                content={"success": False, "message": "failed", "error": error, "sql": sql}
+            )
+
+        history = None
+        if req.session_id is not None:
+            # History is only read from the caller's own sessions
+            user_id = int(get_current_user_from_cookie(request)["id"])
+            if not user_owns_session(user_id, req.session_id):
+                raise HTTPException(status_code=404, detail="Session not found")
+            with STAGE_SECONDS.time(endpoint="/chat/context", stage="context"), span("chat_context.context", session_id=req.session_id):
+                history = build_query_context(req.session_id)["messages"]
+        with STAGE_SECONDS.time(endpoint="/chat/context", stage="generate"), span("chat_context.generate"):
+            generated_sql = generate_sql_from_prompt(req.question, tables=tables, history=history)
+        if isinstance(generated_sql, dict):
+            return failed(generated_sql["error"])
+        payload["sql"] = generated_sql
+
+        with STAGE_SECONDS.time(endpoint="/chat/context", stage="parse"), span("chat_context.parse"):
+            parameterized_sql, params = parameterize_query(generated_sql)
+            safe = is_safe_query(parameterized_sql)
+            fetch = plan_fetch(parameterized_sql)
+        if not safe:
+            return failed("Query is not safe", generated_sql)
+
+        # One extra row tells whether there is a next page
+        page_size = min(req.page_size, fetch["max_rows"]) if fetch["max_rows"] else req.page_size
+        with STAGE_SECONDS.time(endpoint="/chat/context", stage="execute"), span("chat_context.execute", page_size=page_size):
+            db_result = execute_query(query=parameterized_sql, params=params, max_rows=page_size + 1, arraysize=fetch["arraysize"])
+        if isinstance(db_result, list):
+            payload.update(results=db_result[:page_size], page_size=page_size, has_more=len(db_result) > page_size)
+        elif "error" in db_result:
+            return failed(f"{db_result['error']}: {db_result['message']}", generated_sql)
+        else:
+            payload.update(results=db_result)
+        return timed_json_response(payload, "/chat/context", request)
+
+    except HTTPException:
+        raise
+
+    except Exception as e:
+        logger.exception("Error building chat context")
+        return JSONResponse(
+            status_code=500,
+            content={"success": False, "message": "failed", "error": str(e)}
+        )
+
+
 @app.on_event("startup")
 def preload_embeddings():
+    # bcrypt worker pool, created up front rather than on the first login request
+    get_pool()
     metadata = extract_db_metadata(force_refresh=False)
-    print(f"✅ DB connection & metadata cache initialized. Found {len(metadata)} tables. No embeddings done.")
+    logger.info(f"DB connection & metadata cache initialized. Found {len(metadata)} tables. No embeddings done.")
+
+
 
+@app.on_event("shutdown")
+def shutdown_background_work():
+    # Write any chat messages still waiting in the write-behind buffer
+    message_buffer.close()
+    logger.info("Message buffer flushed")
+    shutdown_pool()
+    shutdown_tracing()
 
 
-@app.post("/embed-metadata")
-def embed_metadata(owner: str = Query(os.getenv('DB_USER'), description="owner/name for pipeline")):
+@app.post("/embed-metadata", status_code=202)
+def embed_metadata(
+    owner: str = Query(os.getenv('DB_USER'), description="owner/name for pipeline"),
+    dry_run: bool = Query(False, description="only report what would be upserted/deleted")
+):
     """
-    Trigger the full metadata -> embeddings -> upsert pipeline on demand.
+    Queue a sync of table embeddings with the schema: upserts new or changed tables and deletes dropped ones.
+    Returns a job id immediately; poll GET /jobs/{job_id} for progress.
+    An identical request while a job is still running returns that job instead of starting another.
     """
-    try:
-        # Force refresh the cache to get fresh metadata
-        metadata = extract_db_metadata(owner=owner, force_refresh=True)
-        
-        if not metadata:
-            return JSONResponse(
-                status_code=400,
-                content={
-                    "success": False, 
-                    "message": "No metadata extracted from database",
-                    "details": f"Owner '{owner}' has tables but metadata extraction failed. Check server logs."
-                }
-            )
-        
-        print(f"📊 Starting embedding pipeline for {len(metadata)} tables")
-        # Log the tables we found
-        for table_name in metadata.keys():
-            print(f"   - {table_name}")
-            
+    def run(job):
+        job.update(stage="extracting")
         # Force refresh the cache to get fresh metadata
-        metadata = extract_db_metadata(owner=owner, force_refresh=True)
-        
+        with STAGE_SECONDS.time(endpoint="/embed-metadata", stage="extract"):
+            metadata = extract_db_metadata(owner=owner, force_refresh=True)
         if not metadata:
-            return JSONResponse(
-                status_code=400,
-                content={
-                    "success": False, 
-                    "message": "No metadata extracted from database",
-                    "details": f"Owner '{owner}' has tables but metadata extraction failed. Check server logs."
-                }
-            )
-        
-        print(f"📊 Starting embedding pipeline for {len(metadata)} tables")
-        # Log the tables we found
-        for table_name in metadata.keys():
-            print(f"   - {table_name}")
-            
-        full_metadata_embedding_pipeline(owner=owner)
-        return {
-            "success": True, 
-            "message": f"Embedding pipeline completed for {len(metadata)} tables",
-            "tables_processed": len(metadata),
-            "table_names": list(metadata.keys())
-        }
-    except Exception as e:
-        print(f"❌ Error in embed-metadata endpoint: {e}")
-        import traceback
-        traceback.print_exc()
-        return JSONResponse(
-            status_code=500,
-            content={"success": False, "message": "failed", "error": str(e)})
+            raise RuntimeError(f"No metadata extracted for owner '{owner}'. Check server logs.")
+
+        logger.info(f"Starting embedding pipeline for {len(metadata)} tables")
+        with STAGE_SECONDS.time(endpoint="/embed-metadata", stage="pipeline"):
+            return full_metadata_embedding_pipeline(owner=owner, dry_run=dry_run, metadata=metadata, job=job)
+
+    job, deduplicated = submit_job("embed-metadata", f"embed-metadata:{owner}:{dry_run}", run)
+    return {
+        "success": True,
+        "job_id": job.id,
+        "deduplicated": deduplicated,
+        "status_url": f"/jobs/{job.id}"
+    }
+
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    """
+    Stage, progress, throughput, ETA and errors of a background job.
+    """
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+@app.post("/jobs/{job_id}/cancel")
+def job_cancel(job_id: str):
+    """
+    Request cancellation of a queued or running job.
+    """
+    job = cancel_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
 
+@app.get("/exports/{job_id}")
+def download_export(job_id: str):
+    """
+    Downloads the Parquet file written by a finished /db-direct/export job.
+    """
+    job = get_job(job_id)
+    if not job or job.kind != "export-parquet":
+        raise HTTPException(status_code=404, detail="Export not found")
+    if job.status != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Export is {job.status}")
+    path = job.result["file"]
+    if not os.path.exists(path):
+        raise HTTPException(status_code=410, detail="Export file has expired")
+    return FileResponse(path, media_type="application/vnd.apache.parquet", filename=f"export-{job_id}.parquet")
@@ -0,0 +1,193 @@
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from sub-millisecond parsing up to slow LLM calls
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Response size buckets in bytes
+SIZE_BUCKETS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+
+_registry = []
+
+
+class _Metric:
+    """
+    Base for metrics recorded into per-thread shards.
+
+    Recording only touches the calling thread's own dict, so it takes no lock;
+    shards are merged when /metrics is scraped. Shards of threads that have
+    exited are folded into a base shard then, so short-lived worker threads
+    don't accumulate.
+    """
+
+    type = None
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = []  # (weakref to the recording thread, shard)
+        self._base = {}  # totals folded in from threads that have exited
+        self._shards_lock = threading.Lock()
+        _registry.append(self)
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                self._shards.append((weakref.ref(threading.current_thread()), shard))
+        return shard
+
+    def _merge(self, into: dict, items):
+        raise NotImplementedError
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _label_text(self, key: tuple, extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def _snapshot(self) -> list:
+        with self._shards_lock:
+            live = []
+            for ref, shard in self._shards:
+                thread = ref()
+                if thread is None or not thread.is_alive():
+                    # The thread is gone, so its shard can no longer change
+                    self._merge(self._base, shard.items())
+                else:
+                    live.append((ref, shard))
+            self._shards = live
+            merged = {}
+            self._merge(merged, self._base.items())
+        # list(dict.items()) runs under the GIL, so a concurrent insert cannot break iteration
+        return [list(merged.items())] + [list(shard.items()) for _, shard in live]
+
+    def _totals(self) -> dict:
+        totals = {}
+        for items in self._snapshot():
+            self._merge(totals, items)
+        return totals
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def _merge(self, into: dict, items):
+        for key, value in items:
+            into[key] = into.get(key, 0) + value
+
+    def render(self) -> list[str]:
+        totals = self._totals()
+        return [f"{self.name}{self._label_text(key)} {value}" for key, value in sorted(totals.items())]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        state = shard.get(key)
+        if state is None:
+            # [per-bucket counts..., +Inf count, sum]
+            state = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                state[i] += 1
+                break
+        else:
+            state[len(self.buckets)] += 1
+        state[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _merge(self, into: dict, items):
+        for key, state in items:
+            total = into.setdefault(key, [0] * len(state[:-1]) + [0.0])
+            for i, value in enumerate(state):
+                total[i] += value
+
+    def render(self) -> list[str]:
+        merged = self._totals()
+
+        lines = []
+        for key, state in sorted(merged.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                labels = self._label_text(key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            cumulative += state[len(self.buckets)]
+            labels = self._label_text(key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_text(key)} {state[-1]}")
+            lines.append(f"{self.name}_count{self._label_text(key)} {cumulative}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render_metrics() -> str:
+    """
+    All registered metrics in the Prometheus text exposition format (0.0.4).
+    """
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- Metrics shared across modules ---
+
+REQUEST_SECONDS = Histogram(
+    "chatbot_request_seconds", "End-to-end HTTP request latency.", ("method", "route", "status"))
+STAGE_SECONDS = Histogram(
+    "chatbot_stage_seconds", "Latency of one stage of an endpoint.", ("endpoint", "stage"))
+RESPONSE_BYTES = Histogram(
+    "chatbot_response_bytes", "Serialized JSON response size.", ("endpoint",), buckets=SIZE_BUCKETS)
+
+LLM_SECONDS = Histogram("chatbot_llm_generation_seconds", "LM Studio completion latency.")
+DB_CONNECT_SECONDS = Histogram(
+    "chatbot_db_connect_seconds", "Time to obtain an Oracle connection (there is no pool; this is the wait).")
+DB_EXECUTE_SECONDS = Histogram("chatbot_db_execute_seconds", "cursor.execute latency.")
+DB_FETCH_SECONDS = Histogram("chatbot_db_fetch_seconds", "Row fetch + conversion latency.")
+DB_FETCH_ROWS = Counter("chatbot_db_fetch_rows_total", "Rows fetched from Oracle.")
+DB_ERRORS = Counter("chatbot_db_errors_total", "Failed statements.", ("kind",))
+EMBED_SECONDS = Histogram("chatbot_embedding_seconds", "Embedding API call latency.", ("task_type",))
+EMBED_CALLS = Counter("chatbot_embedding_calls_total", "Embedding API calls.", ("task_type", "outcome"))
+VECTOR_QUERY_SECONDS = Histogram("chatbot_vector_query_seconds", "Pinecone query latency.")
+VECTOR_UPSERT_SECONDS = Histogram("chatbot_vector_upsert_seconds", "Pinecone upsert batch latency.")
+LOGIN_ATTEMPTS = Counter("chatbot_login_attempts_total", "Login attempts by outcome.", ("outcome",))
+LOGIN_SECONDS = Histogram(
+    "chatbot_login_seconds", "Login latency: phase=lookup (user row), verify (bcrypt) or total.", ("phase",))
+CACHE_REQUESTS = Counter("chatbot_cache_requests_total", "Cache lookups by cache and result.", ("cache", "result"))
+SINGLE_FLIGHT_CALLS = Counter(
+    "chatbot_single_flight_calls_total",
+    "Calls through a single-flight group: role=leader ran the work, role=coalesced shared an in-flight result.",
+    ("flight", "role"))
@@ -1,169 +1,355 @@
 import oracledb
 from db_handler import get_connection,extract_db_metadata  # reuse your existing logic
 from embedder import embed_texts
-from pinecone_utils import upsert_metadata
+from pinecone_utils import upsert_metadata, fetch_content_hashes, delete_vectors
+import hashlib
 import json
+import logging
+import queue
+import threading
+import time
 from dotenv import load_dotenv
 import os
 
-load_dotenv()   
+load_dotenv()
+logger = logging.getLogger(__name__)
 
+# Bump when the text layout below changes so every table gets re-embedded
+CHUNK_FORMAT_VERSION = "1"
+
+# Streaming pipeline sizing
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "4"))
+EMBED_QUEUE_SIZE = int(os.getenv("EMBED_QUEUE_SIZE", "32"))
+UPSERT_QUEUE_SIZE = int(os.getenv("UPSERT_QUEUE_SIZE", "200"))
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "100"))
+
+# Queue sentinel telling a worker to exit
+_STOP = object()
+
+
+def build_table_text(table: str, table_meta: dict) -> str:
+    """
+    Renders the table-level description that gets embedded.
+    """
+    # Build columns description
+    columns_description = "\n".join([
+        f"  - {col['name']}: {col['type']} {'(PK)' if col['name'] in table_meta['primary_keys'] else ''}"
+        f"{'(FK)' if any(fk['column'] == col['name'] for fk in table_meta['foreign_keys']) else ''}"
+        f" - Nullable: {col['nullable']}"
+        f" - Comment: {col['comment'] or 'No comment'}"
+        for col in table_meta["columns"]
+    ])
+
+    # Foreign keys relationships
+    fk_relationships = "\n".join([
+        f"  - {fk['column']} → {fk['references']['table']}.{fk['references']['column']}"
+        for fk in table_meta["foreign_keys"]
+    ]) if table_meta["foreign_keys"] else "None"
+
+    # Primary keys
+    pk_list = ", ".join(table_meta["primary_keys"]) if table_meta["primary_keys"] else "None"
+
+    # Build the complete table description
+    return f"""TABLE: {table}
+Description: {table_meta['table_comment'] or 'No table comment'}
+
+COLUMNS:
+{columns_description}
+
+PRIMARY KEYS: {pk_list}
+
+FOREIGN KEY RELATIONSHIPS:
+{fk_relationships}"""
+
+
+def content_hash(text: str) -> str:
+    """
+    Hash stored alongside each vector so unchanged tables can be skipped on re-sync.
+    """
+    return hashlib.sha256(f"{CHUNK_FORMAT_VERSION}\n{text}".encode("utf-8")).hexdigest()
+
+
+def build_table_metadata(table: str, table_meta: dict) -> dict:
+    """
+    Builds the Pinecone metadata payload for a table
+    (only strings, numbers, booleans, or lists of strings).
+    """
+    table_metadata = {
+        "table": table,
+        "table_comment": table_meta['table_comment'] or "",
+        "column_count": len(table_meta['columns']),
+        "primary_keys": table_meta['primary_keys'],  # List of strings is OK
+        "foreign_key_count": len(table_meta['foreign_keys']),
+        # Convert complex objects to strings for Pinecone compatibility
+        "columns_summary": f"{len(table_meta['columns'])} columns",
+        "foreign_keys_summary": f"{len(table_meta['foreign_keys'])} foreign keys" if table_meta['foreign_keys'] else "No foreign keys"
+    }
+
+    # Add column names as a list of strings (Pinecone compatible)
+    table_metadata["column_names"] = [col['name'] for col in table_meta['columns']]
+
+    # Add primary key indicator for each column
+    for col in table_meta['columns']:
+        if col['name'] in table_meta['primary_keys']:
+            table_metadata[f"col_{col['name']}_is_pk"] = True
+
+    # Add foreign key information as strings
+    for j, fk in enumerate(table_meta['foreign_keys']):
+        table_metadata[f"fk_{j}"] = f"{fk['column']}->{fk['references']['table']}.{fk['references']['column']}"
+
+    return table_metadata
+
+
+def build_table_document(table: str, table_meta: dict) -> dict:
+    """
+    Builds the chunk for one table, everything except the vector.
+    """
+    text_chunk = build_table_text(table, table_meta)
+    table_metadata = build_table_metadata(table, table_meta)
+    table_metadata["content_hash"] = content_hash(text_chunk)
+    return {
+        "id": f"table-{table}",
+        "text": text_chunk,
+        "metadata": table_metadata
+    }
 
 
 def build_meta_chunks_from_metadata(metadata: dict, embeddings: list[list[float]]) -> list[dict]:
     chunks = []
     
     if not metadata or not embeddings:
-        print("❌ No metadata or embeddings provided")
+        logger.warning("No metadata or embeddings provided")
         return chunks
         
     if len(embeddings) != len(metadata):
-        print(f"❌ Mismatch: {len(metadata)} tables vs {len(embeddings)} embeddings")
+        logger.error(f"Mismatch: {len(metadata)} tables vs {len(embeddings)} embeddings")
         return chunks
+
+    for (table, table_meta), vector in zip(metadata.items(), embeddings):
+        chunk = build_table_document(table, table_meta)
+        chunk["vector"] = vector
+        chunks.append(chunk)
     
-    tables = list(metadata.items())
-    for i, (table, table_meta) in enumerate(tables):
-        if i >= len(embeddings):
-            print(f"❌ Not enough embeddings for table {table}")
-            continue
-            
-        # Build a comprehensive description of the entire table
-        columns_description = "\n".join([
-            f"  - {col['name']}: {col['type']} {'(PK)' if col['name'] in table_meta['primary_keys'] else ''}"
-            f"{'(FK)' if any(fk['column'] == col['name'] for fk in table_meta['foreign_keys']) else ''}"
-            f" - Nullable: {col['nullable']}"
-            f" - Comment: {col['comment'] or 'No comment'}"
-            for col in table_meta["columns"]
-        ])
-        
-        # Foreign keys relationships
-        fk_relationships = "\n".join([
-            f"  - {fk['column']} → {fk['references']['table']}.{fk['references']['column']}"
-            for fk in table_meta["foreign_keys"]
-        ]) if table_meta["foreign_keys"] else "None"
-        
-        # Primary keys
-        pk_list = ", ".join(table_meta["primary_keys"]) if table_meta["primary_keys"] else "None"
-        
-        # Build the complete table description
-        text_chunk = f"""TABLE: {table}
-Description: {table_meta['table_comment'] or 'No table comment'}
+    return chunks
 
-COLUMNS:
-{columns_description}
 
-PRIMARY KEYS: {pk_list}
+def plan_metadata_sync(metadata: dict, existing: dict) -> dict:
+    """
+    Compares the desired table documents against what the namespace holds.
 
-FOREIGN KEY RELATIONSHIPS:
-{fk_relationships}
+    Args:
+        metadata (dict): Table metadata as returned by extract_db_metadata.
+        existing (dict): {vector_id: content_hash} currently stored in Pinecone.
 
-TABLE STRUCTURE SUMMARY:
-This table contains {len(table_meta['columns'])} columns with {len(table_meta['primary_keys'])} primary key(s) 
-and {len(table_meta['foreign_keys'])} foreign key relationship(s)."""
-        
-        # Prepare SIMPLIFIED metadata for Pinecone (only strings, numbers, booleans, or lists of strings)
-        table_metadata = {
-            "table": table,
-            "table_comment": table_meta['table_comment'] or "",
-            "column_count": len(table_meta['columns']),
-            "primary_keys": table_meta['primary_keys'],  # List of strings is OK
-            "foreign_key_count": len(table_meta['foreign_keys']),
-            # Convert complex objects to strings for Pinecone compatibility
-            "columns_summary": f"{len(table_meta['columns'])} columns",
-            "foreign_keys_summary": f"{len(table_meta['foreign_keys'])} foreign keys" if table_meta['foreign_keys'] else "No foreign keys"
+    Returns:
+        dict: ids to create, update, delete and leave untouched.
+    """
+    plan = {"create": [], "update": [], "delete": [], "unchanged": []}
+    desired = {
+        f"table-{table}": content_hash(build_table_text(table, table_meta))
+        for table, table_meta in metadata.items()
+    }
+
+    for _id, _hash in desired.items():
+        if _id not in existing:
+            plan["create"].append(_id)
+        elif existing[_id] != _hash:
+            plan["update"].append(_id)
+        else:
+            plan["unchanged"].append(_id)
+
+    plan["delete"] = sorted(_id for _id in existing if _id not in desired)
+    return plan
+
+
+def log_sync_plan(plan: dict):
+    logger.info("Metadata sync plan", extra={"fields": {
+        action: len(plan[action]) for action in ("create", "update", "delete", "unchanged")
+    }})
+    for action in ("create", "update", "delete"):
+        for _id in plan[action]:
+            logger.debug(f"Sync plan: {action} {_id}")
+
+
+class StageStats:
+    """
+    Throughput counters for one pipeline stage, shared by that stage's workers.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, items: int, seconds: float, failed: int = 0):
+        with self._lock:
+            self.items += items
+            self.failed += failed
+            self.busy_seconds += seconds
+
+    def as_dict(self, wall_seconds: float) -> dict:
+        return {
+            "items": self.items,
+            "failed": self.failed,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "items_per_second": round(self.items / wall_seconds, 2) if wall_seconds else 0.0
         }
-        
-        # Add column names as a list of strings (Pinecone compatible)
-        table_metadata["column_names"] = [col['name'] for col in table_meta['columns']]
-        
-        # Add primary key indicator for each column
-        for col in table_meta['columns']:
-            if col['name'] in table_meta['primary_keys']:
-                table_metadata[f"col_{col['name']}_is_pk"] = True
-        
-        # Add foreign key information as strings
-        for j, fk in enumerate(table_meta['foreign_keys']):
-            table_metadata[f"fk_{j}"] = f"{fk['column']}->{fk['references']['table']}.{fk['references']['column']}"
-        
-        chunks.append({
-            "id": f"table-{table}",
-            "text": text_chunk,
-            "vector": embeddings[i],
-            "metadata": table_metadata
-        })
-    
-    return chunks
 
-def full_metadata_embedding_pipeline(owner=os.getenv('DB_USER')):
+
+def run_streaming_pipeline(metadata: dict, tables: list[str], on_progress=None, cancel_event=None) -> dict:
+    """
+    Streams table documents through bounded queues: build -> embed workers -> upsert worker.
+
+    Embedding and upserting overlap, and at most EMBED_QUEUE_SIZE + UPSERT_QUEUE_SIZE
+    documents (plus one upsert batch) are held in memory at once.
+
+    Args:
+        on_progress (callable): Called with the number of tables upserted or failed so far.
+        cancel_event (threading.Event): When set, no new tables are produced or embedded;
+            documents already embedded are still upserted.
+
+    Returns:
+        dict: per-stage counters and total wall time.
+    """
+    embed_queue = queue.Queue(maxsize=EMBED_QUEUE_SIZE)
+    upsert_queue = queue.Queue(maxsize=UPSERT_QUEUE_SIZE)
+    stats = {name: StageStats(name) for name in ("build", "embed", "upsert")}
+    started = time.perf_counter()
+
+    def cancelled():
+        return cancel_event is not None and cancel_event.is_set()
+
+    def embed_worker():
+        while True:
+            doc = embed_queue.get()
+            if doc is _STOP:
+                return
+            if cancelled():
+                continue
+            t0 = time.perf_counter()
+            vector = embed_texts([doc["text"]])
+            doc["vector"] = vector[0] if vector else []
+            stats["embed"].record(1, time.perf_counter() - t0, failed=0 if doc["vector"] else 1)
+            upsert_queue.put(doc)
+
+    def upsert_worker():
+        batch = []
+
+        def flush():
+            t0 = time.perf_counter()
+            try:
+                upserted, failed = upsert_metadata(batch, batch_size=UPSERT_BATCH_SIZE)
+            except Exception as e:
+                # Keep draining the queue so embed workers never block on a dead consumer
+                logger.exception(f"Upsert batch failed: {e}")
+                upserted, failed = 0, len(batch)
+            stats["upsert"].record(upserted, time.perf_counter() - t0, failed=failed)
+            batch.clear()
+            if on_progress:
+                on_progress(stats["upsert"].items + stats["upsert"].failed)
+
+        while True:
+            doc = upsert_queue.get()
+            if doc is _STOP:
+                break
+            batch.append(doc)
+            if len(batch) >= UPSERT_BATCH_SIZE:
+                flush()
+        if batch:
+            flush()
+
+    embedders = [threading.Thread(target=embed_worker, daemon=True) for _ in range(EMBED_WORKERS)]
+    upserter = threading.Thread(target=upsert_worker, daemon=True)
+    for worker in embedders + [upserter]:
+        worker.start()
+
+    # Producer runs on the calling thread; put() blocks while the embed queue is full
+    for table in tables:
+        if cancelled():
+            logger.info("Pipeline cancelled, draining in-flight tables")
+            break
+        t0 = time.perf_counter()
+        doc = build_table_document(table, metadata[table])
+        stats["build"].record(1, time.perf_counter() - t0)
+        embed_queue.put(doc)
+
+    for _ in embedders:
+        embed_queue.put(_STOP)
+    for worker in embedders:
+        worker.join()
+    upsert_queue.put(_STOP)
+    upserter.join()
+
+    wall_seconds = time.perf_counter() - started
+    report = {
+        "wall_seconds": round(wall_seconds, 3),
+        "stages": {name: stage.as_dict(wall_seconds) for name, stage in stats.items()}
+    }
+    logger.info(f"Pipeline finished in {report['wall_seconds']}s", extra={"fields": report})
+    return report
+
+
+def full_metadata_embedding_pipeline(owner=os.getenv('DB_USER'), dry_run=False, metadata=None, job=None):
+    """
+    Syncs table embeddings for `owner` with the vector namespace.
+
+    Args:
+        metadata (dict): Already-extracted metadata; extracted (from cache) when omitted.
+        job (jobs.Job): Optional background job to report stage/progress to and
+            to check for cancellation.
+    """
+    def report(**fields):
+        if job:
+            job.update(**fields)
+
     # 1. Extract metadata
-    print("📋 Extracting metadata...")
-    metadata = extract_db_metadata(owner=owner)
-    print(f"📊 Found {len(metadata)} tables")
+    if metadata is None:
+        logger.info("Extracting metadata")
+        report(stage="extracting")
+        metadata = extract_db_metadata(owner=owner)
+    logger.info(f"Found {len(metadata)} tables")
     
     if not metadata:
-        print("❌ No metadata extracted")
+        logger.error("No metadata extracted")
         return
 
-    # 2. Generate table-level text chunks for embedding
-    print("📝 Generating text chunks...")
-    text_chunks = []
-    for table, table_meta in metadata.items():
-        # Build columns description
-        columns_description = "\n".join([
-            f"  - {col['name']}: {col['type']} {'(PK)' if col['name'] in table_meta['primary_keys'] else ''}"
-            f"{'(FK)' if any(fk['column'] == col['name'] for fk in table_meta['foreign_keys']) else ''}"
-            f" - Nullable: {col['nullable']}"
-            f" - Comment: {col['comment'] or 'No comment'}"
-            for col in table_meta["columns"]
-        ])
-        
-        # Foreign keys relationships
-        fk_relationships = "\n".join([
-            f"  - {fk['column']} → {fk['references']['table']}.{fk['references']['column']}"
-            for fk in table_meta["foreign_keys"]
-        ]) if table_meta["foreign_keys"] else "None"
-        
-        # Primary keys
-        pk_list = ", ".join(table_meta["primary_keys"]) if table_meta["primary_keys"] else "None"
-        
-        # Build the complete table description
-        text_chunk = f"""TABLE: {table}
-Description: {table_meta['table_comment'] or 'No table comment'}
+    # 2. Diff desired documents against the namespace
+    logger.info("Comparing with vector namespace")
+    report(stage="planning")
+    existing = fetch_content_hashes(prefix="table-")
+    plan = plan_metadata_sync(metadata, existing)
+    log_sync_plan(plan)
 
-COLUMNS:
-{columns_description}
-
-PRIMARY KEYS: {pk_list}
+    if dry_run:
+        return plan
 
-FOREIGN KEY RELATIONSHIPS:
-{fk_relationships}"""
-        
-        text_chunks.append(text_chunk)
+    # 3. Stream new or changed tables through embed + upsert
+    changed_tables = [_id[len("table-"):] for _id in plan["create"] + plan["update"]]
+    report(tables_total=len(changed_tables))
+    if changed_tables:
+        logger.info(f"Embedding and upserting {len(changed_tables)} tables")
+        report(stage="embedding")
+        plan["stats"] = run_streaming_pipeline(
+            metadata,
+            changed_tables,
+            on_progress=lambda processed: report(tables_processed=processed),
+            cancel_event=job.cancel_event if job else None
+        )
+        failed = plan["stats"]["stages"]["upsert"]["failed"]
+        if job and failed:
+            job.add_error(f"{failed} tables failed to embed or upsert")
+    else:
+        logger.info("No new or changed tables to embed")
 
-    # 3. Embed the table-level texts
-    print("🧠 Generating embeddings...")
-    embeddings = embed_texts(text_chunks)
-    
-    if not embeddings:
-        print("❌ No embeddings generated")
-        return
-        
-    if len(embeddings) != len(text_chunks):
-        print(f"❌ Embedding count mismatch: {len(text_chunks)} chunks vs {len(embeddings)} embeddings")
-        # Continue with available embeddings but log warning
-        print(f"⚠️ Proceeding with {min(len(embeddings), len(text_chunks))} embeddings")
-
-    # 4. Build metadata chunks (now table-level)
-    print("🔨 Building metadata chunks...")
-    meta_chunks = build_meta_chunks_from_metadata(metadata, embeddings)
-    print(f"✅ Built {len(meta_chunks)} metadata chunks")
-
-    if not meta_chunks:
-        print("❌ No metadata chunks built")
-        return
+    if job and job.cancelled:
+        return plan
 
-    # 5. Upsert into Pinecone
-    print("🚀 Upserting to Pinecone...")
-    upsert_metadata(meta_chunks)
-    return meta_chunks
+    # 4. Remove vectors for tables that no longer exist
+    if plan["delete"]:
+        report(stage="deleting")
+        logger.info(f"Deleting {len(plan['delete'])} stale vectors")
+        delete_vectors(plan["delete"])
 
+    return plan
@@ -1,9 +1,14 @@
 from pinecone import Pinecone, ServerlessSpec
 import os
+import logging
+from app_logging import summarize
+from metrics import VECTOR_QUERY_SECONDS, VECTOR_UPSERT_SECONDS
 from dotenv import load_dotenv
 
 load_dotenv()   
 
+logger = logging.getLogger(__name__)
+
 # Initialize Pinecone
 pc = Pinecone(os.getenv('PINECONE_API_KEY'))
 
@@ -23,6 +28,8 @@ if index_name not in pc.list_indexes().names():
 
 index = pc.Index(index_name)
 
+namespace = os.getenv('PINECONE_NAMESPACE', 'ai-oracle-metadata')
+
 # Upsert metadata
 def upsert_metadata(meta_chunks: list[dict], batch_size: int = 100):  # Reduced batch size
     upserts = []
@@ -37,67 +44,109 @@ def upsert_metadata(meta_chunks: list[dict], batch_size: int = 100):  # Reduced
 
             # Validation checks
             if not _id or not _vec or not _meta:
-                print(f"❌ Missing required fields in chunk: {chunk}")
+                logger.warning("Missing required fields in chunk", extra={"fields": {"id": _id, "has_vector": bool(_vec), "has_metadata": bool(_meta)}})
                 failed_count += 1
                 continue
                 
             if not isinstance(_id, str):
-                print(f"❌ Invalid ID type: {type(_id)} for {_id}")
+                logger.warning(f"Invalid ID type: {type(_id)} for {_id}")
                 failed_count += 1
                 continue
                 
             if not isinstance(_vec, list) or len(_vec) == 0:
-                print(f"❌ Invalid vector for ID {_id}: {_vec}")
+                logger.warning(f"Invalid vector for ID {_id}", extra={"fields": {"vector": summarize(_vec)}})
                 failed_count += 1
                 continue
                 
             if not all(isinstance(x, (float, int)) for x in _vec):
-                print(f"❌ Vector for ID {_id} contains non-numeric values")
+                logger.warning(f"Vector for ID {_id} contains non-numeric values")
                 failed_count += 1
                 continue
 
             upserts.append((_id, _vec, _meta))
-            print(f"✅ Prepared vector for {_id}")
+            logger.debug(f"Prepared vector for {_id}")
 
             # Upsert in batches
             if len(upserts) >= batch_size:
                 try:
-                    response = index.upsert(
-                        vectors=upserts, 
-                        namespace=os.getenv('PINECONE_NAMESPACE', 'ai-oracle-metadata')
-                    )
+                    with VECTOR_UPSERT_SECONDS.time():
+                        response = index.upsert(
+                            vectors=upserts, 
+                            namespace=namespace
+                        )
                     total_upserted += len(upserts)
-                    print(f"[✅] Upserted {len(upserts)} vectors. Response: {response}")
+                    logger.info(f"Upserted {len(upserts)} vectors")
                     upserts = []
                 except Exception as e:
-                    print(f"❌ Batch upsert failed: {e}")
+                    logger.error(f"Batch upsert failed: {e}")
                     failed_count += len(upserts)
                     upserts = []
 
         except Exception as e:
-            print(f"❌ Error processing chunk: {e}")
+            logger.error(f"Error processing chunk: {e}")
             failed_count += 1
             continue
 
     # Upsert remaining vectors
     if upserts:
         try:
-            response = index.upsert(
-                vectors=upserts, 
-                namespace=os.getenv('PINECONE_NAMESPACE', 'ai-oracle-metadata')
-            )
+            with VECTOR_UPSERT_SECONDS.time():
+                response = index.upsert(
+                    vectors=upserts, 
+                    namespace=namespace
+                )
             total_upserted += len(upserts)
-            print(f"[✅] Upserted remaining {len(upserts)} vectors. Response: {response}")
+            logger.info(f"Upserted remaining {len(upserts)} vectors")
         except Exception as e:
-            print(f"❌ Final upsert failed: {e}")
+            logger.error(f"Final upsert failed: {e}")
             failed_count += len(upserts)
 
-    print(f"\n📊 Summary:")
-    print(f"✅ Successfully upserted: {total_upserted}")
-    print(f"❌ Failed: {failed_count}")
+    logger.info("Upsert summary", extra={"fields": {"upserted": total_upserted, "failed": failed_count}})
     
     if total_upserted == 0:
-        print("[⚠️] No vectors were upserted. Check the validation logs above.")
+        logger.warning("No vectors were upserted. Check the validation logs above.")
+
+    return total_upserted, failed_count
+
+
+def fetch_content_hashes(prefix: str = "table-", batch_size: int = 100) -> dict:
+    """
+    Lists every vector id in the namespace starting with `prefix` and returns
+    {id: content_hash}. Vectors written before hashes were stored map to None.
+    """
+    ids = []
+    for page in index.list(prefix=prefix, namespace=namespace):
+        ids.extend(page)
+
+    hashes = {}
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        response = index.fetch(ids=batch, namespace=namespace)
+        for _id, vector in response.vectors.items():
+            metadata = vector.metadata or {}
+            hashes[_id] = metadata.get("content_hash")
+        # Ids listed but missing from fetch still exist as far as the planner cares
+        for _id in batch:
+            hashes.setdefault(_id, None)
+
+    return hashes
+
+
+def delete_vectors(ids: list[str], batch_size: int = 1000) -> int:
+    """
+    Deletes the given vector ids from the namespace in batches.
+    Returns the number of ids deleted.
+    """
+    deleted = 0
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        try:
+            index.delete(ids=batch, namespace=namespace)
+            deleted += len(batch)
+            logger.info(f"Deleted {len(batch)} stale vectors")
+        except Exception as e:
+            logger.error(f"Batch delete failed: {e}")
+    return deleted
 
 
 def check_pinecone_connection():
@@ -125,60 +174,33 @@ def check_pinecone_connection():
         print(f"❌ Pinecone connection failed: {e}")
         return False
 
-# Query similar metadata - UPDATED FOR TABLE-LEVEL EMBEDDINGS
+# Query similar metadata - ids and scores only, details are hydrated from the local metadata cache
 def query_similar_metadata(embedding, top_k=5):
     try:
-        response = index.query(
-            vector=embedding,
-            top_k=top_k,
-            include_metadata=True,
-            namespace=os.getenv('PINECONE_NAMESPACE', 'ai oracle metadata')
-        )
+        with VECTOR_QUERY_SECONDS.time():
+            response = index.query(
+                vector=embedding,
+                top_k=top_k,
+                include_metadata=False,
+                include_values=False,
+                namespace=namespace
+            )
         
         results = []
         for match in response.get("matches", []):
-            metadata = match.get("metadata", {})
-            
-            # Debug: Print the actual metadata structure
-            print(f"DEBUG - Metadata received: {metadata}")
-            
-            # Handle table-level format (new)
-            if "table" in metadata and "columns" in metadata:
-                result = {
-                    "table": metadata.get("table", ""),
-                    "score": match.get("score", 0),
-                    "table_comment": metadata.get("table_comment", ""),
-                    "column_count": metadata.get("column_count", 0),
-                    "primary_keys": metadata.get("primary_keys", []),
-                    "foreign_keys": metadata.get("foreign_keys", []),
-                    "columns": metadata.get("columns", [])
-                }
-                results.append(result)
-            
-            # Handle column-level format (old - fallback)
-            elif "table" in metadata and "column" in metadata:
-                result = {
-                    "table": metadata.get("table", ""),
-                    "column": metadata.get("column", ""),
-                    "score": match.get("score", 0),
-                    "type": metadata.get("type", ""),
-                    "nullable": metadata.get("nullable", ""),
-                    "is_primary_key": metadata.get("is_primary_key", False),
-                    "is_foreign_key": metadata.get("is_foreign_key", False),
-                    "foreign_key_ref": metadata.get("foreign_key_ref", "")
-                }
-                results.append(result)
-            
-            # Handle unexpected format
-            else:
-                print(f"WARNING: Unexpected metadata format: {metadata}")
-                results.append({
-                    "raw_metadata": metadata,
-                    "score": match.get("score", 0)
-                })
+            _id = match.get("id", "")
+            # Table-level vectors are stored as table-{name}
+            if not _id.startswith("table-"):
+                logger.warning(f"Skipping non table-level vector id: {_id}")
+                continue
+            results.append({
+                "id": _id,
+                "table": _id[len("table-"):],
+                "score": match.get("score", 0)
+            })
         
         return results
         
     except Exception as e:
-        print(f"Error querying Pinecone: {e}")
-        raise
\ No newline at end of file
+        logger.error(f"Error querying Pinecone: {e}")
+        raise
@@ -0,0 +1,149 @@
+import os
+import logging
+import threading
+from collections import deque
+from dotenv import load_dotenv
+from db_handler import extract_db_metadata
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Longest join path (in hops) that is precomputed and suggested to the model
+SCHEMA_GRAPH_MAX_DEPTH = int(os.getenv("SCHEMA_GRAPH_MAX_DEPTH", "4"))
+
+
+class SchemaGraph:
+    """
+    Foreign-key graph of the schema with shortest join paths between every
+    pair of tables up to max_depth hops, computed once at construction.
+    """
+
+    def __init__(self, metadata: dict, max_depth: int = SCHEMA_GRAPH_MAX_DEPTH):
+        self.max_depth = max_depth
+        # table -> {neighbour: [join predicates]}; edges are stored in both directions
+        self.adjacency = {table: {} for table in metadata}
+
+        for table, table_meta in metadata.items():
+            for fk in table_meta.get("foreign_keys", []):
+                ref_table = (fk["references"]["table"] or "").upper()
+                if ref_table not in self.adjacency or ref_table == table:
+                    continue
+                predicate = f"{table}.{fk['column']} = {ref_table}.{fk['references']['column']}"
+                for a, b in ((table, ref_table), (ref_table, table)):
+                    predicates = self.adjacency[a].setdefault(b, [])
+                    if predicate not in predicates:
+                        predicates.append(predicate)
+
+        # source -> {target: previous table on the shortest path}
+        self._parents = {table: self._bfs(table) for table in self.adjacency}
+
+    def _bfs(self, source: str) -> dict:
+        parents = {source: None}
+        frontier = deque([(source, 0)])
+        while frontier:
+            table, depth = frontier.popleft()
+            if depth == self.max_depth:
+                continue
+            for neighbour in self.adjacency[table]:
+                if neighbour not in parents:
+                    parents[neighbour] = table
+                    frontier.append((neighbour, depth + 1))
+        return parents
+
+    def neighbours(self, table: str) -> list[str]:
+        return list(self.adjacency.get(table.upper(), {}))
+
+    def join_path(self, table_a: str, table_b: str) -> list[dict] | None:
+        """
+        Shortest join path from table_a to table_b.
+
+        Returns:
+            list[dict]: hops as {"from", "to", "on": [predicates]}; [] when the
+            tables are the same, None when they are not connected within max_depth.
+        """
+        table_a, table_b = table_a.upper(), table_b.upper()
+        parents = self._parents.get(table_a)
+        if parents is None or table_b not in parents:
+            return None
+
+        tables = [table_b]
+        while parents[tables[-1]] is not None:
+            tables.append(parents[tables[-1]])
+        tables.reverse()
+
+        return [
+            {"from": src, "to": dst, "on": self.adjacency[src][dst]}
+            for src, dst in zip(tables, tables[1:])
+        ]
+
+    def join_plan(self, tables: list[str]) -> list[dict]:
+        """
+        Hops that connect all of `tables`, grown from the first table by repeatedly
+        attaching the closest remaining table. Tables that cannot be reached are skipped.
+        """
+        tables = [table.upper() for table in tables if table.upper() in self.adjacency]
+        if not tables:
+            return []
+
+        connected = [tables[0]]
+        hops = []
+        seen = set()
+        for target in tables[1:]:
+            paths = [self.join_path(source, target) for source in connected]
+            paths = [path for path in paths if path is not None]
+            if not paths:
+                continue
+            for hop in min(paths, key=len):
+                edge = frozenset((hop["from"], hop["to"]))
+                if edge not in seen:
+                    seen.add(edge)
+                    hops.append(hop)
+                if hop["to"] not in connected:
+                    connected.append(hop["to"])
+        return hops
+
+
+_graph = None
+_graph_metadata = None
+_graph_lock = threading.Lock()
+
+
+def get_schema_graph() -> SchemaGraph:
+    """
+    Returns the schema graph for the cached metadata, rebuilding it whenever the cache is refreshed.
+    """
+    global _graph, _graph_metadata
+
+    metadata = extract_db_metadata()
+    with _graph_lock:
+        if _graph is None or metadata is not _graph_metadata:
+            _graph = SchemaGraph(metadata)
+            _graph_metadata = metadata
+            logger.info(f"Built schema graph for {len(metadata)} tables")
+        return _graph
+
+
+def join_path(table_a: str, table_b: str) -> list[dict] | None:
+    return get_schema_graph().join_path(table_a, table_b)
+
+
+def join_plan(tables: list[str]) -> list[dict]:
+    """
+    Join hops connecting all of `tables`, as used for join_hints.
+    """
+    return get_schema_graph().join_plan(tables)
+
+
+def join_hints(tables: list[str]) -> str:
+    """
+    Renders the join predicates connecting `tables` for the SQL generation prompt.
+    """
+    lines = []
+    for hop in get_schema_graph().join_plan(tables):
+        line = f"- {hop['from']} JOIN {hop['to']} ON {hop['on'][0]}"
+        # Several foreign keys between the same pair are different relationships, not a composite key
+        if len(hop["on"]) > 1:
+            line += f" (other relationships: {'; '.join(hop['on'][1:])})"
+        lines.append(line)
+    return "\n".join(lines)
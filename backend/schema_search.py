@@ -0,0 +1,146 @@
+import os
+import logging
+from dotenv import load_dotenv
+from db_handler import extract_db_metadata
+from embedder import embed_texts
+from pinecone_utils import query_similar_metadata
+from lexical_index import SchemaLexicalIndex, reciprocal_rank_fusion
+from metrics import STAGE_SECONDS, CACHE_REQUESTS
+from tracing import span
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+RRF_K = int(os.getenv("RRF_K", "60"))
+# Skip the embedding call when the best lexical hit names a table outright and scores at least this much
+LEXICAL_FAST_PATH_MIN_SCORE = float(os.getenv("LEXICAL_FAST_PATH_MIN_SCORE", "2.0"))
+# ...and beats every hit that does not name a table by this factor
+LEXICAL_FAST_PATH_MARGIN = float(os.getenv("LEXICAL_FAST_PATH_MARGIN", "1.5"))
+
+_lexical_index = None
+_indexed_metadata = None
+
+
+def get_lexical_index() -> SchemaLexicalIndex:
+    """
+    Returns the BM25 index for the cached metadata, rebuilding it whenever the cache is refreshed.
+    """
+    global _lexical_index, _indexed_metadata
+
+    metadata = extract_db_metadata()
+    if _lexical_index is None or metadata is not _indexed_metadata:
+        _lexical_index = SchemaLexicalIndex(metadata)
+        _indexed_metadata = metadata
+        logger.info(f"Built lexical index over {_lexical_index.doc_count} tables")
+    return _lexical_index
+
+
+def is_confident(hits: list[dict]) -> bool:
+    if not hits or not hits[0]["name_match"]:
+        return False
+    top = hits[0]["score"]
+    best_other = max((hit["score"] for hit in hits if not hit["name_match"]), default=0.0)
+    return top >= LEXICAL_FAST_PATH_MIN_SCORE and top >= LEXICAL_FAST_PATH_MARGIN * best_other
+
+
+def describe_table(table: str, table_meta: dict, score: float) -> dict:
+    """
+    Full, current details for a retrieved table from the in-process metadata cache.
+    """
+    return {
+        "table": table,
+        "score": score,
+        "table_comment": table_meta.get("table_comment", ""),
+        "column_count": len(table_meta.get("columns", [])),
+        "primary_keys": table_meta.get("primary_keys", []),
+        "foreign_keys": table_meta.get("foreign_keys", []),
+        "columns": table_meta.get("columns", []),
+    }
+
+
+def format_search_results(items: list[dict]) -> list[dict]:
+    """
+    Shapes describe_table items into the /similar-metadata "context" entries.
+    """
+    return [
+        {
+            "type": "table",
+            "table": item["table"],
+            "score": item["score"],
+            "description": item["table_comment"],
+            "column_count": item["column_count"],
+            "primary_keys": item["primary_keys"],
+            "foreign_keys": item["foreign_keys"],
+            "columns": item["columns"]
+        }
+        for item in items
+    ]
+
+
+def compact_schema(items: list[dict]) -> str:
+    """
+    One line per describe_table item, for prompts:
+    EMPLOYEES(EMP_ID NUMBER PK, DEPT_ID NUMBER FK->DEPARTMENTS.DEPT_ID, ...) -- comment
+    """
+    lines = []
+    for item in items:
+        primary_keys = set(item["primary_keys"])
+        references = {fk["column"]: fk["references"] for fk in item["foreign_keys"]}
+        columns = []
+        for col in item["columns"]:
+            text = f"{col['name']} {col['type']}"
+            if col["name"] in primary_keys:
+                text += " PK"
+            if col["name"] in references:
+                ref = references[col["name"]]
+                text += f" FK->{ref['table']}.{ref['column']}"
+            columns.append(text)
+        line = f"{item['table']}({', '.join(columns)})"
+        if item["table_comment"]:
+            line += f" -- {item['table_comment']}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def search_schema(query: str, top_k: int = 5) -> tuple[list[dict], str]:
+    """
+    Finds the tables most relevant to a question.
+
+    Runs BM25 over the local metadata first. If it confidently names the tables
+    the vector search is skipped; otherwise vector hits and lexical hits are
+    merged with reciprocal rank fusion.
+
+    Returns:
+        (items, strategy): items from describe_table, strategy is "lexical" or "hybrid".
+    """
+    index = get_lexical_index()
+    metadata = extract_db_metadata()
+    with STAGE_SECONDS.time(endpoint="search_schema", stage="lexical"), span("schema.lexical"):
+        lexical_hits = index.search(query, top_k=top_k)
+
+    if is_confident(lexical_hits):
+        CACHE_REQUESTS.inc(cache="lexical_fast_path", result="hit")
+        items = [
+            describe_table(hit["table"], metadata[hit["table"]], hit["score"])
+            for hit in lexical_hits
+        ]
+        return items, "lexical"
+
+    CACHE_REQUESTS.inc(cache="lexical_fast_path", result="miss")
+    with STAGE_SECONDS.time(endpoint="search_schema", stage="embedding"), span("schema.embedding"):
+        user_embedding = embed_texts([query], task_type="RETRIEVAL_QUERY")[0]
+    with STAGE_SECONDS.time(endpoint="search_schema", stage="vector_query"), span("schema.vector_query", top_k=top_k):
+        vector_hits = query_similar_metadata(user_embedding, top_k=top_k)
+
+    vector_ranking = [hit["table"] for hit in vector_hits]
+    lexical_ranking = [hit["table"] for hit in lexical_hits]
+    fused = reciprocal_rank_fusion([vector_ranking, lexical_ranking], k=RRF_K)[:top_k]
+
+    # Tables dropped since the last sync have no cache entry and are left out
+    items = [
+        describe_table(table, metadata[table], score)
+        for table, score in fused
+        if table in metadata
+    ]
+    return items, "hybrid"
@@ -0,0 +1,109 @@
+import os
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from sessions.session_service import save_messages
+
+logger = logging.getLogger(__name__)
+
+# Flush when this many messages are waiting...
+MESSAGE_BUFFER_BATCH_SIZE = int(os.getenv("MESSAGE_BUFFER_BATCH_SIZE", "50"))
+# ...or when the oldest waiting message is this old
+MESSAGE_BUFFER_MAX_LATENCY_MS = int(os.getenv("MESSAGE_BUFFER_MAX_LATENCY_MS", "20"))
+
+
+class MessageBuffer:
+    """
+    Write-behind buffer for chat messages.
+
+    Inserts submitted from any request are collected and written by a single
+    background thread with one executemany + commit per batch. Each submit
+    returns a Future that resolves to the new message id once its batch is
+    committed, or to the error if Oracle rejected that row.
+    """
+
+    def __init__(self, batch_size: int = MESSAGE_BUFFER_BATCH_SIZE,
+                 max_latency_ms: int = MESSAGE_BUFFER_MAX_LATENCY_MS):
+        self.batch_size = batch_size
+        self.max_latency = max_latency_ms / 1000
+        self._pending = []  # (session_id, role, content, future, submitted_at)
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = None
+
+    def _ensure_started(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="message-buffer", daemon=True)
+            self._thread.start()
+
+    def submit(self, session_id: int, role: str, content: str) -> Future:
+        return self.submit_many([(session_id, role, content)])[0]
+
+    def submit_many(self, messages: list[tuple]) -> list[Future]:
+        """
+        Queues (session_id, role, content) tuples; they are written in order.
+        """
+        futures = []
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Message buffer is closed")
+            self._ensure_started()
+            now = time.monotonic()
+            for session_id, role, content in messages:
+                future = Future()
+                self._pending.append((session_id, role, content, future, now))
+                futures.append(future)
+            self._cond.notify()
+        return futures
+
+    def _take_batch(self) -> list:
+        with self._cond:
+            while True:
+                if self._pending:
+                    age = time.monotonic() - self._pending[0][4]
+                    if self._closed or len(self._pending) >= self.batch_size or age >= self.max_latency:
+                        break
+                    self._cond.wait(self.max_latency - age)
+                elif self._closed:
+                    return []
+                else:
+                    self._cond.wait()
+            batch = self._pending[:self.batch_size]
+            del self._pending[:self.batch_size]
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return
+            self._flush(batch)
+
+    def _flush(self, batch: list):
+        try:
+            results = save_messages([(session_id, role, content) for session_id, role, content, _, _ in batch])
+        except Exception as e:
+            logger.exception(f"Message buffer flush of {len(batch)} messages failed: {e}")
+            for *_, future, _ in batch:
+                future.set_exception(e)
+            return
+        for (session_id, *_, future, _), result in zip(batch, results):
+            if isinstance(result, Exception):
+                logger.error(f"Message for session {session_id} was rejected: {result}")
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def close(self, timeout: float = 10.0):
+        """
+        Stops accepting messages and waits until everything queued has been written.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+message_buffer = MessageBuffer()
@@ -1,10 +1,13 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
 from pydantic import BaseModel
-from sessions.session_service import get_sessions,create_session,rename_session,delete_session,get_messages,save_message
+from sessions.session_service import get_sessions_with_etag,create_session,rename_session,delete_session,get_messages,get_message,user_owns_session,MESSAGE_PAGE_SIZE
 from fastapi.responses import JSONResponse
 from auth.auth_service import get_current_user_from_cookie
-import traceback
+from sessions.message_buffer import message_buffer
+from tracing import span
+import logging
 session_router = APIRouter()
+logger = logging.getLogger(__name__)
 
 
 class SessionRequest(BaseModel):
@@ -17,35 +20,41 @@ def create_session_endpoint(req: SessionRequest, current_user: dict = Depends(ge
     Create a new session for the user.
     """
     try:
-        print(f"Creating session for user: {current_user}")
-        print(f"Session title: {req.title}")
+        logger.debug(f"Creating session for user: {current_user['id']}")
         # Call the service function with correct parameters
         user_id = int(current_user["id"])  # Convert string to int
         session_result = create_session(user_id, req.title) 
         if isinstance(session_result, dict) and "error" in session_result:
             raise Exception(session_result["message"])
-        print(f"Session created with ID: {session_result}")
+        logger.debug(f"Session created with ID: {session_result}")
         return {"success": True, "session_id": session_result}
     except Exception as e:
-        print(f"Error creating session: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception(f"Error creating session: {str(e)}")
         return JSONResponse(
             status_code=500,
             content={"success": False, "message": "failed", "error": str(e)})
         
 @session_router.get("/get-sessions")
-def get_sessions_endpoint(current_user: dict = Depends(get_current_user_from_cookie)):
+def get_sessions_endpoint(request: Request, response: Response, current_user: dict = Depends(get_current_user_from_cookie)):
     """
     Retrieve all sessions for a given user.
+    Supports If-None-Match: returns 304 when the user's session list has not changed.
     """
     try:
         user_id = int(current_user["id"])  # Convert string to int
-        sessions = get_sessions(user_id=user_id)
-        print({"success": True, "sessions": sessions})
+        sessions, etag = get_sessions_with_etag(user_id=user_id)
+        if etag is None:
+            raise Exception(sessions["message"])
+
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        client_etags = {tag.strip() for tag in request.headers.get("if-none-match", "").split(",")}
+        if etag in client_etags or "*" in client_etags:
+            return Response(status_code=304, headers=headers)
+
+        response.headers.update(headers)
         return {"success": True, "sessions": sessions}
     except Exception as e:
-        print(f"Error details: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception(f"Error details: {str(e)}")
         return JSONResponse(
             status_code=500,
             content={"success": False, "message": "failed", "error": str(e)})
@@ -78,16 +87,45 @@ def rename_session_endpoint(session_id: int, new_title: str):
             content={"success": False, "message": "failed", "error": str(e)})
         
 @session_router.get("/get-messages/{session_id}")
-def get_messages_endpoint(session_id: int):
+def get_messages_endpoint(
+    session_id: int,
+    before_id: int | None = Query(None, description="return messages older than this message id"),
+    limit: int = Query(MESSAGE_PAGE_SIZE, ge=1, le=500)
+):
+    """
+    Retrieve a page of messages for a given session (most recent page by default).
+    Message bodies are previews; use /get-message/{message_id} for the full content
+    of messages marked truncated.
+    """
+    try:
+        page = get_messages(session_id, before_id=before_id, limit=limit)
+        if "error" in page:
+            raise Exception(page["message"])
+        return {"success": True, **page}
+    except Exception as e:
+        logger.exception(f"Error details: {str(e)}")
+        return JSONResponse(
+            status_code=500,
+            content={"success": False, "message": "failed", "error": str(e)})
+
+
+@session_router.get("/get-message/{message_id}")
+def get_message_endpoint(message_id: int, current_user: dict = Depends(get_current_user_from_cookie)):
     """
-    Retrieve all messages for a given session.
+    Retrieve a single message with its full content.
+    Only messages in the caller's own sessions are returned; anything else is a 404.
     """
     try:
-        messages = get_messages(session_id)
-        return {"success": True, "messages": messages}
+        message = get_message(message_id)
+        if message is not None and "error" in message:
+            raise Exception(message["message"])
+        if message is None or not user_owns_session(int(current_user["id"]), message["session_id"]):
+            raise HTTPException(status_code=404, detail="Message not found")
+        return {"success": True, "message": message}
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error details: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception(f"Error details: {str(e)}")
         return JSONResponse(
             status_code=500,
             content={"success": False, "message": "failed", "error": str(e)})
@@ -96,7 +134,6 @@ def get_messages_endpoint(session_id: int):
 from pydantic import BaseModel
 from fastapi import Depends
 from fastapi.responses import JSONResponse
-import traceback
 
 
 class MessageRequest(BaseModel):
@@ -105,28 +142,67 @@ class MessageRequest(BaseModel):
     content: str
 
 
+class BulkMessageRequest(BaseModel):
+    messages: list[MessageRequest]
+
+
+# How long a request waits for its buffered insert to be committed
+MESSAGE_WRITE_TIMEOUT_SECONDS = 10
+
+
 @session_router.post("/set-messages")
 def store_message_endpoint(
     req: MessageRequest, current_user: dict = Depends(get_current_user_from_cookie)
 ):
     """
     Store a new message for a given session.
+    The insert is batched with concurrent requests by the write-behind message buffer.
     """
     try:
         user_id = int(current_user["id"])
-        print(f"Storing message for user {user_id}, session {req.session_id}")
+        logger.debug(f"Storing message for user {user_id}, session {req.session_id}")
 
-        # Call service layer
-        message_id = save_message(
-            session_id=req.session_id,
-            role=req.role,
-            content=req.content,
-        )
+        with span("sessions.buffered_insert", session_id=req.session_id, role=req.role):
+            message_id = message_buffer.submit(
+                session_id=req.session_id,
+                role=req.role,
+                content=req.content,
+            ).result(timeout=MESSAGE_WRITE_TIMEOUT_SECONDS)
         return {"success": True, "message_id": message_id}
 
     except Exception as e:
-        print(f"Error storing message: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception(f"Error storing message: {str(e)}")
+        return JSONResponse(
+            status_code=500,
+            content={
+                "success": False,
+                "message": "failed",
+                "error": str(e),
+            },
+        )
+
+
+@session_router.post("/set-messages-bulk")
+def store_messages_bulk_endpoint(
+    req: BulkMessageRequest, current_user: dict = Depends(get_current_user_from_cookie)
+):
+    """
+    Store several messages (e.g. a user prompt and the assistant reply) in one call.
+    Message ids are returned in request order.
+    """
+    try:
+        user_id = int(current_user["id"])
+        logger.debug(f"Storing {len(req.messages)} messages for user {user_id}")
+
+        with span("sessions.buffered_insert", messages=len(req.messages)):
+            futures = message_buffer.submit_many(
+                [(message.session_id, message.role, message.content) for message in req.messages]
+            )
+            message_ids = [future.result(timeout=MESSAGE_WRITE_TIMEOUT_SECONDS) for future in futures]
+        return {"success": True, "message_ids": message_ids}
+
+    except Exception as e:
+        logger.exception(f"Error storing messages: {str(e)}")
         return JSONResponse(
             status_code=500,
             content={
@@ -134,4 +210,4 @@ def store_message_endpoint(
                 "message": "failed",
                 "error": str(e),
             },
-        )
\ No newline at end of file
+        )
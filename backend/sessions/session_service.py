@@ -1,30 +1,137 @@
 from db_handler import get_connection
+from metrics import CACHE_REQUESTS
+from http_cache import content_etag
+from shared_state import open_counters
+import fast_json
 import oracledb
 import logging
 import traceback
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Message history paging
+MESSAGE_PAGE_SIZE = int(os.getenv("MESSAGE_PAGE_SIZE", "50"))
+MESSAGE_PREVIEW_CHARS = int(os.getenv("MESSAGE_PREVIEW_CHARS", "500"))
+
+# Per-user session list cache
+SESSION_CACHE_MAX_USERS = int(os.getenv("SESSION_CACHE_MAX_USERS", "1000"))
+SESSION_CACHE_TTL_SECONDS = int(os.getenv("SESSION_CACHE_TTL_SECONDS", "300"))
+
+# Size of the shared per-user change counters (user ids share a slot modulo this)
+SESSION_GENERATION_SLOTS = int(os.getenv("SESSION_GENERATION_SLOTS", "65536"))
+
+# user_id -> {"sessions": [...], "etag": str, "generation": int, "expires_at": float},
+# least recently used first
+_session_cache = OrderedDict()
+_session_cache_lock = threading.Lock()
+# Per-user change counters shared by all workers on the host: every create/rename/delete
+# bumps the user's counter, and a worker serves its cached list only while the counter
+# still has the value it had when the list was loaded
+_shared_generations = open_counters("session_generations", SESSION_GENERATION_SLOTS)
+# Per-process stand-in when shared state is unavailable
+_local_generations = {}
+
+
+def _generation(user_id: int) -> int:
+    if _shared_generations is not None:
+        return _shared_generations.get(user_id)
+    return _local_generations.get(user_id, 0)
+
+
+def _bump_generation(user_id: int) -> int:
+    if _shared_generations is not None:
+        return _shared_generations.bump(user_id)
+    with _session_cache_lock:
+        _local_generations[user_id] = _local_generations.get(user_id, 0) + 1
+        return _local_generations[user_id]
+
+
+def _sessions_etag(user_id: int, sessions: list) -> str:
+    # Derived from the content, so every worker tags the same list the same way
+    return f'W/"sessions-{user_id}-{content_etag(fast_json.dumps(sessions))}"'
+
+
+def _cache_sessions(user_id: int, sessions: list, etag: str, generation: int) -> bool:
+    """
+    Caches a freshly loaded list, unless the user's sessions changed since
+    `generation` was read (the list may then predate the change).
+    """
+    with _session_cache_lock:
+        if _generation(user_id) != generation:
+            return False
+        _session_cache.pop(user_id, None)
+        _session_cache[user_id] = {
+            "sessions": sessions,
+            "etag": etag,
+            "generation": generation,
+            "expires_at": time.monotonic() + SESSION_CACHE_TTL_SECONDS
+        }
+        while len(_session_cache) > SESSION_CACHE_MAX_USERS:
+            _session_cache.popitem(last=False)
+        return True
+
+
+def _update_cached_sessions(user_id: int, update):
+    """
+    Records a change to a user's sessions for every worker, and applies
+    update(sessions) to this worker's cached list in place.
+    """
+    generation = _bump_generation(user_id)
+    with _session_cache_lock:
+        entry = _session_cache.get(user_id)
+        if entry is None:
+            return
+        if entry["generation"] != generation - 1:
+            # Another worker changed them too; the next read reloads from Oracle
+            del _session_cache[user_id]
+            return
+        update(entry["sessions"])
+        entry["generation"] = generation
+        entry["etag"] = _sessions_etag(user_id, entry["sessions"])
+
+
+def _returned_id(value):
+    # DML RETURNING variables hold a list with one value per returned row
+    return value[0] if isinstance(value, list) else value
 
 def create_session(user_id: int, title: str):
-    print(f"create_session called with user_id: {user_id}, title: {title}")
+    logger.debug(f"create_session called with user_id: {user_id}")
     conn = get_connection()
     cursor = conn.cursor()
     try:
-        # Create output variable for session_id
+        # Create output variables for session_id and started_at
         session_id_var = cursor.var(int)
+        started_at_var = cursor.var(oracledb.DB_TYPE_TIMESTAMP)
 
         cursor.execute(
             """
             INSERT INTO CHAT_SESSIONS (user_id, title)
             VALUES (:1, :2)
-            RETURNING id INTO :3
+            RETURNING id, started_at INTO :3, :4
             """,
-            (user_id, title, session_id_var)
+            (user_id, title, session_id_var, started_at_var)
         )
 
         # Retrieve session_id from variable
         session_id = session_id_var.getvalue()
 
         conn.commit()
-        print(f"Session ID fetched: {session_id}")
+        logger.debug(f"Session ID fetched: {session_id}")
+
+        new_session = {
+            "session_id": _returned_id(session_id),
+            "title": title,
+            "created_at": _returned_id(started_at_var.getvalue())
+        }
+
+        def append(sessions):
+            sessions.append(new_session)
+
+        _update_cached_sessions(user_id, append)
         return session_id
 
     except oracledb.DatabaseError as db_err:
@@ -42,6 +149,57 @@ def create_session(user_id: int, title: str):
    
         
 def get_sessions(user_id: int):
+    sessions, _ = get_sessions_with_etag(user_id)
+    return sessions
+
+
+def get_sessions_with_etag(user_id: int):
+    """
+    Returns (sessions, etag) for a user, served from the per-user cache when possible.
+    A cached list is used only while no worker has changed the user's sessions since
+    it was loaded (one read of the shared counter), so a hit never touches Oracle.
+    On a database error the error dict is returned with etag None.
+    """
+    generation = _generation(user_id)
+    with _session_cache_lock:
+        entry = _session_cache.get(user_id)
+        if entry and entry["generation"] == generation and entry["expires_at"] > time.monotonic():
+            _session_cache.move_to_end(user_id)
+            CACHE_REQUESTS.inc(cache="sessions", result="hit")
+            # Copies, so later in-place updates never race with response serialization
+            return [dict(session) for session in entry["sessions"]], entry["etag"]
+
+    CACHE_REQUESTS.inc(cache="sessions", result="miss")
+    sessions = _load_sessions(user_id)
+    if isinstance(sessions, dict):
+        return sessions, None
+    etag = _sessions_etag(user_id, sessions)
+    # Not cached if it raced with a change; the next read loads again
+    _cache_sessions(user_id, sessions, etag, generation)
+    return [dict(session) for session in sessions], etag
+
+
+def user_owns_session(user_id: int, session_id: int) -> bool:
+    """
+    True if session_id is one of the user's sessions. Checked against the cached
+    list first; a session missing from it (e.g. created a moment ago) is looked up
+    in Oracle before the answer is no.
+    """
+    sessions, etag = get_sessions_with_etag(user_id)
+    if etag is not None and any(session["session_id"] == session_id for session in sessions):
+        return True
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT 1 FROM CHAT_SESSIONS WHERE id = :1 AND user_id = :2", (session_id, user_id))
+        return cursor.fetchone() is not None
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _load_sessions(user_id: int):
     conn = get_connection()
     cursor = conn.cursor()
     try:
@@ -50,7 +208,6 @@ def get_sessions(user_id: int):
         sessions = [{"session_id": row[0], "title": row[1], "created_at": row[2]} for row in cursor.fetchall()]
         return sessions
     except oracledb.DatabaseError as db_err:
-        print("Database error occurred in get_sessions.")
         error_obj, = db_err.args
         logging.error("Database error in get_sessions:\n%s", traceback.format_exc())
         return {
@@ -66,8 +223,16 @@ def delete_session(session_id: int):
     conn = get_connection()
     cursor = conn.cursor()
     try:
-        cursor.execute("DELETE FROM CHAT_SESSIONS WHERE id = :1", (session_id,))
+        owner_var = cursor.var(int)
+        cursor.execute("DELETE FROM CHAT_SESSIONS WHERE id = :1 RETURNING user_id INTO :2", (session_id, owner_var))
         conn.commit()
+
+        def remove(sessions):
+            sessions[:] = [session for session in sessions if session["session_id"] != session_id]
+
+        owner = owner_var.getvalue()
+        if owner:  # empty when there was no such session
+            _update_cached_sessions(owner[0], remove)
         return {"success": True}
     except oracledb.DatabaseError as db_err:
         error_obj, = db_err.args
@@ -85,8 +250,19 @@ def rename_session(session_id: int, new_title: str):
     conn = get_connection()
     cursor = conn.cursor()
     try:
-        cursor.execute("UPDATE CHAT_SESSIONS SET title = :1 WHERE id = :2", (new_title, session_id))
+        owner_var = cursor.var(int)
+        cursor.execute("UPDATE CHAT_SESSIONS SET title = :1 WHERE id = :2 RETURNING user_id INTO :3",
+                       (new_title, session_id, owner_var))
         conn.commit()
+
+        def retitle(sessions):
+            for session in sessions:
+                if session["session_id"] == session_id:
+                    session["title"] = new_title
+
+        owner = owner_var.getvalue()
+        if owner:
+            _update_cached_sessions(owner[0], retitle)
         return {"success": True}
     except oracledb.DatabaseError as db_err:
         error_obj, = db_err.args
@@ -100,29 +276,69 @@ def rename_session(session_id: int, new_title: str):
         cursor.close()
         conn.close()
         
-def get_messages(session_id: int):
+def get_messages(session_id: int, before_id: int = None, limit: int = MESSAGE_PAGE_SIZE,
+                 preview_chars: int = MESSAGE_PREVIEW_CHARS):
+    """
+    Returns one page of a session's messages, newest page first, oldest-to-newest within the page.
+
+    Keyset pagination on (created_at, id) served by the chat_messages_session_idx index,
+    so the cost of a page does not depend on how long the history is. Only the first
+    `preview_chars` characters of each message body are read; fetch the rest with get_message.
+    """
     conn = get_connection()
     cursor = conn.cursor()
     try:
-        cursor.execute(
+        keyset_join = ""
+        keyset = ""
+        params = {"session_id": session_id, "preview_chars": preview_chars, "fetch_limit": limit + 1}
+        if before_id is not None:
+            keyset_join = "JOIN chat_messages k ON k.id = :before_id AND k.session_id = m.session_id"
+            keyset = """
+                AND (m.created_at < k.created_at
+                     OR (m.created_at = k.created_at AND m.id < k.id))
             """
-            SELECT id, role, content, created_at
-            FROM chat_messages
-            WHERE session_id = :1
-            ORDER BY created_at ASC
+            params["before_id"] = before_id
+
+        # ROWNUM over an ordered inline view keeps this compatible with 11g (no FETCH FIRST)
+        cursor.execute(
+            f"""
+            SELECT id, role, preview, content_length, created_at
+            FROM (
+                SELECT m.id, m.role,
+                       DBMS_LOB.SUBSTR(m.content, :preview_chars, 1) AS preview,
+                       DBMS_LOB.GETLENGTH(m.content) AS content_length,
+                       m.created_at
+                FROM chat_messages m
+                {keyset_join}
+                WHERE m.session_id = :session_id
+                {keyset}
+                ORDER BY m.created_at DESC, m.id DESC
+            )
+            WHERE ROWNUM <= :fetch_limit
             """,
-            (session_id,),
+            params,
         )
+        rows = cursor.fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        rows.reverse()
+
         messages = [
             {
                 "id": row[0],
                 "role": row[1],
-                "content": row[2],
-                "created_at": row[3],
+                "content": row[2] or "",
+                "content_length": row[3] or 0,
+                "truncated": (row[3] or 0) > len(row[2] or ""),
+                "created_at": row[4],
             }
-            for row in cursor.fetchall()
+            for row in rows
         ]
-        return messages
+        return {
+            "messages": messages,
+            "has_more": has_more,
+            "next_before_id": messages[0]["id"] if has_more and messages else None,
+        }
 
     except oracledb.DatabaseError as db_err:
         error_obj, = db_err.args
@@ -140,6 +356,49 @@ def get_messages(session_id: int):
         conn.close()
 
 
+def get_message(message_id: int):
+    """
+    Returns a single message with its full content.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            """
+            SELECT id, session_id, role, content, created_at
+            FROM chat_messages
+            WHERE id = :1
+            """,
+            (message_id,),
+        )
+        row = cursor.fetchone()
+        if not row:
+            return None
+        content = row[3].read() if isinstance(row[3], oracledb.LOB) else row[3]
+        return {
+            "id": row[0],
+            "session_id": row[1],
+            "role": row[2],
+            "content": content or "",
+            "created_at": row[4],
+        }
+
+    except oracledb.DatabaseError as db_err:
+        error_obj, = db_err.args
+        logging.error(
+            "Database error in get_message:\n%s", traceback.format_exc()
+        )
+        return {
+            "error": "Database Error",
+            "message": str(error_obj.message),
+            "code": error_obj.code,
+        }
+
+    finally:
+        cursor.close()
+        conn.close()
+
+
 def save_message(session_id: int, role: str, content: str):
     conn = get_connection()
     cursor = conn.cursor()
@@ -168,6 +427,50 @@ def save_message(session_id: int, role: str, content: str):
         cursor.close()
         conn.close()
 
+def save_messages(messages: list[tuple]):
+    """
+    Inserts several messages with one executemany round trip and one commit.
+
+    Rows Oracle rejects (e.g. a session deleted meanwhile) don't fail the
+    batch: the others are still committed.
+
+    Args:
+        messages (list[tuple]): (session_id, role, content) per message.
+
+    Returns:
+        list: Per message, in the same order as `messages`, the new id or the
+        oracledb.DatabaseError that rejected the row.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        message_id_var = cursor.var(int, arraysize=len(messages))
+        cursor.setinputsizes(None, None, None, message_id_var)
+
+        cursor.executemany(
+            """
+            INSERT INTO chat_messages (session_id, role, content, created_at)
+            VALUES (:1, :2, :3, SYSTIMESTAMP)
+            RETURNING id INTO :4
+            """,
+            [tuple(message) for message in messages],
+            batcherrors=True,
+        )
+
+        errors = {error.offset: oracledb.DatabaseError(error) for error in cursor.getbatcherrors()}
+        # Each row's RETURNING clause yields a list of values
+        results = [errors[i] if i in errors else message_id_var.getvalue(i)[0] for i in range(len(messages))]
+        conn.commit()
+        return results
+
+    except Exception as e:
+        conn.rollback()
+        raise
+
+    finally:
+        cursor.close()
+        conn.close()
+
 # def get_messages(session_id: int):
 #     conn = get_connection()
 #     cursor = conn.cursor()
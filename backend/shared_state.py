@@ -0,0 +1,179 @@
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from contextlib import contextmanager
+from dotenv import load_dotenv
+import fast_json
+
+# fcntl is POSIX-only; without it workers still share snapshots but may extract concurrently
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+
+
+def dsn_fingerprint(dsn: str | None) -> str:
+    """
+    Short stable id for a database DSN, safe to use in file names.
+    """
+    return hashlib.sha256((dsn or "").encode("utf-8")).hexdigest()[:12]
+
+
+# Every uvicorn worker on the host points here to share state. The default is
+# per database, so deployments against different DSNs never share snapshots.
+SHARED_STATE_DIR = os.getenv("SHARED_STATE_DIR") or os.path.join(
+    tempfile.gettempdir(), "ai-oracle-chatbot", dsn_fingerprint(os.getenv("DB_DSN")))
+
+_VERSION = struct.Struct("<Q")
+
+
+class SharedSnapshot:
+    """
+    A JSON document shared by the worker processes through files in `directory`:
+    a memory-mapped control file holding a version counter, and one data file
+    per version.
+
+    Readers compare the counter (a read from the shared mapping) with the
+    version they hold and load the data file only when it moved. Writers
+    publish under exclusive(), which also serializes the work that produces
+    the document across processes.
+    """
+
+    def __init__(self, directory: str, name: str):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.name = name
+        self._fd = os.open(os.path.join(directory, f"{name}.version"), os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self._fd).st_size < _VERSION.size:
+            os.ftruncate(self._fd, _VERSION.size)
+        self._map = mmap.mmap(self._fd, _VERSION.size)
+        # flock is per process, so threads of one worker also take this lock
+        self._thread_lock = threading.Lock()
+
+    def version(self) -> int:
+        """
+        Latest published version (0 before the first publish).
+        """
+        return _VERSION.unpack_from(self._map, 0)[0]
+
+    def _data_path(self, version: int) -> str:
+        return os.path.join(self.directory, f"{self.name}.{version}.json")
+
+    @contextmanager
+    def exclusive(self):
+        with self._thread_lock:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def load(self) -> tuple[int, object] | None:
+        """
+        (version, document) for the latest version, or None if nothing was published.
+        """
+        version = self.version()
+        if not version:
+            return None
+        try:
+            with open(self._data_path(version), "rb") as f:
+                return version, fast_json.loads(f.read())
+        except FileNotFoundError:
+            return None
+
+    def publish(self, document) -> int:
+        """
+        Writes document as the next version and returns it. Call inside exclusive().
+        """
+        version = self.version() + 1
+        path = self._data_path(version)
+        partial = f"{path}.{os.getpid()}.tmp"
+        with open(partial, "wb") as f:
+            f.write(fast_json.dumps(document))
+        os.replace(partial, path)
+        _VERSION.pack_into(self._map, 0, version)
+        self._map.flush()
+
+        # Keep the previous version for readers that saw the old counter a moment ago
+        stale = self._data_path(version - 2)
+        if os.path.exists(stale):
+            os.remove(stale)
+        return version
+
+
+class SharedCounters:
+    """
+    A fixed array of 64-bit counters in a memory-mapped file shared by the
+    worker processes. Integer keys map onto slots modulo their number, so two
+    keys may share a counter; callers must treat a moved counter as "may have
+    changed".
+
+    Reads are a single load from the mapping; bump() takes an flock so
+    increments from different processes are not lost.
+    """
+
+    def __init__(self, directory: str, name: str, slots: int):
+        os.makedirs(directory, exist_ok=True)
+        self.slots = slots
+        self._fd = os.open(os.path.join(directory, f"{name}.counters"), os.O_RDWR | os.O_CREAT, 0o600)
+        size = _VERSION.size * slots
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+        self._thread_lock = threading.Lock()
+
+    def _offset(self, key: int) -> int:
+        return (key % self.slots) * _VERSION.size
+
+    def get(self, key: int) -> int:
+        return _VERSION.unpack_from(self._map, self._offset(key))[0]
+
+    def bump(self, key: int) -> int:
+        """
+        Increments the key's counter and returns the new value.
+        """
+        offset = self._offset(key)
+        with self._thread_lock:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                value = _VERSION.unpack_from(self._map, offset)[0] + 1
+                _VERSION.pack_into(self._map, offset, value)
+                return value
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+
+def open_counters(name: str, slots: int) -> SharedCounters | None:
+    """
+    Opens (creating if needed) a counter array in SHARED_STATE_DIR, or returns
+    None when the directory is unusable.
+    """
+    try:
+        return SharedCounters(SHARED_STATE_DIR, name, slots)
+    except OSError as e:
+        logger.warning(f"Shared state unavailable in {SHARED_STATE_DIR}: {e}")
+        return None
+
+
+def open_snapshot(name: str) -> SharedSnapshot | None:
+    """
+    Opens (creating if needed) a snapshot in SHARED_STATE_DIR, or returns None
+    when the directory is unusable, in which case callers keep per-process state.
+    """
+    try:
+        return SharedSnapshot(SHARED_STATE_DIR, name)
+    except OSError as e:
+        logger.warning(f"Shared state unavailable in {SHARED_STATE_DIR}: {e}")
+        return None
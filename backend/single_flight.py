@@ -0,0 +1,53 @@
+import threading
+from metrics import SINGLE_FLIGHT_CALLS
+from tracing import span
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key: the first caller runs the
+    function, callers arriving while it is in flight wait and get the same
+    result (or exception). Nothing is cached once the call returns.
+
+    Waiters receive the leader's result object itself, so callers must not
+    mutate what they get back.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            SINGLE_FLIGHT_CALLS.inc(flight=self.name, role="coalesced")
+            with span(f"{self.name}.coalesced"):
+                call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        SINGLE_FLIGHT_CALLS.inc(flight=self.name, role="leader")
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
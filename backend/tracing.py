@@ -0,0 +1,226 @@
+import argparse
+import contextvars
+import glob
+import json
+import logging
+import os
+import queue
+import re
+import secrets
+import time
+from contextlib import contextmanager
+from logging.handlers import QueueListener, RotatingFileHandler
+from dotenv import load_dotenv
+from app_logging import NonBlockingQueueHandler
+
+load_dotenv()
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+# Header carrying the trace id between n8n, this API and the frontend
+TRACE_HEADER = os.getenv("TRACE_HEADER", "X-Trace-Id")
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACE_FILE_MAX_BYTES = int(os.getenv("TRACE_FILE_MAX_BYTES", str(50 * 1024 * 1024)))
+TRACE_FILE_BACKUPS = int(os.getenv("TRACE_FILE_BACKUPS", "5"))
+TRACE_QUEUE_SIZE = int(os.getenv("TRACE_QUEUE_SIZE", "10000"))
+SERVICE_NAME = os.getenv("SERVICE_NAME", "ai-oracle-chatbot")
+
+TRACE_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+# W3C traceparent: version-traceid-parentid-flags
+TRACEPARENT_RE = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+# Innermost open span of the current request (None outside a trace)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+_export_logger = logging.getLogger("tracing.export")
+_export_logger.propagate = False
+_listener = None
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_span_id", "name", "attributes", "start_ns", "end_ns", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_span_id: str | None, attributes: dict):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent_span_id
+        self.name = name
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_otlp_attribute(k, v) for k, v in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_span_id:
+            span["parentSpanId"] = self.parent_span_id
+        return span
+
+
+def _otlp_attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+def new_trace_id() -> str:
+    return secrets.token_hex(16)
+
+
+def trace_id_from_headers(headers) -> tuple[str, str | None]:
+    """
+    Trace id (and remote parent span id) from TRACE_HEADER or a W3C traceparent
+    header; a fresh trace id when neither is present or valid.
+    """
+    incoming = (headers.get(TRACE_HEADER) or "").strip().lower().replace("-", "")
+    if TRACE_ID_RE.match(incoming):
+        return incoming, None
+    match = TRACEPARENT_RE.match((headers.get("traceparent") or "").strip().lower())
+    if match:
+        return match.group(1), match.group(2)
+    return new_trace_id(), None
+
+
+def current_trace_id() -> str | None:
+    span = _current_span.get()
+    return span.trace_id if span else None
+
+
+@contextmanager
+def span(name: str, trace_id: str = None, parent_span_id: str = None, **attributes):
+    """
+    Times a block as a span of the current trace. Opening a span with no trace
+    in progress (and no trace_id given) is a no-op, so helpers can be traced
+    unconditionally. Yields the Span (or None) for adding attributes.
+    """
+    parent = _current_span.get()
+    if not TRACING_ENABLED or (parent is None and trace_id is None):
+        yield None
+        return
+
+    if parent is not None:
+        trace_id, parent_span_id = parent.trace_id, parent.span_id
+    current = Span(name, trace_id, parent_span_id, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        _current_span.reset(token)
+        _export(current)
+
+
+def _export(finished: Span):
+    if _listener is None:
+        return
+    record = {
+        "resourceSpans": [{
+            "resource": {"attributes": [_otlp_attribute("service.name", SERVICE_NAME)]},
+            "scopeSpans": [{"scope": {"name": "ai-oracle-chatbot.tracing"}, "spans": [finished.to_otlp()]}],
+        }]
+    }
+    _export_logger.info(json.dumps(record, default=str, ensure_ascii=False))
+
+
+def setup_tracing():
+    """
+    Starts the background exporter that appends finished spans to TRACE_FILE
+    as OTLP JSON (one ExportTraceServiceRequest per line). Safe to call more than once.
+    """
+    global _listener
+    if _listener is not None or not TRACING_ENABLED:
+        return
+
+    file_handler = RotatingFileHandler(TRACE_FILE, maxBytes=TRACE_FILE_MAX_BYTES, backupCount=TRACE_FILE_BACKUPS, encoding="utf-8")
+    file_handler.setFormatter(logging.Formatter("%(message)s"))
+    trace_queue = queue.Queue(maxsize=TRACE_QUEUE_SIZE)
+    _export_logger.addHandler(NonBlockingQueueHandler(trace_queue))
+    _export_logger.setLevel(logging.INFO)
+
+    _listener = QueueListener(trace_queue, file_handler)
+    _listener.start()
+
+
+def shutdown_tracing():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+# --- Waterfall CLI: python tracing.py <trace_id> ---
+
+def load_trace(trace_id: str, path: str = TRACE_FILE) -> list[dict]:
+    """
+    All spans of a trace from the trace file and its rotated backups.
+    """
+    spans = []
+    for file in sorted(glob.glob(f"{glob.escape(path)}*")):
+        with open(file, encoding="utf-8") as f:
+            for line in f:
+                if trace_id not in line:
+                    continue
+                for resource in json.loads(line).get("resourceSpans", []):
+                    for scope in resource.get("scopeSpans", []):
+                        spans.extend(s for s in scope.get("spans", []) if s["traceId"] == trace_id)
+    return spans
+
+
+def render_waterfall(spans: list[dict], width: int = 50) -> str:
+    if not spans:
+        return "No spans found."
+
+    start = min(int(s["startTimeUnixNano"]) for s in spans)
+    end = max(int(s["endTimeUnixNano"]) for s in spans)
+    total = max(end - start, 1)
+
+    children = {}
+    ids = {s["spanId"] for s in spans}
+    for s in sorted(spans, key=lambda s: int(s["startTimeUnixNano"])):
+        parent = s.get("parentSpanId")
+        children.setdefault(parent if parent in ids else None, []).append(s)
+
+    lines = [f"trace {spans[0]['traceId']}  total {total / 1e6:.1f} ms"]
+
+    def walk(parent_id, depth):
+        for s in children.get(parent_id, []):
+            s_start = int(s["startTimeUnixNano"]) - start
+            s_end = int(s["endTimeUnixNano"]) - start
+            offset = int(s_start / total * width)
+            length = max(1, int((s_end - s_start) / total * width))
+            bar = " " * offset + "#" * min(length, width - offset)
+            failed = " !" if s.get("status", {}).get("code") == 2 else ""
+            label = ("  " * depth + s["name"])[:40]
+            lines.append(f"{label:<40} |{bar:<{width}}| {(s_end - s_start) / 1e6:8.1f} ms{failed}")
+            walk(s["spanId"], depth + 1)
+
+    walk(None, 0)
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print a waterfall of one trace")
+    parser.add_argument("trace_id")
+    parser.add_argument("--file", default=TRACE_FILE)
+    args = parser.parse_args()
+    print(render_waterfall(load_trace(args.trace_id.lower().replace("-", ""), args.file)))
@@ -21,6 +21,8 @@ function AppContent() {
   const [chatSessions, setChatSessions] = useState([]);
   const [error, setError] = useState(null); // Track errors
   const [messages, setMessages] = useState([]);
+  // Keyset cursor for the next older page of the open session (null when there is none)
+  const [olderBeforeId, setOlderBeforeId] = useState(null);
   const sidebarRef = useRef(null);
   const [currentSessionId, setCurrentSessionId] = useState(null);
   const { logout } = useAuth();
@@ -37,21 +39,14 @@ function AppContent() {
   useEffect(() => {
     async function fetchMessages(sessionId) {
       try {
-        const data = await getMessages(sessionId);
-        console.log("Fetched messages for session", sessionId, data);
-
-        // Normalize data into an array
-        if (Array.isArray(data)) {
-          setMessages(data);
-        } else if (data && data.messages && Array.isArray(data.messages)) {
-          setMessages(data.messages);
-        } else {
-          console.warn("Unexpected messages format, forcing empty array:", data);
-          setMessages([]);
-        }
+        const page = await getMessages(sessionId);
+        console.log("Fetched messages for session", sessionId, page);
+        setMessages(page.messages);
+        setOlderBeforeId(page.hasMore ? page.nextBeforeId : null);
       } catch (err) {
         console.error("Failed to fetch messages:", err);
         setMessages([]); // fallback to empty on error
+        setOlderBeforeId(null);
       }
     }
 
@@ -61,9 +56,22 @@ function AppContent() {
     } else {
       // Clear messages when no session is selected
       setMessages([]);
+      setOlderBeforeId(null);
     }
   }, [currentSessionId]);
 
+  // Prepend the next older page of the open session
+  const loadOlderMessages = async () => {
+    if (!currentSessionId || !olderBeforeId) return;
+    try {
+      const page = await getMessages(currentSessionId, { beforeId: olderBeforeId });
+      setMessages((prev) => [...page.messages, ...prev]);
+      setOlderBeforeId(page.hasMore ? page.nextBeforeId : null);
+    } catch (err) {
+      console.error("Failed to load older messages:", err);
+    }
+  };
+
 
 
   const handleLogout = () => {
@@ -110,6 +118,7 @@ function AppContent() {
                         // Clear messages & start new session
 
                         setMessages([]);
+                        setOlderBeforeId(null);
                         setCurrentSessionId(null);
                         console.log("🆕 New chat started!");
                       }}
@@ -184,6 +193,8 @@ function AppContent() {
                 setMessages={setMessages}
                 currentSessionId={currentSessionId}
                 setCurrentSessionId={setCurrentSessionId}
+                hasOlderMessages={Boolean(olderBeforeId)}
+                loadOlderMessages={loadOlderMessages}
               />
             </div>
           </div>
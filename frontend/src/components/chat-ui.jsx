@@ -9,7 +9,7 @@ import { sendToN8n } from "../services/chatApi";
 import remarkGfm from "remark-gfm"; // Enable GitHub-flavored markdown (tables, etc.)
 import { useAuth } from "../auth/authContext"; // For authentication context
 import {createSession} from "../services/sessions";
-import { storeMessages, getMessages } from "../services/sessions"; 
+import { storeMessages, getMessageContent } from "../services/sessions"; 
 
 
 function TypingIndicator({ theme }) {
@@ -26,7 +26,7 @@ function TypingIndicator({ theme }) {
 }
 
 
-export default function ChatUI({ messages, setMessages , currentSessionId, setCurrentSessionId }) {
+export default function ChatUI({ messages, setMessages , currentSessionId, setCurrentSessionId, hasOlderMessages, loadOlderMessages }) {
   // Controlled input state for the message field.
   const [input, setInput] = useState("");
 
@@ -41,11 +41,42 @@ export default function ChatUI({ messages, setMessages , currentSessionId, setCu
   const { theme } = useTheme();
  
 const { user, token } = useAuth(); // Get current user from auth context
-  // Persist chat history and auto-scroll when messages update.
+  // Tracks the "load older messages" request so the button can't fire twice.
+  const [loadingOlder, setLoadingOlder] = useState(false);
+
+  // Auto-scroll when a message is added or updated at the end (not when older ones are prepended).
+  const lastMessage = messages[messages.length - 1];
   useEffect(() => {
     messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
     
-  }, [messages]);
+  }, [lastMessage]);
+
+  // Id of the truncated message whose full text is being fetched.
+  const [expandingId, setExpandingId] = useState(null);
+
+  // History arrives as previews; a long message's full text is fetched only when the user expands it.
+  const expandMessage = async (messageId) => {
+    setExpandingId(messageId);
+    try {
+      const content = await getMessageContent(messageId);
+      setMessages((prev) =>
+        prev.map((m) => (m.id === messageId ? { ...m, content, truncated: false } : m))
+      );
+    } catch (err) {
+      console.error("Failed to load full message:", err);
+    } finally {
+      setExpandingId(null);
+    }
+  };
+
+  const handleLoadOlder = async () => {
+    setLoadingOlder(true);
+    try {
+      await loadOlderMessages();
+    } finally {
+      setLoadingOlder(false);
+    }
+  };
 
   // Handle session creation when messages change and no session exists
   useEffect(() => {
@@ -124,6 +155,20 @@ const { user, token } = useAuth(); // Get current user from auth context
 
       {/* Messages list */}
       <div className="flex-1 overflow-y-auto p-4 space-y-4">
+        {/* Older history is paged in on demand */}
+        {hasOlderMessages && (
+          <div className="flex justify-center">
+            <button
+              onClick={handleLoadOlder}
+              disabled={loadingOlder}
+              className={`text-sm px-3 py-1 rounded ${
+                theme === 'dark' ? 'bg-[#1E1E1E] text-gray-300' : 'bg-gray-100 text-gray-700'
+              }`}
+            >
+              {loadingOlder ? "Loading..." : "Load older messages"}
+            </button>
+          </div>
+        )}
         {messages.map((msg, idx) => {
           // Different bubble styles for user vs assistant, with theme variants.
           const bubbleClass =
@@ -249,6 +294,15 @@ const { user, token } = useAuth(); // Get current user from auth context
                     }}
                   />
                 </div>
+                {msg.truncated && (
+                  <button
+                    onClick={() => expandMessage(msg.id)}
+                    disabled={expandingId === msg.id}
+                    className="mt-1 text-xs underline opacity-80 hover:opacity-100"
+                  >
+                    {expandingId === msg.id ? "Loading..." : "Show full message"}
+                  </button>
+                )}
               </div>
             </div>
           );
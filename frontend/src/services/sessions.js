@@ -38,14 +38,22 @@ export async function getSessions() {
   }
 }
 
-// Get all messages for a session
-export async function getMessages(sessionId) {
+// Get the latest page of messages for a session (pass beforeId to load older ones).
+// Returns { messages, hasMore, nextBeforeId }; truncated messages carry a preview only.
+export async function getMessages(sessionId, { beforeId, limit } = {}) {
   try {
     const res = await axios.get(
       `http://localhost:8000/sessions/get-messages/${sessionId}`,
-      { withCredentials: true }
+      {
+        params: { before_id: beforeId, limit },
+        withCredentials: true,
+      }
     );
-    return res.data["messages"] || [];
+    return {
+      messages: res.data["messages"] || [],
+      hasMore: Boolean(res.data["has_more"]),
+      nextBeforeId: res.data["next_before_id"] ?? null,
+    };
   } catch (error) {
     const detail =
       error?.response?.data?.detail || error?.message || "Failed to fetch messages";
@@ -53,6 +61,21 @@ export async function getMessages(sessionId) {
   }
 }
 
+// Get the full content of a message whose preview was truncated
+export async function getMessageContent(messageId) {
+  try {
+    const res = await axios.get(
+      `http://localhost:8000/sessions/get-message/${messageId}`,
+      { withCredentials: true }
+    );
+    return res.data?.message?.content ?? "";
+  } catch (error) {
+    const detail =
+      error?.response?.data?.detail || error?.message || "Failed to fetch message";
+    throw new Error(detail);
+  }
+}
+
 // Store a message
 export async function storeMessages(sessionId, message) {
   const content = {